@@ -0,0 +1,331 @@
+import math
+import numpy as np
+import pandas as pd
+from discovery import _duration_ms, _ranked
+from variants import _mix
+
+# Sketch sizes of the approximate mode. The defaults keep the sketches of
+# one log at a few MB: ~0.8% standard error on distinct counts, and
+# frequency overcounts of at most 0.004% of all events with 98% confidence.
+HLL_PRECISION = 14
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+TDIGEST_COMPRESSION = 200
+
+# Open cases remembered for directly-follows edges; beyond this the least
+# recently active cases are closed (a later event starts them again)
+MAX_OPEN_CASES = 1000000
+
+_SEEDS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5,
+                   0x85EBCA77C2B2AE63, 0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB], dtype="uint64")
+
+
+def hash_values(values):
+    """64-bit hash of every value, stable across processes"""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def hash_codes(codes, names):
+    """hash_values() of the names of dictionary codes, each distinct name hashed once"""
+    local, distinct = pd.factorize(codes)
+    return hash_values(names[distinct])[local]
+
+
+def _bit_length(values):
+    values = values.copy()
+    length = np.zeros(len(values), dtype="int64")
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >> np.uint64(shift)
+        wide = high > 0
+        length[wide] += shift
+        values = np.where(wide, high, values)
+    return length + (values > 0)
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate in 2^precision one-byte registers
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype="uint8")
+
+    def add(self, hashes):
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype("int64")
+        rank = bits - _bit_length(hashes & np.uint64((1 << bits) - 1)) + 1
+        np.maximum.at(self.registers, index, rank.astype("uint8"))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def relative_error(self):
+        """Standard error of estimate() relative to the true count"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype("int64")))
+        empty = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate while many registers are empty
+        if raw <= 2.5 * m and empty:
+            return m * math.log(m / empty)
+        return float(raw)
+
+
+class CountMinSketch:
+    """
+    Frequency estimates that never undercount; with probability
+    1 - e^-depth they overcount by at most e / width of the total added
+    """
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.table = np.zeros((depth, width), dtype="int64")
+        self.total = 0
+
+    def _columns(self, hashes, row):
+        return (_mix(hashes ^ _SEEDS[row]) & np.uint64(self.width - 1)).astype("int64")
+
+    def add(self, hashes, counts):
+        for row in range(len(self.table)):
+            np.add.at(self.table[row], self._columns(hashes, row), counts)
+        self.total += int(np.sum(counts))
+
+    def estimate(self, hashes):
+        if len(hashes) == 0:
+            return np.zeros(0, dtype="int64")
+        return np.min([self.table[row][self._columns(hashes, row)] for row in range(len(self.table))], axis=0)
+
+    def bounds(self):
+        return {
+            "maxOvercount": int(math.ceil(math.e / self.width * self.total)),
+            "confidence": 1 - math.exp(-len(self.table))
+        }
+
+
+class TDigest:
+    """
+    Quantile sketch: values are merged into at most ~compression/2
+    centroids, small ones at the tails and large ones around the median
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.buffer = []
+        self.buffered = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype="float64")
+        if len(values) == 0:
+            return
+        self.buffer.append(values)
+        self.buffered += len(values)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self.buffered > 10 * self.compression:
+            self._compress()
+
+    def _compress(self):
+        if not self.buffer:
+            return
+        means = np.concatenate([self.means] + self.buffer)
+        weights = np.concatenate([self.weights] + [np.ones(len(b)) for b in self.buffer])
+        self.buffer, self.buffered = [], 0
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        middle = (np.cumsum(weights) - weights / 2) / weights.sum()
+        # Scale function k1: each centroid spans at most one unit of k
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * middle - 1)
+        group = np.floor(k)
+        heads = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        self.weights = np.add.reduceat(weights, heads)
+        self.means = np.add.reduceat(means * weights, heads) / self.weights
+
+    def quantile(self, q):
+        """Value at quantile q, and the bound on its rank error (as a fraction)"""
+        self._compress()
+        if self.count == 0:
+            return None, None
+        middle = np.cumsum(self.weights) - self.weights / 2
+        value = float(np.interp(q * self.count, middle, self.means, left=self.min, right=self.max))
+        nearest = int(np.argmin(np.abs(middle - q * self.count)))
+        return value, float(self.weights[nearest] / 2 / self.count)
+
+
+class ApproximateState:
+    """
+    Single-pass directly-follows statistics in bounded memory: distinct
+    cases and objects in HyperLogLogs, activity, start, end and edge
+    frequencies in count-min sketches, edge durations in t-digests. Only
+    the last event of up to max_open_cases cases is kept, keyed by the
+    64-bit hash of the case id.
+    """
+
+    def __init__(self, max_open_cases=MAX_OPEN_CASES):
+        self.max_open_cases = max_open_cases
+        self.total_events = 0
+        self.cases = HyperLogLog()
+        self.objects = HyperLogLog()
+        self.activities = CountMinSketch()
+        self.starts = CountMinSketch()
+        self.ends = CountMinSketch()
+        self.edges = CountMinSketch()
+        self.names = {}
+        self.edge_keys = {}
+        self.durations = {}
+        self.evicted = 0
+        self.open = pd.DataFrame({"activity": pd.Series(dtype="uint64"),
+                                  "time": pd.Series(dtype="datetime64[ms]")},
+                                 index=pd.Index([], dtype="uint64", name="case"))
+
+    def is_open(self, events):
+        """Whether each event of an event table belongs to a case with remembered events"""
+        return pd.Index(hash_codes(events["case"], events.dictionaries.names("case"))).isin(self.open.index)
+
+    def _activity_hashes(self, codes, names):
+        local, distinct = pd.factorize(codes)
+        hashes = hash_values(names[distinct])
+        self.names.update(zip(hashes.tolist(), names[distinct].tolist()))
+        return hashes[local]
+
+    def _count(self, sketch, hashes):
+        keys, counts = np.unique(hashes, return_counts=True)
+        sketch.add(keys, counts)
+
+    def _add_edges(self, source, target, ms, timed):
+        keys = _mix(source ^ _mix(target))
+        seen, first = np.unique(keys, return_index=True)
+        for key, src, tgt in zip(seen.tolist(), source[first].tolist(), target[first].tolist()):
+            self.edge_keys.setdefault(key, (src, tgt))
+        self._count(self.edges, keys)
+
+        timed_keys, timed_ms = keys[timed], ms[timed]
+        order = np.argsort(timed_keys, kind="stable")
+        timed_keys, timed_ms = timed_keys[order], timed_ms[order]
+        heads = np.flatnonzero(np.r_[True, timed_keys[1:] != timed_keys[:-1]]) if len(order) else []
+        for key, values in zip(timed_keys[heads].tolist(), np.split(timed_ms, heads[1:])):
+            self.durations.setdefault(key, TDigest()).add(values)
+
+    def update(self, events):
+        """
+        Fold a block of events (an EventTable) into the sketches; as in
+        DiscoveryState, events of an open case must not be older than its
+        last event
+        """
+        if len(events) == 0:
+            return self
+
+        # Cases and activities are handled by their 64-bit hashes; events
+        # are ordered by case, then time (unparseable last), then log order
+        case = hash_codes(events["case"], events.dictionaries.names("case"))
+        activity = self._activity_hashes(events["activity"], events.dictionaries.names("activity"))
+        time = events["time"]
+        order = np.lexsort((time, case))
+        case, activity, time = case[order], activity[order], time[order]
+        self.total_events += len(case)
+        self.cases.add(case)
+        self.objects.add(hash_codes(events["object"], events.dictionaries.names("object")))
+        self._count(self.activities, activity)
+
+        first = np.r_[True, case[1:] != case[:-1]]
+        last = np.r_[first[1:], True]
+
+        follows = ~last[:-1]
+        ms, timed = _duration_ms(time[1:][follows], time[:-1][follows])
+        self._add_edges(activity[:-1][follows], activity[1:][follows], ms, timed)
+
+        # Boundary edges from the last event of cases that are still open
+        heads = case[first]
+        known = pd.Index(heads).isin(self.open.index)
+        if known.any():
+            previous = self.open.loc[heads[known]]
+            ms, timed = _duration_ms(time[first][known], previous["time"].to_numpy())
+            self._add_edges(previous["activity"].to_numpy(), activity[first][known], ms, timed)
+        self._count(self.starts, activity[first][~known])
+
+        tails = pd.DataFrame({"activity": activity[last], "time": time[last]},
+                             index=pd.Index(case[last], name="case"))
+        self.open = pd.concat([self.open[~self.open.index.isin(tails.index)], tails])
+        if len(self.open) > self.max_open_cases:
+            # Close the cases that have been idle the longest
+            order = np.argsort(self.open["time"].to_numpy(), kind="stable")
+            closed = self.open.iloc[order[:len(self.open) - self.max_open_cases]]
+            self._count(self.ends, closed["activity"].to_numpy())
+            self.evicted += len(closed)
+            self.open = self.open.iloc[order[len(self.open) - self.max_open_cases:]]
+        return self
+
+    def to_model(self):
+        """
+        Columnar process model in the layout of DiscoveryState.to_model(),
+        with estimated counts, duration percentiles and error bounds
+        """
+        hashes = np.array(list(self.names), dtype="uint64")
+        counts = pd.Series(self.activities.estimate(hashes), index=[self.names[h] for h in hashes.tolist()])
+        activities = _ranked(counts)
+        names = activities.index
+        ordered = hash_values(names.to_numpy())
+        position = dict(zip(ordered.tolist(), range(len(ordered))))
+
+        open_ends = self.open["activity"].value_counts().reindex(ordered, fill_value=0)
+        ends = self.ends.estimate(ordered) + open_ends.to_numpy(dtype="int64")
+
+        # Edges by frequency, then by activity names, as in the exact model
+        keys = np.array(list(self.edge_keys), dtype="uint64")
+        edges = pd.DataFrame({
+            "source": [self.names[self.edge_keys[k][0]] for k in keys.tolist()],
+            "target": [self.names[self.edge_keys[k][1]] for k in keys.tolist()],
+            "count": self.edges.estimate(keys)
+        }, dtype=object).astype({"count": "int64"})
+        edge_order = edges.sort_values(["source", "target"]).sort_values("count", ascending=False, kind="mergesort").index
+        keys, edge_counts = keys[edge_order], edges["count"].to_numpy()[edge_order]
+        source, target = zip(*(self.edge_keys[k] for k in keys.tolist())) if len(keys) else ((), ())
+
+        digests = [self.durations.get(k) or TDigest() for k in keys.tolist()]
+        percentiles = {q: np.full(len(digests), np.nan) for q in (50, 90, 99)}
+        rank_error = np.full(len(digests), np.nan)
+        for i, digest in enumerate(digests):
+            for q, values in percentiles.items():
+                value, error = digest.quantile(q / 100)
+                if value is not None:
+                    values[i] = value
+                    rank_error[i] = max(error, np.nan_to_num(rank_error[i]))
+
+        return {
+            "activities": np.array(names.tolist(), dtype=str),
+            "activity_count": activities.to_numpy(dtype="int64"),
+            "start_count": self.starts.estimate(ordered).astype("int64"),
+            "end_count": ends.astype("int64"),
+            "edge_source": np.array([position[h] for h in source], dtype="int32"),
+            "edge_target": np.array([position[h] for h in target], dtype="int32"),
+            "edge_count": edge_counts.astype("int64"),
+            "edge_duration_count": np.array([d.count for d in digests], dtype="int64"),
+            "edge_duration_total": np.array([round(d.total) for d in digests], dtype="int64"),
+            "edge_duration_min": np.array([d.min if d.count else np.nan for d in digests], dtype="float64"),
+            "edge_duration_max": np.array([d.max if d.count else np.nan for d in digests], dtype="float64"),
+            "edge_duration_p50": percentiles[50],
+            "edge_duration_p90": percentiles[90],
+            "edge_duration_p99": percentiles[99],
+            "edge_duration_rank_error": rank_error,
+            "total_events": np.int64(self.total_events),
+            "total_cases": np.int64(round(self.cases.estimate())),
+            "total_objects": np.int64(round(self.objects.estimate())),
+            "distinct_error": np.float64(self.cases.relative_error),
+            "count_error": np.int64(self.activities.bounds()["maxOvercount"]),
+            "edge_count_error": np.int64(self.edges.bounds()["maxOvercount"]),
+            "count_confidence": np.float64(self.activities.bounds()["confidence"]),
+            "evicted_cases": np.int64(self.evicted)
+        }
@@ -0,0 +1,175 @@
+import json
+import os
+import shutil
+import numpy as np
+from event_log import EventDictionaries, Interner
+
+# Event-store columns; categorical ones are int32 codes into a dictionary
+CATEGORICAL_COLUMNS = ("case", "activity", "object_type")
+EVENT_COLUMNS = CATEGORICAL_COLUMNS + ("time",)
+
+MANIFEST = "manifest.json"
+
+
+def _save(path, array):
+    np.save(path, np.asarray(array), allow_pickle=False)
+
+
+def _publish(staging, path):
+    """Move a fully written artifact directory into place"""
+    previous = path + ".old"
+    if os.path.exists(path):
+        os.replace(path, previous)
+    os.replace(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+class EventStoreWriter:
+    """
+    Writes event-table blocks as memory-mappable NumPy columns.
+
+    Layout of the store directory:
+        manifest.json           row counts per part
+        <column>.dict.npy       dictionary of each categorical column
+        part-NNNNN/<column>.npy one .npy file per column per appended block
+
+    Blocks are EventTables built with the writer's dictionaries, whose
+    codes are stored as they are. A new store is built in a staging
+    directory and moved into place on close(). With append=True the
+    dictionaries continue the stored ones, new parts are added to the
+    existing store and become visible when close() rewrites the
+    dictionaries and manifest; existing parts are never read or rewritten.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append_mode = append
+        if append:
+            self.target = path
+            self.part_rows = read_manifest(path)["parts"]
+            self.dictionaries = EventDictionaries({column: Interner(read_dictionary(path, column).tolist())
+                                                   for column in CATEGORICAL_COLUMNS})
+        else:
+            self.target = path + ".tmp"
+            shutil.rmtree(self.target, ignore_errors=True)
+            os.makedirs(self.target)
+            self.part_rows = []
+            self.dictionaries = EventDictionaries()
+
+    @property
+    def rows(self):
+        return sum(self.part_rows)
+
+    def append(self, events):
+        if events.dictionaries is not self.dictionaries:
+            raise ValueError("Event table was not encoded with the event store's dictionaries")
+        part = os.path.join(self.target, f"part-{len(self.part_rows):05d}")
+        # A failed append may have left an unlisted part behind
+        shutil.rmtree(part, ignore_errors=True)
+        os.makedirs(part)
+        for column in CATEGORICAL_COLUMNS:
+            _save(os.path.join(part, f"{column}.npy"), events[column])
+        _save(os.path.join(part, "time.npy"), events["time"])
+        self.part_rows.append(len(events))
+
+    def checkpoint(self):
+        """Parts and dictionary sizes so far, to undo later appends with rollback_event_store"""
+        return {"parts": len(self.part_rows),
+                "dictionaries": {column: len(self.dictionaries.columns[column]) for column in CATEGORICAL_COLUMNS}}
+
+    def close(self):
+        for column in CATEGORICAL_COLUMNS:
+            dictionary = self.dictionaries.columns[column]
+            _replace_dictionary(self.target, column, np.array([str(v) for v in dictionary.index], dtype=str))
+        _write_manifest(self.target, self.part_rows)
+        if not self.append_mode:
+            _publish(self.target, self.path)
+
+
+def _replace_dictionary(path, column, values):
+    target = os.path.join(path, f"{column}.dict.npy")
+    _save(target + ".tmp.npy", values)
+    os.replace(target + ".tmp.npy", target)
+
+
+def _write_manifest(path, part_rows):
+    manifest = os.path.join(path, MANIFEST)
+    with open(manifest + ".tmp", 'w') as f:
+        json.dump({"columns": list(EVENT_COLUMNS), "parts": part_rows}, f)
+    os.replace(manifest + ".tmp", manifest)
+
+
+def rollback_event_store(path, checkpoint):
+    """
+    Drop the parts appended after checkpoint (EventStoreWriter.checkpoint)
+    and the dictionary entries they added
+    """
+    _write_manifest(path, read_manifest(path)["parts"][:checkpoint["parts"]])
+    for column, size in checkpoint["dictionaries"].items():
+        _replace_dictionary(path, column, np.array(read_dictionary(path, column)[:size]))
+
+
+def write_event_store(path, events):
+    """Store a complete event table, whatever dictionaries it was built with"""
+    writer = EventStoreWriter(path)
+    writer.dictionaries = events.dictionaries
+    writer.append(events)
+    writer.close()
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST), 'r') as f:
+        return json.load(f)
+
+
+def read_events(path, columns=EVENT_COLUMNS, since=0):
+    """
+    Open the requested event columns memory-mapped. Single-part stores are
+    returned without copying; multi-part stores are concatenated. since
+    skips the first rows, without opening the parts that hold only those
+    (e.g. to read just the rows of an append).
+    """
+    manifest = read_manifest(path)
+    ends = np.cumsum(manifest["parts"], dtype="int64")
+    wanted = [i for i in range(len(ends)) if ends[i] > since]
+    # Rows of the first wanted part that come before since
+    skip = since - (int(ends[wanted[0] - 1]) if wanted and wanted[0] > 0 else 0) if wanted else 0
+
+    result = {}
+    for column in columns:
+        parts = [np.load(os.path.join(path, f"part-{i:05d}", f"{column}.npy"), mmap_mode='r') for i in wanted]
+        if parts:
+            parts[0] = parts[0][skip:]
+        if len(parts) == 1:
+            result[column] = parts[0]
+        elif parts:
+            result[column] = np.concatenate(parts)
+        else:
+            result[column] = np.empty(0, dtype="datetime64[ms]" if column == "time" else "int32")
+    return result
+
+
+def read_dictionary(path, column):
+    return np.load(os.path.join(path, f"{column}.dict.npy"), mmap_mode='r')
+
+
+def write_model(path, model):
+    """
+    Write a columnar process model (see DiscoveryState.to_model) as one
+    .npy file per array
+    """
+    staging = path + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in model.items():
+        _save(os.path.join(staging, f"{name}.npy"), array)
+    _publish(staging, path)
+
+
+def read_model(path, columns=None):
+    """
+    Open process model arrays memory-mapped, only the ones asked for
+    """
+    if columns is None:
+        columns = [name[:-4] for name in os.listdir(path) if name.endswith(".npy")]
+    return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in columns}
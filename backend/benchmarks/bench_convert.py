@@ -0,0 +1,103 @@
+"""
+Benchmark CSV -> OCEL conversion throughput.
+
+Compares the columnar convert_csv_to_ocel against the original row-by-row
+implementation (kept below as legacy_convert_csv_to_ocel).
+
+Usage:
+    python benchmarks/bench_convert.py [--rows 100000,1000000,10000000] [--legacy-max-rows 1000000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_mining_api import convert_csv_to_ocel  # noqa: E402
+
+ACTIVITIES = ["Create Order", "Check Credit", "Approve", "Reject", "Ship", "Invoice", "Pay", "Close"]
+
+
+def legacy_convert_csv_to_ocel(csv_path, output_path):
+    """Original iterrows-based conversion, kept for comparison"""
+    df = pd.read_csv(csv_path)
+    ocel = {
+        "ocel:global-event": {"ocel:activity": "__INVALID__"},
+        "ocel:global-object": {"ocel:type": "__INVALID__"},
+        "ocel:global-log": {"ocel:attribute-names": df.columns.tolist()},
+        "ocel:events": {},
+        "ocel:objects": {}
+    }
+    for idx, row in df.iterrows():
+        ocel["ocel:events"][f"e{idx}"] = {
+            "ocel:activity": row.get("activity", "unknown"),
+            "ocel:timestamp": row.get("timestamp", ""),
+            "ocel:omap": [f"o{idx}"],
+            "ocel:vmap": {col: str(row[col]) for col in df.columns}
+        }
+        ocel["ocel:objects"][f"o{idx}"] = {
+            "ocel:type": row.get("object_type", "case"),
+            "ocel:ovmap": {}
+        }
+    with open(output_path, 'w') as f:
+        json.dump(ocel, f, indent=2)
+    return True
+
+
+def write_sample_csv(path, rows, seed=42):
+    rng = np.random.default_rng(seed)
+    cases = rows // 8 + 1
+    start = np.datetime64("2023-01-01T00:00:00")
+    offsets = rng.integers(0, 365 * 24 * 3600, size=rows).astype("timedelta64[s]")
+    df = pd.DataFrame({
+        "case_id": rng.integers(0, cases, size=rows),
+        "activity": np.array(ACTIVITIES)[rng.integers(0, len(ACTIVITIES), size=rows)],
+        "timestamp": (start + offsets).astype(str),
+        "object_type": "order",
+        "resource": np.char.add("user", rng.integers(0, 50, size=rows).astype(str)),
+        "cost": rng.random(rows).round(2) * 100
+    })
+    df.to_csv(path, index=False)
+
+
+def run(label, fn, csv_path, out_path, rows):
+    began = time.perf_counter()
+    result = fn(csv_path, out_path)
+    ok = result[0] if isinstance(result, tuple) else result
+    elapsed = time.perf_counter() - began
+    if not ok:
+        raise RuntimeError(f"{label} conversion failed")
+    size_mb = os.path.getsize(out_path) / 1e6
+    print(f"{rows:>10,} rows  {label:<9} {elapsed:9.2f}s  {rows / elapsed:>12,.0f} rows/s  {size_mb:9.1f} MB")
+    os.remove(out_path)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100000,1000000,10000000")
+    parser.add_argument("--legacy-max-rows", type=int, default=1000000,
+                        help="skip the legacy implementation above this size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in [int(r) for r in args.rows.split(",")]:
+            csv_path = os.path.join(tmp, f"log_{rows}.csv")
+            out_path = os.path.join(tmp, f"log_{rows}_ocel.json")
+            write_sample_csv(csv_path, rows)
+
+            columnar = run("columnar", convert_csv_to_ocel, csv_path, out_path, rows)
+            if rows <= args.legacy_max_rows:
+                legacy = run("legacy", legacy_convert_csv_to_ocel, csv_path, out_path, rows)
+                print(f"{'':>15} speedup {legacy / columnar:.1f}x")
+            os.remove(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark map-reduce process discovery and variant indexing across worker
+counts.
+
+Each worker count is checked to produce exactly the model and variant
+index of the serial path before its time is reported. The parallel paths
+are timed whatever the log size (no serial fallback below
+PARALLEL_MIN_ROWS); the partition pool of each worker count is started
+by an untimed warm-up run, as a long-running server would have it.
+
+Usage:
+    python benchmarks/bench_discovery.py [--rows 1000000] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifacts import write_event_store  # noqa: E402
+from bench_convert import write_sample_csv  # noqa: E402
+from discovery import DiscoveryState, discover_parallel  # noqa: E402
+from event_log import build_event_table  # noqa: E402
+from variants import build_variant_index  # noqa: E402
+
+
+def same(expected, actual):
+    return expected.keys() == actual.keys() and all(
+        np.array_equal(expected[k], actual[k], equal_nan=expected[k].dtype.kind == "f") for k in expected)
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--workers", default=",".join(str(2 ** i) for i in range(6) if 2 ** i <= (os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "log.csv")
+        write_sample_csv(csv_path, args.rows)
+        events = build_event_table(pd.read_csv(csv_path))
+        store_path = os.path.join(tmp, "events")
+        write_event_store(store_path, events)
+
+        serial_state, serial_discovery = timed(DiscoveryState().update, events)
+        serial_model = serial_state.to_model()
+        serial_index, serial_variants = timed(build_variant_index, store_path)
+
+        print(f"{args.rows:,} events, {int(serial_model['total_cases']):,} cases, "
+              f"{len(serial_index['variant_id']):,} variants")
+        print(f"{'workers':>7} {'discovery':>10} {'speedup':>8} {'variants':>10} {'speedup':>8}")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            if workers == 1:
+                discovery, variants = serial_discovery, serial_variants
+            else:
+                discover_parallel(store_path, events.dictionaries, workers, 0)
+                state, discovery = timed(discover_parallel, store_path, events.dictionaries, workers, 0)
+                index, variants = timed(build_variant_index, store_path, workers, 0)
+                if not same(serial_model, state.to_model()) or not same(serial_index, index):
+                    raise RuntimeError(f"{workers} workers disagree with the serial result")
+            print(f"{workers:>7} {discovery:>9.2f}s {serial_discovery / discovery:>7.1f}x "
+                  f"{variants:>9.2f}s {serial_variants / variants:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
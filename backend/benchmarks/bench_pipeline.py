@@ -0,0 +1,165 @@
+"""
+Benchmark the upload pipeline stage by stage on synthetic logs.
+
+For every log size the suite times convert_csv_to_ocel,
+perform_process_discovery, perform_outlier_analysis and a full
+POST /api/upload (sync=1), each in a fresh child process, and records wall
+time, peak RSS and throughput in a JSON report. Pass an earlier report as
+--baseline to print the change of every measurement against it.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--events 10000,1000000,10000000]
+        [--stages convert,discovery,outliers,upload] [--mode batch]
+        [--output bench_report.json] [--baseline old_report.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_log import generate_events  # noqa: E402
+from jobs import peak_rss_bytes, reset_peak_rss  # noqa: E402
+
+STAGES = ["convert", "discovery", "outliers", "upload"]
+
+
+def _discard(api, file_id):
+    """Remove everything the pipeline stored for a benchmark file_id"""
+    def delete(conn):
+        for table in ("outlier_results", "process_metadata", "content_index", "event_rollups", "activity_rollups",
+                      "pipeline_stats"):
+            conn.execute(f"DELETE FROM {table} WHERE file_id = ?", (file_id,))
+    api.db.write(delete)
+    uploads = [os.path.join(api.UPLOAD_FOLDER, name) for name in os.listdir(api.UPLOAD_FOLDER)
+               if name.startswith(file_id)]
+    for path in list(api.artifact_paths(file_id).values()) + uploads:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def _measure(stage, csv_path, workdir, mode, results):
+    """Run one stage in this (child) process and report its measurements"""
+    import process_mining_api as api
+
+    file_id = f"bench-{stage}-{os.getpid()}"
+    ocel_path = os.path.join(workdir, "log_ocel.json")
+    events_path = os.path.join(workdir, "log_events")
+    try:
+        # Inputs of the stage are prepared before measuring starts
+        if stage in ("discovery", "outliers"):
+            ok, events = api.convert_csv_to_ocel(csv_path, None, events_path)
+        if stage == "outliers":
+            ok, process_data = api.perform_process_discovery(events, None)
+
+        reset = reset_peak_rss()
+        began = time.perf_counter()
+        if stage == "convert":
+            ok, _ = api.convert_csv_to_ocel(csv_path, ocel_path, events_path)
+        elif stage == "discovery":
+            ok, _ = api.perform_process_discovery(events, None, os.path.join(workdir, "log_model"))
+        elif stage == "outliers":
+            ok = api.perform_outlier_analysis(process_data, file_id, events_path) is not None
+        else:
+            with api.app.test_client() as client, open(csv_path, "rb") as f:
+                response = client.post(f"/api/upload?sync=1&mode={mode}", data={"file": (f, "bench.csv")},
+                                       content_type="multipart/form-data")
+            ok = response.status_code == 200
+            if ok:
+                file_id = response.get_json()["file_id"]
+        seconds = time.perf_counter() - began
+
+        results.put({"ok": bool(ok), "seconds": seconds, "peakRssMb": peak_rss_bytes(reset) / (1024 * 1024)})
+    finally:
+        _discard(api, file_id)
+
+
+def measure(stage, csv_path, workdir, mode):
+    context = multiprocessing.get_context("fork" if sys.platform != "win32" else "spawn")
+    results = context.Queue()
+    child = context.Process(target=_measure, args=(stage, csv_path, workdir, mode, results))
+    child.start()
+    child.join()
+    if child.exitcode != 0 or results.empty():
+        raise RuntimeError(f"{stage} benchmark crashed (exit code {child.exitcode})")
+    result = results.get()
+    if not result["ok"]:
+        raise RuntimeError(f"{stage} failed")
+    return result
+
+
+def compare(report, baseline):
+    previous = {(r["events"], r["stage"]): r for r in baseline["results"]}
+    print(f"\nAgainst baseline from {baseline['generatedAt']}:")
+    for result in report["results"]:
+        old = previous.get((result["events"], result["stage"]))
+        if old:
+            print(f"{result['events']:>11,} {result['stage']:<10} "
+                  f"time {100 * (result['seconds'] / old['seconds'] - 1):+7.1f}%  "
+                  f"peak RSS {100 * (result['peakRssMb'] / old['peakRssMb'] - 1):+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", default="10000,1000000,10000000")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--mode", default="batch", help="processing mode of the upload stage")
+    parser.add_argument("--activities", type=int, default=12)
+    parser.add_argument("--loop-probability", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    stages = args.stages.split(",")
+    report = {
+        "generatedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "config": {
+            "activities": args.activities,
+            "loopProbability": args.loop_probability,
+            "seed": args.seed,
+            "mode": args.mode
+        },
+        "results": []
+    }
+
+    print(f"{'events':>11} {'stage':<10} {'seconds':>9} {'peak RSS':>10} {'events/s':>12}")
+    for events in [int(e) for e in args.events.split(",")]:
+        with tempfile.TemporaryDirectory() as workdir:
+            csv_path = os.path.join(workdir, "log.csv")
+            generate_events(events, args.activities, args.loop_probability, seed=args.seed).to_csv(csv_path, index=False)
+            for stage in stages:
+                result = measure(stage, csv_path, workdir, args.mode)
+                entry = {
+                    "events": events,
+                    "stage": stage,
+                    "seconds": result["seconds"],
+                    "peakRssMb": result["peakRssMb"],
+                    "eventsPerSecond": events / result["seconds"]
+                }
+                report["results"].append(entry)
+                print(f"{events:>11,} {stage:<10} {entry['seconds']:>8.2f}s {entry['peakRssMb']:>8.0f}MB "
+                      f"{entry['eventsPerSecond']:>12,.0f}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
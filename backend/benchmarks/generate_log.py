@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic event-log generator.
+
+Every case walks through an alphabet of activities in order; after each
+activity it jumps back to a random earlier one with the loop probability
+(rework). Cases arrive uniformly over the period, events within a case are
+separated by exponential gaps, and a fraction of the timestamps can be
+skewed by up to a given number of seconds in either direction to mimic
+unsynchronised clocks. The same arguments and seed always give the same
+log.
+
+Usage:
+    python benchmarks/generate_log.py out.csv [--events 1000000 | --cases 100000]
+        [--activities 12] [--loop-probability 0.1] [--object-types order,invoice]
+        [--timestamp-skew 0.0] [--seed 42]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+START = np.datetime64("2023-01-01T00:00:00")
+PERIOD_SECONDS = 365 * 24 * 3600
+
+# A case never has more events than this, however often it loops
+MAX_TRACE_FACTOR = 4
+
+
+def expected_trace_length(activities, loop_probability):
+    """Rough mean number of events per case, used to size logs by events"""
+    return min(activities / max(1 - loop_probability, 1e-6) * (1 + loop_probability),
+               activities * MAX_TRACE_FACTOR)
+
+
+def generate_event_log(cases, activities=12, loop_probability=0.1, object_types=("order",),
+                       timestamp_skew=0.0, skew_seconds=3600, mean_gap_seconds=4 * 3600, seed=42):
+    """
+    Event log as a DataFrame with case_id, activity, timestamp, object_type,
+    resource and cost columns, ordered by timestamp
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Activity {i + 1:02d}" for i in range(activities)])
+
+    # Walk all cases one step at a time
+    position = np.zeros(cases, dtype="int64")
+    active = np.arange(cases)
+    case_parts, step_parts = [], []
+    for _ in range(activities * MAX_TRACE_FACTOR):
+        if len(active) == 0:
+            break
+        case_parts.append(active)
+        step_parts.append(position[active])
+        loops = (rng.random(len(active)) < loop_probability) & (position[active] > 0)
+        jump = (rng.random(len(active)) * position[active]).astype("int64")
+        position[active] = np.where(loops, jump, position[active] + 1)
+        active = active[position[active] < activities]
+
+    case = np.concatenate(case_parts)
+    step = np.concatenate(step_parts)
+    order = np.argsort(case, kind="stable")
+    case, step = case[order], step[order]
+
+    # Arrival of each case, then exponential gaps between its events
+    arrival = rng.integers(0, PERIOD_SECONDS, size=cases)
+    gaps = rng.exponential(mean_gap_seconds, size=len(case)).astype("int64")
+    starts = np.r_[True, case[1:] != case[:-1]]
+    gaps[starts] = 0
+    elapsed = np.cumsum(gaps)
+    elapsed -= np.repeat(elapsed[starts], np.diff(np.r_[np.flatnonzero(starts), len(case)]))
+    seconds = arrival[case] + elapsed
+
+    skewed = rng.random(len(case)) < timestamp_skew
+    seconds[skewed] += rng.integers(-skew_seconds, skew_seconds + 1, size=int(skewed.sum()))
+
+    types = np.asarray(object_types)
+    df = pd.DataFrame({
+        "case_id": case,
+        "activity": names[step],
+        "timestamp": (START + seconds.astype("timedelta64[s]")).astype(str),
+        "object_type": types[rng.integers(0, len(types), size=cases)][case],
+        "resource": np.char.add("user", rng.integers(0, 50, size=len(case)).astype(str)),
+        "cost": (rng.random(len(case)) * 100).round(2)
+    })
+    return df.iloc[np.argsort(seconds, kind="stable")].reset_index(drop=True)
+
+
+def generate_events(events, activities=12, loop_probability=0.1, **options):
+    """Log of exactly `events` rows: enough cases, cut at the latest events"""
+    cases = max(1, int(events / expected_trace_length(activities, loop_probability) * 1.2))
+    df = generate_event_log(cases, activities, loop_probability, **options)
+    while len(df) < events:
+        cases *= 2
+        df = generate_event_log(cases, activities, loop_probability, **options)
+    return df.iloc[:events]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--events", type=int, default=1000000)
+    size.add_argument("--cases", type=int)
+    parser.add_argument("--activities", type=int, default=12)
+    parser.add_argument("--loop-probability", type=float, default=0.1)
+    parser.add_argument("--object-types", default="order")
+    parser.add_argument("--timestamp-skew", type=float, default=0.0,
+                        help="fraction of events whose timestamp is shifted")
+    parser.add_argument("--skew-seconds", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    options = {
+        "object_types": args.object_types.split(","),
+        "timestamp_skew": args.timestamp_skew,
+        "skew_seconds": args.skew_seconds,
+        "seed": args.seed
+    }
+    if args.cases:
+        df = generate_event_log(args.cases, args.activities, args.loop_probability, **options)
+    else:
+        df = generate_events(args.events, args.activities, args.loop_probability, **options)
+    df.to_csv(args.output, index=False)
+    print(f"{len(df):,} events, {df['case_id'].nunique():,} cases -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
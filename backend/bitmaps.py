@@ -0,0 +1,402 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from artifacts import _publish, _save, read_dictionary, read_events
+from discovery import _grown
+from event_log import CORE_COLUMNS, Interner, text_column
+
+MANIFEST = "manifest.json"
+
+# Attribute columns with more distinct values than this (ids, amounts, free
+# text) are not worth a bitmap per value and are left unindexed
+MAX_ATTRIBUTE_VALUES = 1024
+
+# Values held by fewer than one in DENSE_FRACTION events keep a sorted
+# int32 position list (4 bytes per event) instead of a bitmap (n/8 bytes),
+# the container choice of roaring bitmaps
+DENSE_FRACTION = 32
+
+
+def _attribute_file(i):
+    return f"attr-{i:04d}"
+
+
+class BitmapIndexWriter:
+    """
+    Bitmap indexes over the events of a log, so sub-logs can be selected by
+    activity, object type, attribute value and time window without scanning
+    the events.
+
+    append() takes the same event tables as the event store and keeps the
+    codes of every low-cardinality attribute column; close() builds one container
+    per value of every dimension from those and the event store's activity
+    and object type codes, plus a time-ordered permutation of the events.
+
+    Layout of the index directory:
+        manifest.json               rows, parts and attribute columns
+        attr-NNNN.dict.npy          dictionary of each attribute column
+        part-NNNNN/attr-NNNN.npy    attribute codes per appended block (-1: missing)
+        <dimension>.values.npy      value names of a dimension
+        <dimension>.counts.npy      events per value
+        <dimension>.slot.npy        row in .dense.npy, or -1 for a position list
+        <dimension>.dense.npy       packed bitmaps of the frequent values
+        <dimension>.offsets.npy     slice of .positions.npy per value
+        <dimension>.positions.npy   sorted event positions of the rare values
+        time.order.npy / time.sorted.npy   events by time, timestamps in that order
+
+    Like EventStoreWriter a new index is staged and moved into place on
+    close(); with append=True parts are added and close() reads only the
+    new events: their positions are added to the containers (a value
+    switches between bitmap and position list where its share crosses
+    1/DENSE_FRACTION) and merged into the time order, giving the same
+    index a rebuild would.
+    """
+
+    def __init__(self, path, events_path, append=False):
+        self.path = path
+        self.events_path = events_path
+        self.append_mode = append
+        if append:
+            self.target = path
+            manifest = read_manifest(path)
+            self.part_rows = manifest["parts"]
+            self.indexed = (manifest["rows"], len(self.part_rows), manifest["timed"])
+            self.dropped = []
+            self.attributes = manifest["attributes"]
+            self.dictionaries = {name: Interner(read_dictionary(path, _attribute_file(i)).tolist())
+                                 for i, name in enumerate(self.attributes) if name is not None}
+        else:
+            self.target = path + ".tmp"
+            shutil.rmtree(self.target, ignore_errors=True)
+            os.makedirs(self.target)
+            self.part_rows = []
+            self.attributes = None
+            self.dictionaries = {}
+            self.indexed = (0, 0, 0)
+            self.dropped = []
+
+    def append(self, events):
+        if self.attributes is None:
+            # Attribute columns are fixed by the first block
+            self.attributes = [c for c in events.source_columns if c not in CORE_COLUMNS]
+            self.dictionaries = {name: Interner() for name in self.attributes}
+
+        part = os.path.join(self.target, f"part-{len(self.part_rows):05d}")
+        shutil.rmtree(part, ignore_errors=True)
+        os.makedirs(part)
+        for i, name in enumerate(self.attributes):
+            if name is None:
+                continue
+            codes = np.full(len(events), -1, dtype="int32")
+            if name in events.attributes:
+                # Only the distinct values are rendered as text and interned
+                values = events.attributes[name]
+                if events.coded(name):
+                    present = values >= 0
+                    local, distinct = pd.factorize(values[present])
+                    names = events.dictionaries.attributes[name].index.to_numpy()[distinct]
+                else:
+                    local, uniques = pd.factorize(values)
+                    present = local >= 0
+                    local = local[present]
+                    names = text_column(pd.Series(uniques)).to_numpy()
+                if len(names) > MAX_ATTRIBUTE_VALUES:
+                    self._drop(i)
+                    continue
+                codes[present] = self.dictionaries[name].encode(names)[local]
+            if len(self.dictionaries[name]) > MAX_ATTRIBUTE_VALUES:
+                self._drop(i)
+                continue
+            _save(os.path.join(part, f"{_attribute_file(i)}.npy"), codes)
+        self.part_rows.append(len(events))
+
+    def _drop(self, i):
+        """Stop indexing attribute column i; its files are removed on close()"""
+        del self.dictionaries[self.attributes[i]]
+        self.attributes[i] = None
+        self.dropped.append(i)
+
+    def _remove_dropped(self):
+        prefixes = tuple(_attribute_file(i) + "." for i in self.dropped)
+        for directory, _, files in os.walk(self.target):
+            for name in files:
+                if prefixes and name.startswith(prefixes):
+                    os.remove(os.path.join(directory, name))
+
+    def checkpoint(self):
+        """Parts and attribute dictionary sizes so far, to undo later appends with rollback_bitmap_index"""
+        return {"parts": len(self.part_rows),
+                "dictionaries": {_attribute_file(i): len(self.dictionaries[name])
+                                 for i, name in enumerate(self.attributes or []) if name is not None}}
+
+    def close(self):
+        rows = sum(self.part_rows)
+        since, first_part, timed = self.indexed
+        columns = read_events(self.events_path, ("activity", "object_type", "time"), since=since)
+        if since + len(columns["time"]) != rows:
+            raise ValueError("Bitmap index and event store disagree on the number of events")
+
+        dimensions = {
+            "activity": (columns["activity"], read_dictionary(self.events_path, "activity")),
+            "object_type": (columns["object_type"], read_dictionary(self.events_path, "object_type"))
+        }
+        for i, name in enumerate(self.attributes or []):
+            if name is None:
+                continue
+            file = _attribute_file(i)
+            _save(os.path.join(self.target, f"{file}.dict.npy"),
+                  np.array([str(v) for v in self.dictionaries[name].index], dtype=str))
+            codes = [np.load(os.path.join(self.target, f"part-{p:05d}", f"{file}.npy"), mmap_mode='r')
+                     for p in range(first_part, len(self.part_rows))]
+            dimensions[file] = (np.concatenate(codes) if codes else np.empty(0, dtype="int32"),
+                                read_dictionary(self.target, file))
+
+        time = np.asarray(columns["time"])
+        for dimension, (codes, values) in dimensions.items():
+            if since:
+                self._extend_containers(dimension, np.asarray(codes), np.asarray(values), since, rows)
+            else:
+                self._write_containers(dimension, np.asarray(codes), np.asarray(values), rows)
+
+        order = np.argsort(_time_keys(time), kind="stable").astype("int64")
+        if since:
+            self._merge_time(time, order, since)
+        else:
+            self._save("time.order", order)
+            self._save("time.sorted", time[order])
+
+        manifest = os.path.join(self.target, MANIFEST)
+        with open(manifest + ".tmp", 'w') as f:
+            json.dump({"rows": rows, "timed": timed + int((~np.isnat(time)).sum()), "parts": self.part_rows,
+                       "attributes": self.attributes or []}, f)
+        os.replace(manifest + ".tmp", manifest)
+        # Once the manifest no longer lists them
+        self._remove_dropped()
+        if not self.append_mode:
+            _publish(self.target, self.path)
+
+    def _write_containers(self, dimension, codes, values, rows):
+        counts = np.bincount(codes[codes >= 0], minlength=len(values)).astype("int64")
+        dense = counts * DENSE_FRACTION >= rows
+        slot = np.full(len(values), -1, dtype="int64")
+        slot[dense] = np.arange(dense.sum())
+
+        # Event positions grouped by value, in event order within a value
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        bounds = np.r_[0, np.cumsum(counts)]
+
+        bitmaps = np.zeros((int(dense.sum()), (rows + 7) // 8), dtype="uint8")
+        mask = np.zeros(rows, dtype=bool)
+        for value in np.flatnonzero(dense):
+            positions = order[bounds[value]:bounds[value + 1]]
+            mask[positions] = True
+            bitmaps[slot[value]] = np.packbits(mask)
+            mask[positions] = False
+
+        sparse = np.repeat(~dense, counts)
+        lengths = np.where(dense, 0, counts)
+        self._save(f"{dimension}.values", values)
+        self._save(f"{dimension}.counts", counts)
+        self._save(f"{dimension}.slot", slot)
+        self._save(f"{dimension}.dense", bitmaps)
+        self._save(f"{dimension}.offsets", np.r_[0, np.cumsum(lengths)].astype("int64"))
+        self._save(f"{dimension}.positions", order[sparse].astype("int32"))
+
+    def _extend_containers(self, dimension, codes, values, since, rows):
+        """
+        Add events since..rows, with codes, to the stored containers of a
+        dimension: old positions are only moved, never searched for, except
+        those of a value whose bitmap turns into a position list
+        """
+        old_counts = _grown(np.array(self._load(f"{dimension}.counts")), len(values), 0)
+        old_slot = _grown(np.array(self._load(f"{dimension}.slot")), len(values), -1)
+        old_offsets = np.asarray(self._load(f"{dimension}.offsets"))
+        old_lengths = _grown(np.diff(old_offsets), len(values), 0)
+        old_positions = self._load(f"{dimension}.positions")
+        old_dense = self._load(f"{dimension}.dense")
+
+        new_counts = np.bincount(codes[codes >= 0], minlength=len(values)).astype("int64")
+        counts = old_counts + new_counts
+        dense = counts * DENSE_FRACTION >= rows
+        was_dense = old_slot >= 0
+        slot = np.full(len(values), -1, dtype="int64")
+        slot[dense] = np.arange(dense.sum())
+
+        # New event positions grouped by value, in event order within a value
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        new_values = codes[order]
+        new_positions = order + since
+        new_first = np.r_[0, np.cumsum(new_counts)]
+        old_values = np.repeat(np.arange(len(old_lengths)), old_lengths)
+
+        # Bitmaps: old rows copied, then the bits of new events and of the
+        # old events of values that just became dense set
+        bitmaps = np.zeros((int(dense.sum()), (rows + 7) // 8), dtype="uint8")
+        kept = dense & was_dense
+        bitmaps[slot[kept], :old_dense.shape[1]] = old_dense[old_slot[kept]]
+        to_set = dense[new_values]
+        promoted = dense[old_values] & ~was_dense[old_values]
+        bit_values = np.r_[new_values[to_set], old_values[promoted]]
+        bit_positions = np.r_[new_positions[to_set], np.asarray(old_positions)[promoted]].astype("int64")
+        np.bitwise_or.at(bitmaps.reshape(-1), slot[bit_values] * bitmaps.shape[1] + (bit_positions >> 3),
+                         (128 >> (bit_positions & 7)).astype("uint8"))
+
+        # Position lists: old positions (unpacked for values whose bitmap is
+        # dropped) followed by the new ones, which all come after them
+        demoted = {value: np.flatnonzero(np.unpackbits(old_dense[old_slot[value]], count=since))
+                   for value in np.flatnonzero(was_dense & ~dense)}
+        before = np.where(was_dense, 0, old_lengths)
+        before[list(demoted)] = [len(p) for p in demoted.values()]
+        lengths = np.where(dense, 0, counts)
+        offsets = np.r_[0, np.cumsum(lengths)].astype("int64")
+        positions = np.empty(int(offsets[-1]), dtype="int32")
+        moved = ~dense[old_values]
+        index = np.arange(len(old_values))
+        positions[offsets[old_values[moved]] + index[moved] - old_offsets[old_values[moved]]] = \
+            np.asarray(old_positions)[moved]
+        for value, unpacked in demoted.items():
+            positions[offsets[value]:offsets[value] + len(unpacked)] = unpacked
+        appended = ~dense[new_values]
+        rank = np.arange(len(new_values)) - new_first[new_values]
+        positions[offsets[new_values[appended]] + before[new_values[appended]] + rank[appended]] = \
+            new_positions[appended]
+
+        self._save(f"{dimension}.values", values)
+        self._save(f"{dimension}.counts", counts)
+        self._save(f"{dimension}.slot", slot)
+        self._save(f"{dimension}.dense", bitmaps)
+        self._save(f"{dimension}.offsets", offsets)
+        self._save(f"{dimension}.positions", positions)
+
+    def _merge_time(self, time, order, since):
+        """Insert events since.. (time, sorted by order) into the stored time order"""
+        stored_order = self._load("time.order")
+        stored = self._load("time.sorted")
+        # Ties keep event order, as a stable sort over all events would
+        at = np.searchsorted(_time_keys(np.asarray(stored)), _time_keys(time)[order], side="right")
+        self._save("time.order", np.insert(np.asarray(stored_order), at, order + since))
+        self._save("time.sorted", np.insert(np.asarray(stored), at, time[order]))
+
+    def _load(self, name):
+        return np.load(os.path.join(self.target, f"{name}.npy"), mmap_mode='r')
+
+    def _save(self, name, array):
+        path = os.path.join(self.target, f"{name}.npy")
+        # Replaced atomically, readers may have the old file open
+        _save(path + ".tmp.npy", array)
+        os.replace(path + ".tmp.npy", path)
+
+
+def rollback_bitmap_index(path, events_path, checkpoint):
+    """
+    Drop the parts appended after checkpoint (BitmapIndexWriter.checkpoint)
+    and rebuild the containers from the remaining ones; the event store
+    must have been rolled back first. Attributes dropped by the undone
+    appends stay unindexed.
+    """
+    writer = BitmapIndexWriter(path, events_path, append=True)
+    writer.part_rows = writer.part_rows[:checkpoint["parts"]]
+    for i, name in enumerate(writer.attributes):
+        size = checkpoint["dictionaries"].get(_attribute_file(i))
+        if name is not None and size is not None:
+            writer.dictionaries[name] = Interner(writer.dictionaries[name].index[:size].tolist())
+    writer.indexed = (0, 0, 0)
+    writer.close()
+
+
+def _time_keys(time):
+    """Sort keys of timestamps; events without one go last"""
+    return np.where(np.isnat(time), np.iinfo("int64").max, time.astype("int64"))
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST), 'r') as f:
+        return json.load(f)
+
+
+class BitmapIndex:
+    """
+    Read side of a BitmapIndexWriter directory. Selections are boolean
+    masks over the events of the log in event-store order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        manifest = read_manifest(path)
+        self.rows = manifest["rows"]
+        self.timed = manifest["timed"]
+        self.attributes = {name: _attribute_file(i) for i, name in enumerate(manifest["attributes"])
+                           if name is not None}
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+
+    def dimension(self, name):
+        """File name of a dimension: activity, object_type or an attribute column"""
+        if name in ("activity", "object_type"):
+            return name
+        if name in self.attributes:
+            return self.attributes[name]
+        raise KeyError(name)
+
+    def values(self, dimension):
+        """{value: event count} of a dimension"""
+        return dict(zip(self._load(f"{dimension}.values").tolist(), self._load(f"{dimension}.counts").tolist()))
+
+    def select(self, dimension, values):
+        """Events holding any of values in a dimension (bitmap OR); unknown values match nothing"""
+        names = self._load(f"{dimension}.values")
+        codes = np.flatnonzero(np.isin(names, np.asarray(values, dtype=str)))
+        slot = self._load(f"{dimension}.slot")
+        offsets = self._load(f"{dimension}.offsets")
+        positions = self._load(f"{dimension}.positions")
+
+        dense = [int(slot[code]) for code in codes if slot[code] >= 0]
+        if dense:
+            bitmaps = self._load(f"{dimension}.dense")
+            packed = np.bitwise_or.reduce(bitmaps[dense], axis=0)
+            mask = np.unpackbits(packed, count=self.rows).astype(bool)
+        else:
+            mask = np.zeros(self.rows, dtype=bool)
+        for code in codes:
+            if slot[code] < 0:
+                mask[positions[offsets[code]:offsets[code + 1]]] = True
+        return mask
+
+    def filter(self, activities=None, object_types=None, start=None, end=None, attribute=None, values=None,
+               case=None):
+        """
+        Events matching every given filter (AND); each filter is a list of
+        values (OR). start/end are epoch milliseconds, end exclusive. The
+        attribute filter keeps whole cases, those with an event holding one
+        of values, and needs the case code of every event in case. Raises
+        KeyError for an attribute that is not indexed.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        if activities:
+            mask &= self.select("activity", activities)
+        if object_types:
+            mask &= self.select("object_type", object_types)
+        if start is not None or end is not None:
+            mask &= self.time_window(None if start is None else np.datetime64(start, "ms"),
+                                     None if end is None else np.datetime64(end, "ms"))
+        if attribute is not None:
+            case = np.asarray(case)
+            matched = np.zeros(int(case.max()) + 1 if len(case) else 0, dtype=bool)
+            matched[case[self.select(self.dimension(attribute), values)]] = True
+            mask &= matched[case]
+        return mask
+
+    def time_window(self, start=None, end=None):
+        """Events with start <= time < end (datetime64[ms]; None leaves a side open)"""
+        # Events without a timestamp sort last and match no window
+        stamps = self._load("time.sorted")[:self.timed]
+        low = np.searchsorted(stamps, start) if start is not None else 0
+        high = np.searchsorted(stamps, end) if end is not None else self.timed
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[self._load("time.order")[low:high]] = True
+        return mask
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from compression import compress
+
+
+class CacheEntry:
+    def __init__(self, body, version):
+        self.body = body
+        self.version = version
+        self.etag = hashlib.sha1(body).hexdigest()
+        # Compressed copies of the body by codec, made on first request
+        self.encodings = {}
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(data) for data in self.encodings.values())
+
+
+class ResponseCache:
+    """
+    In-process LRU of serialized response bodies, bounded by the total size
+    of the bodies it holds. Every entry remembers the artifact version it
+    was built from and is dropped as soon as a lookup sees a newer version.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.version != version:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body):
+        entry = CacheEntry(body, version)
+        if len(body) > self.max_bytes:
+            return entry
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.size += len(body)
+            self._evict()
+        return entry
+
+    def encoded(self, key, entry, codec):
+        """
+        The body of entry compressed with codec. It is compressed once and
+        kept with the entry, counting towards the byte budget, so repeated
+        requests are served the stored bytes.
+        """
+        data = entry.encodings.get(codec)
+        if data is not None:
+            return data
+        data = compress(entry.body, codec)
+        with self.lock:
+            if self.entries.get(key) is entry and codec not in entry.encodings:
+                entry.encodings[codec] = data
+                self.size += len(data)
+                self._evict()
+        return data
+
+    def _evict(self):
+        while self.size > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, file_id):
+        with self.lock:
+            for key in [k for k in self.entries if k[1] == file_id]:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key).size
+
+    def record_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "notModified": self.not_modified,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "maxBytes": self.max_bytes
+            }
@@ -0,0 +1,237 @@
+import gzip
+import io
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional: only .zst uploads and zstd artifacts need it
+    zstandard = None
+
+# Codec of each file suffix, and the other way round
+SUFFIX_CODECS = {".gz": "gzip", ".zst": "zstd"}
+CODEC_SUFFIXES = {codec: suffix for suffix, codec in SUFFIX_CODECS.items()}
+
+# Fast levels: artifacts are written on every upload and read rarely
+LEVELS = {"gzip": 1, "zstd": 3}
+
+# First bytes of a gzip member / zstd frame
+MAGIC = {"gzip": b"\x1f\x8b\x08", "zstd": b"\x28\xb5\x2f\xfd"}
+
+# Bytes read at a time when scanning or decompressing files
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def codec_of(path):
+    """Compression codec implied by a file name, None for plain files"""
+    for suffix, codec in SUFFIX_CODECS.items():
+        if path.endswith(suffix):
+            return codec
+    return None
+
+
+def find_artifact(path):
+    """
+    path if it exists, else the same file with another compression suffix
+    (or none) if that exists, e.g. one written before the codec changed
+    """
+    if os.path.exists(path):
+        return path
+    codec = codec_of(path)
+    base = path[:-len(CODEC_SUFFIXES[codec])] if codec else path
+    for candidate in [base] + [base + suffix for suffix in SUFFIX_CODECS]:
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+
+def available(codec):
+    return codec == "gzip" or (codec == "zstd" and zstandard is not None)
+
+
+def check_codec(codec):
+    if not available(codec):
+        raise ValueError(f"{codec} compression needs the zstandard package" if codec == "zstd"
+                         else f"Unknown compression: {codec}")
+
+
+def _compressor(codec, level=None):
+    level = LEVELS[codec] if level is None else level
+    if codec == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return zstandard.ZstdCompressor(level=level, write_checksum=True).compressobj()
+
+
+def _decompressor(codec):
+    if codec == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _errors():
+    return (zlib.error, zstandard.ZstdError) if zstandard is not None else (zlib.error,)
+
+
+def compress(data, codec, level=None):
+    compressor = _compressor(codec, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress_chunks(chunks, codec):
+    """
+    Decompress an iterable of compressed chunks holding any number of
+    concatenated gzip members or zstd frames, yielding the plain bytes as
+    they become available. Raises ValueError on corrupt or truncated input.
+    """
+    check_codec(codec)
+    decoder, pending = _decompressor(codec), False
+    try:
+        for chunk in chunks:
+            while chunk:
+                data = decoder.decompress(chunk)
+                pending = True
+                if data:
+                    yield data
+                if not decoder.eof:
+                    break
+                chunk, pending = decoder.unused_data, False
+                decoder = _decompressor(codec)
+    except _errors() as e:
+        raise ValueError(f"Corrupt {codec} data: {e}")
+    if pending:
+        raise ValueError(f"Truncated {codec} data")
+
+
+class MemberWriter(io.RawIOBase):
+    """
+    Binary file that compresses what is written to it into gzip members or
+    zstd frames on an underlying file. end_member() finishes the current
+    one; the next write starts another, which can later be found and
+    replaced on its own (see last_member()).
+    """
+
+    def __init__(self, fh, codec, level=None):
+        check_codec(codec)
+        self.fh = fh
+        self.codec = codec
+        self.level = level
+        self.compressor = None
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.compressor is None:
+            self.compressor = _compressor(self.codec, self.level)
+        self.fh.write(self.compressor.compress(bytes(data)))
+        return len(data)
+
+    def end_member(self):
+        if self.compressor is not None:
+            self.fh.write(self.compressor.flush())
+            self.compressor = None
+
+    def close(self):
+        if not self.closed:
+            self.end_member()
+            self.fh.close()
+        super().close()
+
+
+class _ChunkReader(io.RawIOBase):
+    """Readable binary file over an iterator of byte chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self.pending):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+
+def _blocks(fh):
+    while True:
+        block = fh.read(READ_BLOCK_SIZE)
+        if not block:
+            return
+        yield block
+
+
+def _read_blocks(fh):
+    with fh:
+        yield from _blocks(fh)
+
+
+def open_artifact(path, mode='r'):
+    """
+    Open a plain or compressed (by suffix) artifact for reading or writing
+    text ('r'/'w') or bytes ('rb'/'wb'). Compressed files are read across
+    all their members/frames; written ones get one member per end_member().
+    """
+    codec = codec_of(path)
+    if codec is None:
+        return open(path, mode, encoding=None if 'b' in mode else 'utf-8')
+    check_codec(codec)
+    if mode.startswith('w'):
+        raw = MemberWriter(open(path, 'wb'), codec)
+        buffered = io.BufferedWriter(raw, READ_BLOCK_SIZE)
+    elif codec == "gzip":
+        buffered = gzip.open(path, 'rb')
+    else:
+        buffered = io.BufferedReader(_ChunkReader(decompress_chunks(_read_blocks(open(path, 'rb')), codec)),
+                                     READ_BLOCK_SIZE)
+    return buffered if 'b' in mode else io.TextIOWrapper(buffered, encoding='utf-8')
+
+
+def end_member(fh):
+    """Finish the current member of a file from open_artifact (no-op when plain)"""
+    fh.flush()
+    raw = getattr(getattr(fh, 'buffer', fh), 'raw', None)
+    if isinstance(raw, MemberWriter):
+        raw.end_member()
+
+
+def last_member(path):
+    """
+    (offset, plain bytes) of the last gzip member / zstd frame of a
+    compressed file. Candidates are found by scanning back for the magic
+    bytes; one only counts if it decompresses exactly to the end of the file.
+    """
+    codec = codec_of(path)
+    check_codec(codec)
+    magic = MAGIC[codec]
+    with open(path, 'rb') as f:
+        end = f.seek(0, 2)
+        position = end
+        while position > 0:
+            start = max(0, position - READ_BLOCK_SIZE)
+            f.seek(start)
+            block = f.read(position - start + len(magic) - 1)
+            found = block.rfind(magic)
+            while found >= 0:
+                offset = start + found
+                f.seek(offset)
+                try:
+                    decoder, parts = _decompressor(codec), []
+                    for chunk in _blocks(f):
+                        parts.append(decoder.decompress(chunk))
+                        if decoder.eof:
+                            break
+                    if decoder.eof and not decoder.unused_data and f.tell() == end:
+                        return offset, b"".join(parts)
+                except _errors():
+                    pass
+                found = block.rfind(magic, 0, found + len(magic) - 1)
+            position = start
+    raise ValueError(f"No complete {codec} member found in {path}")
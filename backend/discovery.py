@@ -0,0 +1,446 @@
+import numpy as np
+import pandas as pd
+from artifacts import read_events, read_manifest
+from jobs import partition_map
+
+# Aggregated columns kept per directly-follows edge. Durations are whole
+# milliseconds so totals add up exactly regardless of merge order.
+EDGE_COLUMNS = ["count", "duration_count", "duration_total", "duration_min", "duration_max"]
+EDGE_REDUCERS = {
+    "count": "sum",
+    "duration_count": "sum",
+    "duration_total": "sum",
+    "duration_min": "min",
+    "duration_max": "max"
+}
+
+_MS = np.timedelta64(1, "ms")
+
+# Logs with fewer events are discovered serially even with workers > 1:
+# starting partitions costs more than it saves on them
+PARALLEL_MIN_ROWS = 200000
+
+# Constants of the splitmix64 finalizer used to mix hashes
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _duration_ms(later, earlier):
+    delta = later - earlier
+    timed = ~np.isnat(delta)
+    ms = np.zeros(len(delta), dtype="int64")
+    ms[timed] = delta[timed] // _MS
+    return ms, timed
+
+
+def _aggregate_edges(source, target, ms, timed):
+    edges = pd.DataFrame({
+        "source": source,
+        "target": target,
+        "count": 1,
+        "duration_count": timed.astype("int64"),
+        "duration_total": ms,
+        "duration_min": np.where(timed, ms, np.nan),
+        "duration_max": np.where(timed, ms, np.nan)
+    })
+    return edges.groupby(["source", "target"], sort=False).agg(EDGE_REDUCERS)
+
+
+def _empty_edges():
+    index = pd.MultiIndex.from_arrays([[], []], names=["source", "target"])
+    return pd.DataFrame({c: pd.Series(dtype="float64" if c in ("duration_min", "duration_max") else "int64")
+                         for c in EDGE_COLUMNS}, index=index)
+
+
+def _ranked(counts):
+    """Counts ordered by frequency, then by name"""
+    return counts.sort_index().sort_values(ascending=False, kind="mergesort")
+
+
+def _grown(array, size, fill):
+    """array extended to size entries with fill"""
+    if len(array) >= size:
+        return array
+    return np.concatenate([array, np.full(size - len(array), fill, dtype=array.dtype)])
+
+
+class DiscoveryState:
+    """
+    Mergeable directly-follows statistics for an event log, kept over the
+    int32 codes of its event table (see event_log.EventTable).
+
+    Holds activity and start activity frequencies (arrays by activity
+    code), directly-follows edge counts with duration aggregates (indexed
+    by pairs of activity codes) and the last event of every case (arrays
+    by case code, last_activity -1 for cases without events). update()
+    folds in a block of new events (a whole log, a streamed chunk or
+    appended rows) and merge() combines states built over disjoint cases;
+    all blocks and states must share the dictionaries, which to_model()
+    decodes the names from.
+    """
+
+    def __init__(self, dictionaries=None):
+        self.dictionaries = dictionaries
+        self.total_events = 0
+        self.activity_counts = np.zeros(0, dtype="int64")
+        self.start_counts = np.zeros(0, dtype="int64")
+        self.edges = _empty_edges()
+        self.last_activity = np.zeros(0, dtype="int32")
+        self.last_time = np.zeros(0, dtype="datetime64[ms]")
+
+    @property
+    def total_cases(self):
+        return int((self.last_activity >= 0).sum())
+
+    def _grow(self, activities, cases):
+        self.activity_counts = _grown(self.activity_counts, activities, 0)
+        self.start_counts = _grown(self.start_counts, activities, 0)
+        self.last_activity = _grown(self.last_activity, cases, -1)
+        self.last_time = _grown(self.last_time, cases, np.datetime64("NaT"))
+
+    def known_cases(self, case):
+        """Whether each case code already has events in the state"""
+        case = np.asarray(case)
+        known = case < len(self.last_activity)
+        known[known] = self.last_activity[case[known]] >= 0
+        return known
+
+    def update(self, events):
+        """
+        Fold a block of events (an EventTable) into the statistics in one
+        vectorized pass. Events of a case that was already seen must not
+        be older than that case's last known event.
+        """
+        if self.dictionaries is None:
+            self.dictionaries = events.dictionaries
+        return self.update_codes(events["case"], events["activity"], events["time"])
+
+    def update_codes(self, case, activity, time):
+        """update() for the case, activity and time columns of a block"""
+        if len(case) == 0:
+            return self
+        case, activity, time = np.asarray(case), np.asarray(activity), np.asarray(time, dtype="datetime64[ms]")
+        self._grow(int(activity.max()) + 1, int(case.max()) + 1)
+
+        # By case, then time (unparseable last), then log order
+        order = np.lexsort((time, case))
+        case, activity, time = case[order], activity[order], time[order]
+
+        first = np.empty(len(case), dtype=bool)
+        first[0] = True
+        first[1:] = case[1:] != case[:-1]
+        last = np.empty(len(case), dtype=bool)
+        last[:-1] = first[1:]
+        last[-1] = True
+
+        # Edges inside the block: each event to the next one of the same case
+        follows = ~last[:-1]
+        ms, timed = _duration_ms(time[1:][follows], time[:-1][follows])
+        edge_parts = [_aggregate_edges(activity[:-1][follows], activity[1:][follows], ms, timed)]
+
+        # Edges across the block boundary: a known case's last event to its
+        # first event in this block. Unknown cases start here.
+        heads = case[first]
+        known = self.last_activity[heads] >= 0
+        if known.any():
+            ms, timed = _duration_ms(time[first][known], self.last_time[heads[known]])
+            edge_parts.append(_aggregate_edges(self.last_activity[heads[known]], activity[first][known], ms, timed))
+
+        size = len(self.activity_counts)
+        self.start_counts += np.bincount(activity[first][~known], minlength=size)
+        self.activity_counts += np.bincount(activity, minlength=size)
+        self.edges = self._merge_edges([self.edges] + edge_parts)
+
+        self.last_activity[case[last]] = activity[last]
+        self.last_time[case[last]] = time[last]
+        self.total_events += len(case)
+        return self
+
+    def merge(self, other):
+        """
+        Combine with a state built over a disjoint set of cases
+        """
+        self._grow(len(other.activity_counts), len(other.last_activity))
+        activities = len(other.activity_counts)
+        self.total_events += other.total_events
+        self.activity_counts[:activities] += other.activity_counts
+        self.start_counts[:activities] += other.start_counts
+        self.edges = self._merge_edges([self.edges, other.edges])
+        cases = np.flatnonzero(other.last_activity >= 0)
+        self.last_activity[cases] = other.last_activity[cases]
+        self.last_time[cases] = other.last_time[cases]
+        return self
+
+    @staticmethod
+    def _merge_edges(parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return _empty_edges()
+        if len(parts) == 1:
+            return parts[0]
+        return pd.concat(parts).groupby(level=["source", "target"], sort=False).agg(EDGE_REDUCERS)
+
+    def _named(self, counts):
+        """Non-zero counts by activity code as a Series indexed by name"""
+        names = self.dictionaries.names("activity")[:len(counts)]
+        present = counts > 0
+        return pd.Series(counts[present], index=pd.Index(names[present], dtype=object))
+
+    def end_counts(self):
+        cases = self.last_activity[self.last_activity >= 0]
+        return np.bincount(cases, minlength=len(self.activity_counts)).astype("int64")
+
+    def to_model(self):
+        """
+        Columnar process model: activities ranked by frequency, edges as
+        integer positions into that ranking
+        """
+        names = self.dictionaries.names("activity")
+        edges = self.edges
+        if len(edges):
+            edges = edges.set_axis(pd.MultiIndex.from_arrays(
+                [names[edges.index.get_level_values("source")], names[edges.index.get_level_values("target")]],
+                names=["source", "target"]))
+        ranked, model = _columnar_model(self._named(self.activity_counts), self._named(self.start_counts),
+                                        self._named(self.end_counts()), edges, self.total_events, self.total_cases)
+
+        # Last event of every case, so appended events can continue it;
+        # sorted so the model does not depend on the order of the cases
+        cases = np.flatnonzero(self.last_activity >= 0)
+        case_names = np.array([str(c) for c in self.dictionaries.names("case")[cases]], dtype=str)
+        order = np.argsort(case_names, kind="stable")
+        model.update({
+            "last_case": case_names[order],
+            "last_activity": ranked.get_indexer(names[self.last_activity[cases[order]]]).astype("int32"),
+            "last_time": self.last_time[cases[order]]
+        })
+        return model
+
+    @classmethod
+    def from_model(cls, model, dictionaries):
+        """
+        Rebuild the state saved by to_model() without touching any events,
+        in the codes of dictionaries (those of the log's event store)
+        """
+        state = cls(dictionaries)
+        codes = dictionaries.columns["activity"].encode(model["activities"].tolist())
+        cases = dictionaries.columns["case"].encode(model["last_case"].tolist())
+        state._grow(len(dictionaries.columns["activity"]), len(dictionaries.columns["case"]))
+        state.total_events = int(model["total_events"])
+        state.activity_counts[codes] = np.asarray(model["activity_count"])
+        state.start_counts[codes] = np.asarray(model["start_count"])
+
+        index = pd.MultiIndex.from_arrays([codes[np.asarray(model["edge_source"])],
+                                           codes[np.asarray(model["edge_target"])]], names=["source", "target"])
+        state.edges = pd.DataFrame({
+            "count": np.array(model["edge_count"]),
+            "duration_count": np.array(model["edge_duration_count"]),
+            "duration_total": np.array(model["edge_duration_total"]),
+            "duration_min": np.array(model["edge_duration_min"]),
+            "duration_max": np.array(model["edge_duration_max"])
+        }, index=index)
+
+        state.last_activity[cases] = codes[np.asarray(model["last_activity"])]
+        state.last_time[cases] = np.asarray(model["last_time"])
+        return state
+
+    def to_process_data(self):
+        return process_data_from_model(self.to_model())
+
+
+def _columnar_model(activity_counts, start_counts, end_counts, edges, total_events, total_cases):
+    """Activity ranking and the columnar model arrays (see DiscoveryState.to_model)"""
+    activities = _ranked(activity_counts)
+    names = activities.index
+    edges = edges.sort_index().sort_values("count", ascending=False, kind="mergesort")
+    return names, {
+        "activities": np.array(names.tolist(), dtype=str),
+        "activity_count": activities.to_numpy(dtype="int64"),
+        "start_count": start_counts.reindex(names, fill_value=0).to_numpy(dtype="int64"),
+        "end_count": end_counts.reindex(names, fill_value=0).to_numpy(dtype="int64"),
+        "edge_source": names.get_indexer(edges.index.get_level_values("source")).astype("int32"),
+        "edge_target": names.get_indexer(edges.index.get_level_values("target")).astype("int32"),
+        "edge_count": edges["count"].to_numpy(dtype="int64"),
+        "edge_duration_count": edges["duration_count"].to_numpy(dtype="int64"),
+        "edge_duration_total": edges["duration_total"].to_numpy(dtype="int64"),
+        "edge_duration_min": edges["duration_min"].to_numpy(dtype="float64"),
+        "edge_duration_max": edges["duration_max"].to_numpy(dtype="float64"),
+        "total_events": np.int64(total_events),
+        "total_cases": np.int64(total_cases)
+    }
+
+
+def discover_codes(order, starts, activity, time, names):
+    """
+    Process model of dictionary-encoded events already grouped into traces
+    (order and starts from variants.case_traces): the same statistics as
+    DiscoveryState, computed over integer codes without building an event
+    table, for sub-logs selected from an event store. activity holds codes
+    into names. The per-case state for appends is not included.
+    """
+    names = np.asarray(names, dtype=object)
+    activity = np.asarray(activity)[order]
+    time = np.asarray(time)[order]
+    total = len(order)
+
+    first = np.zeros(total, dtype=bool)
+    first[starts] = True
+    ends = np.r_[np.asarray(starts)[1:] - 1, total - 1] if total else np.empty(0, dtype="int64")
+    follows = ~first[1:]
+    ms, timed = _duration_ms(time[1:][follows], time[:-1][follows])
+    edges = _aggregate_edges(activity[:-1][follows], activity[1:][follows], ms, timed)
+    if len(edges):
+        edges.index = pd.MultiIndex.from_arrays([names[edges.index.get_level_values("source")],
+                                                 names[edges.index.get_level_values("target")]],
+                                                names=["source", "target"])
+    else:
+        edges = _empty_edges()
+
+    def counts(codes):
+        counted = pd.Series(np.bincount(codes, minlength=len(names)), index=pd.Index(names, dtype=object))
+        return counted[counted > 0].astype("int64")
+
+    _, model = _columnar_model(counts(activity), counts(activity[starts]), counts(activity[ends]), edges,
+                               total, len(starts))
+    return model
+
+
+def process_data_from_model(model):
+    """
+    Render a columnar process model as the JSON structure served by the API
+    """
+    names = model["activities"].tolist()
+    counts = model["activity_count"].tolist()
+    starts = pd.Series(model["start_count"], index=names)
+    ends = pd.Series(model["end_count"], index=names)
+    # Simplified models keep the node ids of the full model
+    ids = model["activity_ids"].tolist() if "activity_ids" in model else range(len(names))
+
+    nodes = [{
+        "id": f"a{idx}",
+        "name": name,
+        "type": "activity",
+        "frequency": count,
+        "start": start,
+        "end": end
+    } for idx, name, count, start, end in zip(ids, names, counts, starts.tolist(), ends.tolist())]
+
+    edges = []
+    for source, target, count, timed, total, low, high in zip(
+            model["edge_source"].tolist(), model["edge_target"].tolist(), model["edge_count"].tolist(),
+            model["edge_duration_count"].tolist(), model["edge_duration_total"].tolist(),
+            model["edge_duration_min"].tolist(), model["edge_duration_max"].tolist()):
+        edges.append({
+            "source": f"a{ids[source]}",
+            "target": f"a{ids[target]}",
+            "value": count,
+            "duration": {
+                "mean": total / timed / 1000.0 if timed else None,
+                "min": low / 1000.0 if timed else None,
+                "max": high / 1000.0 if timed else None
+            }
+        })
+    
+    # Approximate models also carry duration percentiles from t-digests
+    if "edge_duration_p50" in model:
+        for edge, p50, p90, p99, error in zip(edges, model["edge_duration_p50"].tolist(),
+                                              model["edge_duration_p90"].tolist(),
+                                              model["edge_duration_p99"].tolist(),
+                                              model["edge_duration_rank_error"].tolist()):
+            timed = edge["duration"]["mean"] is not None
+            edge["duration"].update({
+                "p50": p50 / 1000.0 if timed else None,
+                "p90": p90 / 1000.0 if timed else None,
+                "p99": p99 / 1000.0 if timed else None,
+                "rankError": error if timed else None
+            })
+
+    statistics = {
+        "totalCases": int(model["total_cases"]),
+        "totalEvents": int(model["total_events"]),
+        "activities": dict(zip(names, counts)),
+        "startActivities": {a: int(c) for a, c in _ranked(starts[starts > 0]).items()},
+        "endActivities": {a: int(c) for a, c in _ranked(ends[ends > 0]).items()}
+    }
+    
+    # Error bounds of a model built from sketches (see approximate.py)
+    if "distinct_error" in model:
+        error = float(model["distinct_error"])
+        statistics["approximate"] = {
+            "totalCases": _distinct_bounds(int(model["total_cases"]), error),
+            "totalObjects": _distinct_bounds(int(model["total_objects"]), error),
+            "activityCountMaxOvercount": int(model["count_error"]),
+            "edgeCountMaxOvercount": int(model["edge_count_error"]),
+            "countConfidence": float(model["count_confidence"]),
+            "closedOpenCases": int(model["evicted_cases"])
+        }
+    
+    return {
+        "nodes": nodes,
+        "edges": edges,
+        "statistics": statistics
+    }
+
+
+def _distinct_bounds(estimate, error):
+    """Estimate with its standard error and a ~95% interval"""
+    return {
+        "estimate": estimate,
+        "relativeStandardError": error,
+        "lower95": int(np.floor(estimate * (1 - 2 * error))),
+        "upper95": int(np.ceil(estimate * (1 + 2 * error)))
+    }
+
+
+def _mix(values):
+    values = values ^ (values >> np.uint64(30))
+    values = values * _MIX_1
+    values = values ^ (values >> np.uint64(27))
+    values = values * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+def partition_cases(case, partitions):
+    """
+    Partition number of every event, from a hash of its case code so that
+    cases coded in arrival order do not cluster in one partition
+    """
+    return (_mix(np.asarray(case).astype("uint64")) % np.uint64(partitions)).astype("int64")
+
+
+def _store_columns(events_path):
+    columns = read_events(events_path, ("case", "activity", "time"))
+    return columns["case"], columns["activity"], columns["time"]
+
+
+def _partition_state(events_path, partition, partitions):
+    """Discovery over the cases of one partition, read from the memory-mapped event store"""
+    case, activity, time = (np.asarray(column) for column in _store_columns(events_path))
+    mine = partition_cases(case, partitions) == partition
+    return DiscoveryState().update_codes(case[mine], activity[mine], time[mine])
+
+
+def discover_parallel(events_path, dictionaries, workers, min_rows=None):
+    """
+    Map-reduce discovery over an event store: each worker of a long-lived
+    pool reads the store and discovers the cases of its hash partition,
+    and the partial states are merged. Every statistic is a sum, min or max
+    over cases, so the result is identical to DiscoveryState().update() of
+    the whole table. Logs below min_rows events (default
+    PARALLEL_MIN_ROWS) are discovered serially. dictionaries are those the
+    store was written with.
+    """
+    min_rows = PARALLEL_MIN_ROWS if min_rows is None else min_rows
+    state = DiscoveryState(dictionaries)
+    if workers <= 1 or sum(read_manifest(events_path)["parts"]) < min_rows:
+        return state.update_codes(*_store_columns(events_path))
+    for partial in partition_map(_partition_state, workers, events_path):
+        state.merge(partial)
+    return state
+
+
+def discover(events):
+    """
+    Discover the directly-follows process model of a complete event table
+    """
+    return DiscoveryState().update(events).to_process_data()
@@ -0,0 +1,378 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from event_log import CORE_COLUMNS, Interner, text_column
+
+# Rows handed to one executemany call while loading
+INSERT_BATCH_SIZE = 100000
+
+# Page cache of a loading connection, in KB
+LOAD_CACHE_KB = 64 * 1024
+
+# Relational layout after OCEL 2.0 (event, object, event_object), with
+# activities, object types and attribute names interned as integer ids and
+# event attributes kept in one typed key/value table instead of one table
+# per event type
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS activity (
+    activity_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS object_type (
+    type_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS attribute (
+    attribute_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- event_id is the position of the event in the log (event "e<event_id>");
+-- time is in milliseconds since the epoch, NULL when unparseable
+CREATE TABLE IF NOT EXISTS event (
+    event_id INTEGER PRIMARY KEY,
+    activity_id INTEGER NOT NULL,
+    time INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS object (
+    object_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    type_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS event_object (
+    object_id INTEGER NOT NULL,
+    event_id INTEGER NOT NULL,
+    qualifier TEXT,
+    PRIMARY KEY (object_id, event_id)
+) WITHOUT ROWID;
+
+-- value is the attribute as uploaded (as the OCEL export renders it);
+-- number repeats it parsed as a number where it parses, for range filters
+CREATE TABLE IF NOT EXISTS event_attribute (
+    attribute_id INTEGER NOT NULL,
+    event_id INTEGER NOT NULL,
+    value TEXT,
+    number REAL,
+    PRIMARY KEY (attribute_id, event_id)
+) WITHOUT ROWID;
+'''
+
+# Built once after the initial bulk load, which is faster than maintaining
+# them row by row
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS idx_event_activity ON event (activity_id, time);
+CREATE INDEX IF NOT EXISTS idx_event_time ON event (time);
+CREATE INDEX IF NOT EXISTS idx_object_type ON object (type_id);
+CREATE INDEX IF NOT EXISTS idx_event_object_event ON event_object (event_id);
+CREATE INDEX IF NOT EXISTS idx_event_attribute_value ON event_attribute (attribute_id, value)
+    WHERE value IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_event_attribute_number ON event_attribute (attribute_id, number)
+    WHERE number IS NOT NULL;
+'''
+
+
+def _names(conn, table, key):
+    return [row[0] for row in conn.execute(f"SELECT name FROM {table} ORDER BY {key}")]
+
+
+def _insert(conn, sql, columns):
+    rows = len(columns[0])
+    for start in range(0, rows, INSERT_BATCH_SIZE):
+        conn.executemany(sql, zip(*(c[start:start + INSERT_BATCH_SIZE] for c in columns)))
+
+
+class EventDatabaseWriter:
+    """
+    Loads event-table blocks into a per-upload SQLite database.
+
+    A new database is built in a staging file and moved into place on
+    close(), so readers never see a half-loaded log. With append=True the
+    blocks go into the existing database inside one transaction that
+    close() commits; abort() leaves the database as it was.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append_mode = append
+        self.target = path if append else path + ".tmp"
+        if not append and os.path.exists(self.target):
+            os.remove(self.target)
+        self.conn = sqlite3.connect(self.target, isolation_level=None)
+        self.conn.execute(f"PRAGMA cache_size=-{LOAD_CACHE_KB}")
+        if not append:
+            # Nothing can read the staging file, so the load needs no journal
+            self.conn.execute("PRAGMA journal_mode=OFF")
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.executescript(SCHEMA)
+        self.conn.execute("BEGIN")
+
+        self.activities = Interner(_names(self.conn, "activity", "activity_id"))
+        self.object_types = Interner(_names(self.conn, "object_type", "type_id"))
+        self.attributes = Interner(_names(self.conn, "attribute", "attribute_id"))
+        self.objects = Interner(_names(self.conn, "object", "object_id"))
+
+    def _intern(self, table, interner, values):
+        """Codes of values, inserting names that were not interned yet"""
+        known = len(interner)
+        codes = interner.encode(values)
+        if len(interner) > known:
+            names = interner.index[known:].tolist()
+            self.conn.executemany(f"INSERT INTO {table} VALUES (?, ?)", zip(range(known, len(interner)), names))
+        return codes
+
+    def _intern_codes(self, table, interner, codes, names):
+        """_intern() for codes into names, looking up each distinct one once"""
+        local, distinct = pd.factorize(codes)
+        return self._intern(table, interner, names[distinct])[local]
+
+    def append(self, events):
+        """
+        Load one block of events (an EventTable); its attribute columns
+        become event attributes and event ids are the positions of the
+        events in the log.
+        """
+        event_ids = events["event"]
+        activity = self._intern_codes("activity", self.activities, events["activity"],
+                                      events.dictionaries.names("activity"))
+        time = events["time"]
+        millis = np.where(np.isnat(time), None, time.astype("int64").astype(object))
+        _insert(self.conn, "INSERT INTO event VALUES (?, ?, ?)",
+                [event_ids.tolist(), activity.tolist(), millis.tolist()])
+
+        # Objects are added the first time they are seen, with their type
+        known = len(self.objects)
+        local, distinct = pd.factorize(events["object"])
+        ids = self.objects.encode(events.dictionaries.names("object")[distinct])
+        objects = ids[local]
+        if len(self.objects) > known:
+            _, first = np.unique(local, return_index=True)
+            new = ids >= known
+            types = self._intern_codes("object_type", self.object_types, events["object_type"][first[new]],
+                                       events.dictionaries.names("object_type"))
+            _insert(self.conn, "INSERT INTO object VALUES (?, ?, ?)",
+                    [list(range(known, len(self.objects))), self.objects.index[known:].tolist(), types.tolist()])
+        # Inserting in primary-key order keeps the B-tree appends sequential
+        order = np.lexsort((event_ids, objects))
+        _insert(self.conn, "INSERT OR IGNORE INTO event_object (object_id, event_id) VALUES (?, ?)",
+                [objects[order].tolist(), event_ids[order].tolist()])
+
+        for column in events.source_columns:
+            if column in CORE_COLUMNS:
+                continue
+            values = events.attributes[column]
+            if events.coded(column):
+                # Text is parsed as a number once per distinct value
+                present = values >= 0
+                local, distinct = pd.factorize(values[present])
+                values = pd.Series(events.dictionaries.attributes[column].index.to_numpy()[distinct], dtype=object)
+            else:
+                present = pd.notna(values)
+                values = pd.Series(values[present])
+                local = np.arange(len(values))
+            if not present.any():
+                continue
+            attribute = int(self._intern("attribute", self.attributes, [column])[0])
+            number = pd.to_numeric(values, errors="coerce")
+            text = text_column(values).astype(object).to_numpy()
+            number = number.astype(object).where(number.notna(), None).to_numpy()
+            _insert(self.conn, "INSERT INTO event_attribute VALUES (?, ?, ?, ?)",
+                    [[attribute] * len(local), event_ids[present].tolist(), text[local].tolist(),
+                     number[local].tolist()])
+
+    def close(self):
+        if not self.append_mode:
+            # executescript would commit first, so statements run one by one
+            for statement in INDEXES.split(";"):
+                if statement.strip():
+                    self.conn.execute(statement)
+        self.conn.execute("COMMIT")
+        if not self.append_mode:
+            # Sampled statistics are enough to choose between the indexes
+            self.conn.execute("PRAGMA analysis_limit=1000")
+            self.conn.execute("ANALYZE")
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.close()
+        if not self.append_mode:
+            os.replace(self.target, self.path)
+
+    def checkpoint(self):
+        """Row counts so far, to undo later appends with rollback_event_database"""
+        events = self.conn.execute("SELECT COALESCE(MAX(event_id) + 1, 0) FROM event").fetchone()[0]
+        return {"event": events, "object": len(self.objects), "activity": len(self.activities),
+                "object_type": len(self.object_types), "attribute": len(self.attributes)}
+
+    def abort(self):
+        try:
+            self.conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+        self.conn.close()
+        if not self.append_mode and os.path.exists(self.target):
+            os.remove(self.target)
+
+
+def rollback_event_database(path, checkpoint):
+    """Delete the events, objects and names added after checkpoint (EventDatabaseWriter.checkpoint)"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for table in ("event", "event_object", "event_attribute"):
+            conn.execute(f"DELETE FROM {table} WHERE event_id >= ?", (checkpoint["event"],))
+        for table, key in (("object", "object_id"), ("activity", "activity_id"), ("object_type", "type_id"),
+                           ("attribute", "attribute_id")):
+            conn.execute(f"DELETE FROM {table} WHERE {key} >= ?", (checkpoint[table],))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def connect(path):
+    """Read-only connection to an event database"""
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def _in(column, values):
+    return f"{column} IN ({', '.join('?' * len(values))})", list(values)
+
+
+def event_filters(activities=None, objects=None, object_types=None, start=None, end=None,
+                  attribute=None, value=None, min_value=None, max_value=None):
+    """
+    WHERE clause and parameters over the event table `e`. Every filter is
+    answered from an index: activities by name, objects by id, object types
+    by name, [start, end) in milliseconds, and one attribute compared by
+    its text as uploaded or as a number in [min_value, max_value].
+    """
+    where, params = [], []
+    if activities:
+        clause, names = _in("name", activities)
+        where.append(f"e.activity_id IN (SELECT activity_id FROM activity WHERE {clause})")
+        params += names
+    if objects:
+        clause, names = _in("o.name", objects)
+        where.append("e.event_id IN (SELECT eo.event_id FROM event_object eo "
+                     f"JOIN object o ON o.object_id = eo.object_id WHERE {clause})")
+        params += names
+    if object_types:
+        clause, names = _in("t.name", object_types)
+        where.append("e.event_id IN (SELECT eo.event_id FROM event_object eo "
+                     "JOIN object o ON o.object_id = eo.object_id JOIN object_type t ON t.type_id = o.type_id "
+                     f"WHERE {clause})")
+        params += names
+    if start is not None:
+        where.append("e.time >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("e.time < ?")
+        params.append(end)
+    if attribute is not None:
+        condition = ["a.attribute_id = (SELECT attribute_id FROM attribute WHERE name = ?)"]
+        params.append(attribute)
+        if value is not None:
+            condition.append("a.value = ?")
+            params.append(value)
+        if min_value is not None:
+            condition.append("a.number >= ?")
+            params.append(min_value)
+        if max_value is not None:
+            condition.append("a.number <= ?")
+            params.append(max_value)
+        where.append(f"e.event_id IN (SELECT a.event_id FROM event_attribute a WHERE {' AND '.join(condition)})")
+    return where, params
+
+
+def query_events(path, filters, after=None, limit=1000):
+    """
+    Events matching filters (see event_filters) in log order, starting
+    after event id `after`. Each event has its activity, time, objects and
+    attributes. Returns (events, id to continue after, or None at the end).
+    """
+    where, params = event_filters(**filters)
+    if after is not None:
+        where.append("e.event_id > ?")
+        params.append(after)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+    conn = connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT e.event_id, a.name, e.time FROM event e JOIN activity a ON a.activity_id = e.activity_id "
+            f"{clause} ORDER BY e.event_id LIMIT ?", params + [limit]).fetchall()
+        events = {event_id: {"id": f"e{event_id}", "activity": activity,
+                             "timestamp": _iso(time), "objects": [], "attributes": {}}
+                  for event_id, activity, time in rows}
+        if not events:
+            return [], None
+
+        ids, id_params = _in("eo.event_id", list(events))
+        for event_id, name, object_type in conn.execute(
+                "SELECT eo.event_id, o.name, t.name FROM event_object eo "
+                "JOIN object o ON o.object_id = eo.object_id JOIN object_type t ON t.type_id = o.type_id "
+                f"WHERE {ids}", id_params):
+            events[event_id]["objects"].append({"id": name, "type": object_type})
+
+        # One primary-key lookup per attribute name and event
+        ids, id_params = _in("v.event_id", list(events))
+        for event_id, name, value in conn.execute(
+                "SELECT v.event_id, a.name, v.value FROM attribute a "
+                f"CROSS JOIN event_attribute v ON v.attribute_id = a.attribute_id AND {ids}", id_params):
+            events[event_id]["attributes"][name] = value
+        return list(events.values()), rows[-1][0] if len(rows) == limit else None
+    finally:
+        conn.close()
+
+
+def count_events(path, filters):
+    where, params = event_filters(**filters)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    conn = connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM event e {clause}", params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def query_objects(path, object_types=None, after=None, limit=1000):
+    """
+    Objects in first-seen order, optionally of the given types, with the
+    number of events and the first and last event time of each. Returns
+    (objects, id to continue after, or None at the end).
+    """
+    where, params = [], []
+    if object_types:
+        clause, names = _in("t.name", object_types)
+        where.append(clause)
+        params += names
+    if after is not None:
+        where.append("o.object_id > ?")
+        params.append(after)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+    conn = connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT o.object_id, o.name, t.name, "
+            "(SELECT COUNT(*) FROM event_object eo WHERE eo.object_id = o.object_id), "
+            "(SELECT MIN(e.time) FROM event_object eo JOIN event e ON e.event_id = eo.event_id "
+            " WHERE eo.object_id = o.object_id), "
+            "(SELECT MAX(e.time) FROM event_object eo JOIN event e ON e.event_id = eo.event_id "
+            " WHERE eo.object_id = o.object_id) "
+            f"FROM object o JOIN object_type t ON t.type_id = o.type_id {clause} ORDER BY o.object_id LIMIT ?",
+            params + [limit]).fetchall()
+        objects = [{"id": name, "type": object_type, "events": count,
+                    "firstTimestamp": _iso(first), "lastTimestamp": _iso(last)}
+                   for _, name, object_type, count, first, last in rows]
+        return objects, rows[-1][0] if len(rows) == limit else None
+    finally:
+        conn.close()
+
+
+def _iso(millis):
+    if millis is None:
+        return None
+    return str(np.datetime64(int(millis), "ms").astype("datetime64[s]"))
@@ -0,0 +1,518 @@
+import json
+import re
+import shutil
+import numpy as np
+import pandas as pd
+from compression import MemberWriter, codec_of, end_member, last_member, open_artifact
+
+# Column names recognised in uploaded CSV exports
+CASE_COLUMN = "case_id"
+ACTIVITY_COLUMN = "activity"
+TIMESTAMP_COLUMN = "timestamp"
+OBJECT_TYPE_COLUMN = "object_type"
+
+DEFAULT_ACTIVITY = "unknown"
+DEFAULT_OBJECT_TYPE = "case"
+
+# Number of events rendered per write when serializing OCEL JSON
+WRITE_BATCH_SIZE = 100000
+
+_CONTROL_CHARS = r"[\x00-\x1f]"
+
+
+def text_column(values):
+    """
+    Render a column as strings the same way str() would render each cell
+    """
+    # Newer pandas keeps missing values as NaN after astype(str)
+    return values.astype(str).fillna("nan")
+
+
+def json_string_column(values):
+    """
+    JSON-encode every cell of a column as a string literal, column at a time
+    """
+    text = text_column(values)
+    text = text.str.replace("\\", "\\\\", regex=False).str.replace('"', '\\"', regex=False)
+    if text.str.contains(_CONTROL_CHARS, regex=True).any():
+        text = text.str.replace(_CONTROL_CHARS, lambda m: json.dumps(m.group(0))[1:-1], regex=True)
+    return '"' + text + '"'
+
+
+# Identifier columns are always read as text. Inferred per chunk, a column
+# of ids could be numbers in one chunk ("00123" -> 123) and text in the next
+TEXT_DTYPES = {CASE_COLUMN: str, ACTIVITY_COLUMN: str, OBJECT_TYPE_COLUMN: str}
+
+
+class EmptyLogError(ValueError):
+    """The uploaded CSV has no rows below its header"""
+
+
+def read_event_csv(source, chunksize=None):
+    """
+    Read an uploaded CSV (path or binary file object) whole, or as an
+    iterator of DataFrames of chunksize rows. Paths ending in .gz or .zst
+    are decompressed while they are read.
+    """
+    if isinstance(source, str) and codec_of(source):
+        source = open_artifact(source, 'rb')
+    return pd.read_csv(source, dtype=TEXT_DTYPES, chunksize=chunksize)
+
+
+# Event-table columns holding int32 codes into a dictionary of the log
+CODED_COLUMNS = ("case", "activity", "object", "object_type")
+
+# CSV columns that become event fields rather than attributes
+CORE_COLUMNS = (CASE_COLUMN, ACTIVITY_COLUMN, TIMESTAMP_COLUMN, OBJECT_TYPE_COLUMN)
+
+# Coded column holding the text of each core CSV column but the timestamp
+SOURCE_CODED_COLUMNS = {CASE_COLUMN: "case", ACTIVITY_COLUMN: "activity", OBJECT_TYPE_COLUMN: "object_type"}
+
+
+class EventDictionaries:
+    """
+    Interners of one log shared by all blocks of its event table, so a
+    value has the same code in every block: one per coded column and one
+    per text attribute column
+    """
+
+    def __init__(self, columns=None):
+        self.columns = {column: Interner() for column in CODED_COLUMNS}
+        self.columns.update(columns or {})
+        self.attributes = {}
+
+    def names(self, column):
+        """Values of a coded column, by code"""
+        return self.columns[column].index.to_numpy()
+
+
+class EventTable:
+    """
+    A block of events as flat arrays, in log order:
+
+        event           int64 position of the event in the log (OCEL id "e<event>")
+        case, activity, object, object_type
+                        int32 codes into dictionaries.columns
+        time            datetime64[ms], i.e. int64 milliseconds since the
+                        epoch (NaT where the timestamp does not parse)
+
+    attributes holds the other CSV columns as typed arrays: numeric columns
+    as parsed, text columns as int32 codes into dictionaries.attributes
+    (-1 where missing). timestamp keeps the timestamp text as uploaded,
+    which only the OCEL export needs (None without a timestamp column or
+    once compact() dropped it); source_columns is the CSV column order.
+    """
+
+    def __init__(self, columns, dictionaries, attributes=None, timestamp=None, source_columns=()):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.attributes = attributes or {}
+        self.timestamp = timestamp
+        self.source_columns = list(source_columns)
+
+    def __len__(self):
+        return len(self.columns["event"])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def take(self, rows):
+        """The events at rows (a slice, positions or a boolean mask)"""
+        return EventTable({column: values[rows] for column, values in self.columns.items()}, self.dictionaries,
+                          {name: values[rows] for name, values in self.attributes.items()},
+                          None if self.timestamp is None else self.timestamp.iloc[rows].reset_index(drop=True),
+                          self.source_columns)
+
+    def compact(self):
+        """The coded columns alone, for stages that need no attributes or timestamp text"""
+        return EventTable(self.columns, self.dictionaries, source_columns=self.source_columns)
+
+    def source_codes(self, column):
+        """
+        (codes, names) of a source CSV column held as codes, None for the
+        timestamp and numeric attribute columns
+        """
+        if column in SOURCE_CODED_COLUMNS:
+            return self.columns[SOURCE_CODED_COLUMNS[column]], self.dictionaries.names(SOURCE_CODED_COLUMNS[column])
+        if column != TIMESTAMP_COLUMN and self.coded(column):
+            return self.attributes[column], self.dictionaries.attributes[column].index.to_numpy()
+        return None
+
+    def text(self, column):
+        """A source CSV column rendered per event as text_column() renders it"""
+        if column == TIMESTAMP_COLUMN:
+            return self.timestamp if self.timestamp is not None else pd.Series("", index=range(len(self)))
+        coded = self.source_codes(column)
+        if coded is not None:
+            return pd.Series(_names_or_nan(*coded), dtype=object)
+        return text_column(pd.Series(self.attributes[column]))
+
+    def coded(self, attribute):
+        """Whether an attribute holds codes into dictionaries.attributes rather than numbers"""
+        return attribute in self.dictionaries.attributes and self.attributes[attribute].dtype == np.int32
+
+
+def _names_or_nan(codes, names):
+    """Names of codes, "nan" (as str() renders a missing cell) for -1"""
+    if not len(names):
+        return np.full(len(codes), "nan", dtype=object)
+    return np.where(codes >= 0, names[np.maximum(codes, 0)], "nan")
+
+
+def _encode_text(interner, values):
+    """
+    Codes of the text_column() rendering of every cell; each distinct value
+    is rendered and interned once, in first-seen order
+    """
+    local, uniques = pd.factorize(values, use_na_sentinel=False)
+    return interner.encode(text_column(pd.Series(uniques, dtype=object)).to_numpy())[local]
+
+
+def _encode_column(df, column, default, interner):
+    if column in df.columns:
+        return _encode_text(interner, df[column])
+    return np.full(len(df), interner.encode([default])[0], dtype="int32")
+
+
+def build_event_table(df, offset=0, dictionaries=None):
+    """
+    Build the integer-coded event table (EventTable) for a block of CSV
+    rows. offset is the position of the first row in the whole file, so
+    chunked callers still get globally unique event and object ids;
+    passing the same dictionaries keeps codes consistent across blocks.
+    """
+    dictionaries = dictionaries if dictionaries is not None else EventDictionaries()
+    columns = dictionaries.columns
+    event = np.arange(offset, offset + len(df), dtype="int64")
+
+    activity = _encode_column(df, ACTIVITY_COLUMN, DEFAULT_ACTIVITY, columns["activity"])
+    object_type = _encode_column(df, OBJECT_TYPE_COLUMN, DEFAULT_OBJECT_TYPE, columns["object_type"])
+
+    # Events of the same case share one object; without a case column every
+    # row is its own object, as in the original conversion
+    if CASE_COLUMN in df.columns:
+        case = _encode_text(columns["case"], df[CASE_COLUMN])
+        # Object ids are "<type>:<case>", rendered once per distinct pair
+        local, pairs = pd.factorize(object_type.astype("int64") * (1 << 31) + case)
+        names = (pd.Series(dictionaries.names("object_type")[pairs >> 31], dtype=object) + ":"
+                 + pd.Series(dictionaries.names("case")[pairs & ((1 << 31) - 1)], dtype=object))
+        obj = columns["object"].encode(names.to_numpy())[local]
+    else:
+        names = np.char.add("o", event.astype(str)).astype(object)
+        obj = columns["object"].encode(names)
+        case = columns["case"].encode(names)
+
+    if TIMESTAMP_COLUMN in df.columns:
+        time = pd.to_datetime(df[TIMESTAMP_COLUMN], errors="coerce", utc=True).dt.tz_convert(None)
+        time = time.to_numpy().astype("datetime64[ms]")
+        timestamp = text_column(df[TIMESTAMP_COLUMN]).reset_index(drop=True)
+    else:
+        time = np.full(len(df), np.datetime64("NaT"), dtype="datetime64[ms]")
+        timestamp = None
+
+    attributes = {}
+    for column in df.columns:
+        if column in CORE_COLUMNS:
+            continue
+        name, values = str(column), df[column]
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biuf":
+            attributes[name] = values.to_numpy()
+            continue
+        interner = dictionaries.attributes.setdefault(name, Interner())
+        codes = np.full(len(df), -1, dtype="int32")
+        present = values.notna().to_numpy()
+        codes[present] = _encode_text(interner, values[present])
+        attributes[name] = codes
+
+    return EventTable({
+        "event": event,
+        "case": case,
+        "activity": activity,
+        "object": obj,
+        "object_type": object_type,
+        "time": time
+    }, dictionaries, attributes, timestamp, [str(c) for c in df.columns])
+
+
+class OcelJsonWriter:
+    """
+    Writes an OCEL JSON document incrementally from event-table batches.
+    Event entries are rendered with whole-column string operations; objects
+    are de-duplicated and written once the last batch has been seen.
+    """
+
+    def __init__(self, fh, attribute_names):
+        self.fh = fh
+        self.attribute_names = list(attribute_names)
+        self.objects = []
+        self.dictionaries = None
+        self.events_written = 0
+
+    def begin(self):
+        header = {
+            "ocel:global-event": {"ocel:activity": "__INVALID__"},
+            "ocel:global-object": {"ocel:type": "__INVALID__"},
+            "ocel:global-log": {"ocel:attribute-names": self.attribute_names},
+        }
+        self.fh.write(json.dumps(header)[:-1])
+        self.fh.write(', "ocel:events": {\n')
+
+    def write_events(self, events):
+        """
+        Write one batch of events (an EventTable), vmaps from its source columns
+        """
+        for lines in event_lines(events):
+            if self.events_written:
+                self.fh.write(",\n")
+            self.fh.write(",\n".join(lines))
+            self.events_written += len(lines)
+
+        self.objects.append(_first_objects(events))
+        self.dictionaries = events.dictionaries
+
+    def finish(self):
+        # Compressed files get the objects section in a member of its own,
+        # so appends can replace it without decompressing the events
+        end_member(self.fh)
+        self.fh.write(OBJECTS_MARKER)
+        if self.objects:
+            objects = np.concatenate([o for o, _ in self.objects])
+            types = np.concatenate([t for _, t in self.objects])
+            _, first = np.unique(objects, return_index=True)
+            first.sort()
+            self.fh.write(",\n".join(object_lines(objects[first], types[first], self.dictionaries)))
+        self.fh.write("\n}}\n")
+
+
+# Separator between the events and objects sections of a written document
+OBJECTS_MARKER = '\n}, "ocel:objects": {\n'
+
+
+def _json_codes(codes, names):
+    """JSON string literals of the names of codes ("nan" for -1), each distinct name rendered once"""
+    local, distinct = pd.factorize(codes)
+    return json_string_column(pd.Series(_names_or_nan(distinct, names), dtype=object)).to_numpy()[local]
+
+
+def _json_column(events, column):
+    """A source CSV column of events as JSON string literals"""
+    coded = events.source_codes(column)
+    if coded is not None:
+        return _json_codes(*coded)
+    return json_string_column(events.text(column)).to_numpy()
+
+
+def _first_objects(events):
+    """Object codes of events in first-seen order, with the object type code of each"""
+    objects, first = np.unique(events["object"], return_index=True)
+    order = np.argsort(first)
+    return objects[order], events["object_type"][first[order]]
+
+
+def event_lines(events):
+    """
+    Render events as OCEL JSON entries, yielding one list of lines per
+    WRITE_BATCH_SIZE events
+    """
+    for start in range(0, len(events), WRITE_BATCH_SIZE):
+        batch = events.take(slice(start, start + WRITE_BATCH_SIZE))
+        if len(batch) == 0:
+            continue
+
+        vmap = None
+        for column in batch.source_columns:
+            pair = json.dumps(column) + ": " + _json_column(batch, column)
+            vmap = pair if vmap is None else vmap + ", " + pair
+        if vmap is None:
+            vmap = ""
+
+        lines = (
+            '"e' + pd.Series(batch["event"]).astype(str).to_numpy(dtype=object)
+            + '": {"ocel:activity": ' + _json_codes(batch["activity"], batch.dictionaries.names("activity"))
+            + ', "ocel:timestamp": ' + _json_column(batch, TIMESTAMP_COLUMN)
+            + ', "ocel:omap": [' + _json_codes(batch["object"], batch.dictionaries.names("object"))
+            + '], "ocel:vmap": {' + vmap + "}}"
+        )
+        yield lines.tolist()
+
+
+def object_lines(objects, types, dictionaries):
+    """OCEL JSON entries of objects (codes) with their object type codes"""
+    return (
+        _json_codes(objects, dictionaries.names("object"))
+        + ': {"ocel:type": ' + _json_codes(types, dictionaries.names("object_type"))
+        + ', "ocel:ovmap": {}}'
+    ).tolist()
+
+
+def _objects_section(section):
+    """
+    Split the objects section of a written document (starting at
+    OBJECTS_MARKER) into its entries and the set of object ids they hold
+    """
+    existing = section[len(OBJECTS_MARKER):].rstrip()
+    existing = existing[:-2].rstrip() if existing.endswith(b"}}") else existing
+    known = {m.decode("utf-8") for m in re.findall(rb'^("(?:[^"\\]|\\.)*"): \{"ocel:type"', existing, re.M)}
+    return existing, known
+
+
+def _objects_tail(existing, known, events):
+    """The objects section again, extended with the objects of events not yet in it"""
+    objects, types = _first_objects(events)
+    new = ~np.isin(_json_codes(objects, events.dictionaries.names("object")), list(known))
+    tail = OBJECTS_MARKER.encode("utf-8") + existing
+    if new.any():
+        lines = object_lines(objects[new], types[new], events.dictionaries)
+        tail += ((",\n" if existing else "") + ",\n".join(lines)).encode("utf-8")
+    return tail + b"\n}}\n"
+
+
+def append_ocel_events(ocel_path, events):
+    """
+    Append events (an EventTable) to an OCEL JSON file written by
+    OcelJsonWriter. Only the objects section at the end of the file is read
+    back and rewritten; existing events are left untouched.
+    """
+    if codec_of(ocel_path):
+        return _append_compressed_ocel_events(ocel_path, events)
+
+    position = _objects_position(ocel_path)
+    with open(ocel_path, "r+b") as f:
+        f.seek(position)
+        existing, known = _objects_section(f.read())
+
+        # An empty events section ends right after its opening brace
+        f.seek(position - 2)
+        has_events = f.read(2) != b"{\n"
+
+        f.seek(position)
+        f.truncate()
+        for lines in event_lines(events):
+            f.write(((",\n" if has_events else "") + ",\n".join(lines)).encode("utf-8"))
+            has_events = True
+        f.write(_objects_tail(existing, known, events))
+
+
+def _objects_position(ocel_path):
+    """
+    Offset of the objects section of an OCEL file written by
+    OcelJsonWriter (of the member holding it, when compressed): everything
+    append_ocel_events rewrites starts there
+    """
+    if codec_of(ocel_path):
+        return last_member(ocel_path)[0]
+
+    marker = OBJECTS_MARKER.encode("utf-8")
+    with open(ocel_path, "rb") as f:
+        # Found by scanning backwards from the end
+        position = f.seek(0, 2)
+        while True:
+            if position == 0:
+                raise ValueError("Not an OCEL file written by OcelJsonWriter")
+            start = max(0, position - 1024 * 1024)
+            f.seek(start)
+            found = f.read(position - start + len(marker) - 1).rfind(marker)
+            if found >= 0:
+                return start + found
+            position = start
+
+
+def ocel_checkpoint(ocel_path, tail_path):
+    """
+    Copy the part of an OCEL file that appends rewrite to tail_path, so
+    rollback_ocel can undo them; returns its offset
+    """
+    position = _objects_position(ocel_path)
+    with open(ocel_path, "rb") as f, open(tail_path, "wb") as tail:
+        f.seek(position)
+        shutil.copyfileobj(f, tail)
+    return position
+
+
+def rollback_ocel(ocel_path, position, tail_path):
+    """Restore an OCEL file to its ocel_checkpoint()"""
+    with open(ocel_path, "r+b") as f, open(tail_path, "rb") as tail:
+        f.seek(position)
+        f.truncate()
+        shutil.copyfileobj(tail, f)
+
+
+def _append_compressed_ocel_events(ocel_path, events):
+    """
+    Compressed documents keep the objects section in a member of its own
+    (see OcelJsonWriter.finish); it is replaced by a member with the new
+    events and one with the extended objects section.
+    """
+    position, section = last_member(ocel_path)
+    if not section.startswith(OBJECTS_MARKER.encode("utf-8")):
+        raise ValueError("Not an OCEL file written by OcelJsonWriter")
+    existing, known = _objects_section(section)
+
+    # Events are numbered by their position, so event 0 starts an empty log
+    has_events = len(events) > 0 and events["event"][0] != 0
+
+    with open(ocel_path, "r+b") as f:
+        f.seek(position)
+        f.truncate()
+        writer = MemberWriter(f, codec_of(ocel_path))
+        for lines in event_lines(events):
+            writer.write(((",\n" if has_events else "") + ",\n".join(lines)).encode("utf-8"))
+            has_events = True
+        writer.end_member()
+        writer.write(_objects_tail(existing, known, events))
+        writer.end_member()
+
+
+def read_ocel_events(ocel_path):
+    """
+    Load the event table back from an OCEL JSON file written by this module
+    """
+    with open_artifact(ocel_path) as f:
+        ocel = json.load(f)
+
+    records = ocel["ocel:events"]
+    object_id = pd.Series([e["ocel:omap"][0] if e["ocel:omap"] else eid for eid, e in records.items()],
+                          dtype=object)
+    objects = ocel["ocel:objects"]
+    timestamp = pd.Series([e["ocel:timestamp"] for e in records.values()], dtype=object)
+    case = object_id.str.split(":", n=1).str[-1].where(object_id.str.contains(":"), object_id)
+    object_type = object_id.map(lambda o: objects.get(o, {}).get("ocel:type", DEFAULT_OBJECT_TYPE))
+
+    dictionaries = EventDictionaries()
+    columns = dictionaries.columns
+    time = pd.to_datetime(timestamp, errors="coerce", utc=True).dt.tz_convert(None)
+    return EventTable({
+        "event": np.array([int(eid[1:]) for eid in records], dtype="int64"),
+        "case": columns["case"].encode(case.to_numpy()),
+        "activity": columns["activity"].encode([e["ocel:activity"] for e in records.values()]),
+        "object": columns["object"].encode(object_id.to_numpy()),
+        "object_type": columns["object_type"].encode(object_type.to_numpy()),
+        "time": time.to_numpy().astype("datetime64[ms]")
+    }, dictionaries, timestamp=timestamp)
+
+
+class Interner:
+    """
+    Append-only dictionary assigning int32 codes to values in first-seen
+    order, so codes stay valid as more blocks of events are encoded
+    """
+
+    def __init__(self, values=()):
+        self.index = pd.Index(list(values), dtype=object)
+
+    def __len__(self):
+        return len(self.index)
+
+    def encode(self, values):
+        # Each distinct value is looked up once
+        local, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+        codes = self.index.get_indexer(uniques)
+        missing = codes < 0
+        if missing.any():
+            known = len(self.index)
+            self.index = self.index.append(pd.Index(uniques[missing], dtype=object))
+            codes[missing] = np.arange(known, len(self.index))
+        return codes.astype("int32")[local]
+
+    def decode(self, codes):
+        return self.index.to_numpy()[codes]
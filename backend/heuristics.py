@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+# Default thresholds of the heuristics miner; every one can be overridden
+# per request
+DEFAULT_PARAMETERS = {
+    # Minimum dependency a => b for an edge
+    "dependency": 0.9,
+    # Minimum number of times b directly follows a for an edge
+    "observations": 1,
+    # Edges further than this below the best dependency of their source
+    # activity are dropped
+    "relative_to_best": 0.05,
+    # Minimum dependency of length-one (a a) and length-two (a b a) loops
+    "loop_one": 0.9,
+    "loop_two": 0.9,
+    # Two outputs (inputs) of an activity with an AND measure at least this
+    # run in parallel, below it they are exclusive
+    "and_threshold": 0.65,
+    # Connect every activity to its best predecessor and successor
+    "all_connected": True
+}
+
+
+def directly_follows_matrix(model):
+    """Dense activity x activity matrix of directly-follows counts of a columnar model"""
+    size = len(model["activities"])
+    matrix = np.zeros((size, size), dtype="int64")
+    matrix[np.asarray(model["edge_source"]), np.asarray(model["edge_target"])] = np.asarray(model["edge_count"])
+    return matrix
+
+
+def length_two_matrix(variants, names):
+    """
+    Activity x activity matrix of a b a patterns (a != b), counted from
+    the activity sequences of a variant index weighted by their case
+    counts; names gives the activity order of the matrix
+    """
+    size = len(names)
+    sequence = np.asarray(variants["variant_activity"]).astype("int64")
+    lengths = np.asarray(variants["variant_length"])
+    # Variant activity codes are into the event store dictionary
+    position = pd.Index(list(names), dtype=object).get_indexer(np.asarray(variants["activities"]).tolist())
+    sequence = position[sequence]
+
+    weight = np.repeat(np.asarray(variants["variant_count"]), lengths)
+    offset = np.arange(len(sequence)) - np.repeat(np.asarray(variants["activity_offset"])[:-1], lengths)
+    inside = np.flatnonzero(offset[:-2] + 2 < np.repeat(lengths, lengths)[:-2]) if len(sequence) > 2 \
+        else np.empty(0, dtype="int64")
+    a, b, c = sequence[inside], sequence[inside + 1], sequence[inside + 2]
+    pattern = (a == c) & (a != b)
+    return np.bincount(a[pattern] * size + b[pattern], weights=weight[inside][pattern],
+                       minlength=size * size).astype("int64").reshape(size, size)
+
+
+def _pairs(matrix, outputs, direct):
+    """
+    AND measure of every pair of outputs (or inputs) of one activity:
+    (|b>c| + |c>b|) / (|a>b| + |a>c| + 1)
+    """
+    between = matrix[np.ix_(outputs, outputs)]
+    return (between + between.T) / (direct[:, None] + direct[None, :] + 1)
+
+
+def heuristics_net(model, parameters=None, variants=None):
+    """
+    Heuristics miner over the directly-follows counts of a columnar model
+    (see DiscoveryState.to_model), all as NumPy matrix operations:
+
+    - dependency a => b = (|a>b| - |b>a|) / (|a>b| + |b>a| + 1), and
+      |a>a| / (|a>a| + 1) for length-one loops
+    - length-two loops a => b => a from the a b a counts of the variant
+      index, when one is given
+    - edges above the thresholds, plus each activity's best predecessor and
+      successor with all_connected
+    - split and join semantics: two outputs of an activity are parallel
+      (AND) when they follow each other often enough, else exclusive (XOR)
+    """
+    parameters = {**DEFAULT_PARAMETERS, **(parameters or {})}
+    names = np.asarray(model["activities"]).tolist()
+    counts = np.asarray(model["activity_count"])
+    size = len(names)
+    follows = directly_follows_matrix(model)
+
+    forward = follows.astype("float64")
+    dependency = (forward - forward.T) / (forward + forward.T + 1)
+    loop_one = np.diag(forward) / (np.diag(forward) + 1)
+    np.fill_diagonal(dependency, 0.0)
+
+    # Length-one loops are edges of their own; activities in one are left
+    # out of length-two loops (a a a would look like a b a otherwise)
+    in_loop_one = loop_one >= parameters["loop_one"]
+    loop_two = np.zeros((size, size))
+    if variants is not None:
+        pattern = length_two_matrix(variants, names).astype("float64")
+        loop_two = (pattern + pattern.T) / (pattern + pattern.T + 1)
+        loop_two[in_loop_one, :] = 0.0
+        loop_two[:, in_loop_one] = 0.0
+        np.fill_diagonal(loop_two, 0.0)
+    in_loop_two = (loop_two >= parameters["loop_two"]) & (follows >= parameters["observations"])
+
+    observed = follows >= parameters["observations"]
+    best_out = dependency.max(axis=1, initial=0.0)
+    edges = observed & (dependency >= parameters["dependency"]) & \
+        (dependency >= best_out[:, None] - parameters["relative_to_best"])
+    edges |= in_loop_two
+    if parameters["all_connected"] and size:
+        # Best successor of every activity that is not only an end, best
+        # predecessor of every activity that is not only a start
+        candidates = np.where(observed, dependency, -np.inf)
+        np.fill_diagonal(candidates, -np.inf)
+        rows = np.arange(size)
+        successor = candidates.argmax(axis=1)
+        has_successor = np.isfinite(candidates[rows, successor]) & (candidates[rows, successor] > 0)
+        edges[rows[has_successor], successor[has_successor]] = True
+        predecessor = candidates.argmax(axis=0)
+        has_predecessor = np.isfinite(candidates[predecessor, rows]) & (candidates[predecessor, rows] > 0)
+        edges[predecessor[has_predecessor], rows[has_predecessor]] = True
+    np.fill_diagonal(edges, in_loop_one & (np.diag(follows) >= parameters["observations"]))
+
+    nodes = []
+    for a in range(size):
+        outputs = np.flatnonzero(edges[a])
+        outputs = outputs[outputs != a]
+        inputs = np.flatnonzero(edges[:, a])
+        inputs = inputs[inputs != a]
+        nodes.append({
+            "id": f"a{a}",
+            "name": names[a],
+            "type": "activity",
+            "frequency": int(counts[a]),
+            "split": _gateway(follows, outputs, follows[a, outputs], parameters["and_threshold"]),
+            "join": _gateway(follows.T, inputs, follows[inputs, a], parameters["and_threshold"])
+        })
+
+    source, target = np.nonzero(edges)
+    order = np.lexsort((target, source, -follows[source, target]))
+    source, target = source[order], target[order]
+    return {
+        "nodes": nodes,
+        "edges": [{
+            "source": f"a{s}",
+            "target": f"a{t}",
+            "value": int(follows[s, t]),
+            "dependency": float(loop_one[s] if s == t else max(dependency[s, t], loop_two[s, t]))
+        } for s, t in zip(source.tolist(), target.tolist())],
+        "loops": {
+            "lengthOne": [f"a{a}" for a in np.flatnonzero(np.diag(edges)).tolist()],
+            "lengthTwo": [[f"a{a}", f"a{b}"] for a, b in zip(*np.nonzero(np.triu(in_loop_two | in_loop_two.T)))],
+            "lengthTwoAvailable": variants is not None
+        },
+        "parameters": parameters
+    }
+
+
+def _gateway(matrix, branches, direct, and_threshold):
+    """
+    Split (or join) of an activity over its branches: the overall type,
+    "and", "xor" or "or" for a mix of both, and the pairs of branches that
+    run in parallel (every other pair is exclusive); None with fewer than
+    two branches
+    """
+    if len(branches) < 2:
+        return None
+    measure = _pairs(matrix, branches, direct)
+    first, second = np.triu_indices(len(branches), k=1)
+    parallel = measure[first, second] >= and_threshold
+    ids = np.char.add("a", branches.astype(str))
+    return {
+        "type": "and" if parallel.all() else "xor" if not parallel.any() else "or",
+        "parallel": np.stack([ids[first[parallel]], ids[second[parallel]]], axis=1).tolist()
+    }
@@ -0,0 +1,250 @@
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Number of worker processes running upload jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS)
+        return _executor
+
+
+def _discard_executor(executor):
+    """
+    Drop a pool that broke because one of its workers died (e.g. killed
+    for memory), so the next job starts a fresh one
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Long-lived pools for map-reduce over case partitions, by worker count.
+# Each keeps the pid that started it: a forked job worker needs its own.
+_partition_pools = {}
+
+
+def _partition_pool(workers):
+    with _executor_lock:
+        pid, pool = _partition_pools.get(workers, (None, None))
+        if pid != os.getpid():
+            pool = ProcessPoolExecutor(max_workers=workers)
+            _partition_pools[workers] = (os.getpid(), pool)
+        return pool
+
+
+def partition_map(fn, partitions, *args):
+    """
+    [fn(*args, partition, partitions) for partition in range(partitions)],
+    computed in a pool of as many processes that is started once and kept
+    for later calls. A pool that broke is dropped so the next call starts
+    a fresh one.
+    """
+    pool = _partition_pool(partitions)
+    try:
+        return list(pool.map(fn, *([arg] * partitions for arg in args), range(partitions),
+                             [partitions] * partitions))
+    except BrokenProcessPool:
+        with _executor_lock:
+            if _partition_pools.get(partitions, (None, None))[1] is pool:
+                del _partition_pools[partitions]
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def submit(state_path, fn, *args):
+    """
+    Run fn(*args) in the worker pool. If the worker dies without recording
+    an outcome, the job is marked as failed. A broken pool is replaced and
+    the job submitted to the new one.
+    """
+    executor = get_executor()
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        executor = get_executor()
+        future = executor.submit(fn, *args)
+
+    def check(done):
+        if done.cancelled():
+            JobTracker(state_path).fail("Job was cancelled")
+            return
+        error = done.exception()
+        if isinstance(error, BrokenProcessPool):
+            _discard_executor(executor)
+        if error is not None:
+            JobTracker(state_path).fail(f"Job crashed: {error}")
+
+    future.add_done_callback(check)
+    return future
+
+
+def reset_peak_rss():
+    """
+    Restart the process's peak RSS accounting where Linux allows it.
+    Returns whether it worked; otherwise peaks cover the whole process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes(reset):
+    if reset:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_seconds():
+    """CPU time of this process plus its finished child processes"""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+@contextlib.contextmanager
+def timed(steps, name):
+    """Add the wall time of the block to steps[name] (when steps is a dict)"""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        if steps is not None:
+            steps[name] = steps.get(name, 0.0) + time.perf_counter() - began
+
+
+def read_job(state_path):
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'r') as f:
+        return json.load(f)
+
+
+class JobTracker:
+    """
+    Records the progress of a job stage by stage in a JSON state file, so
+    any web worker process can report on a job run by the pool
+    """
+
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.state = read_job(state_path) or {}
+
+    @classmethod
+    def create(cls, state_path, stages, exclusive=False, **info):
+        """
+        Start the state of a queued job. With exclusive=True the state file
+        must not exist yet (FileExistsError otherwise): it is created with
+        its content in one step, so of two requests claiming the same path
+        only one gets it.
+        """
+        tracker = cls(state_path)
+        tracker.state = dict(info)
+        tracker.state.update({
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "stages": [{"name": name, "status": "pending"} for name in stages],
+            "submittedAt": time.time(),
+            "metrics": None,
+            "error": None
+        })
+        if exclusive:
+            tracker._save_new()
+        else:
+            tracker.save()
+        return tracker
+
+    def _save_new(self):
+        # A hard link to a complete staging file is created only if the
+        # name is free, and readers never see the file half-written
+        staging = f"{self.state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(staging, 'w') as f:
+            json.dump(self.state, f)
+        try:
+            os.link(staging, self.state_path)
+        finally:
+            os.remove(staging)
+
+    def save(self):
+        staging = self.state_path + ".tmp"
+        with open(staging, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(staging, self.state_path)
+
+    def _stage(self, name):
+        for stage in self.state["stages"]:
+            if stage["name"] == name:
+                return stage
+        stage = {"name": name, "status": "pending"}
+        self.state["stages"].append(stage)
+        return stage
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Run a stage, recording its wall time, CPU time and peak RSS. The
+        body may set stage["rows"] to the number of rows it handled.
+        """
+        stage = self._stage(name)
+        stage.update({"status": "running", "startedAt": time.time()})
+        self.state.update({"status": "processing", "stage": name})
+        self.save()
+        reset = reset_peak_rss()
+        began, cpu = time.perf_counter(), cpu_seconds()
+
+        def measure(status):
+            stage.update({
+                "status": status,
+                "seconds": time.perf_counter() - began,
+                "cpuSeconds": cpu_seconds() - cpu,
+                "peakRssBytes": peak_rss_bytes(reset)
+            })
+
+        try:
+            yield stage
+        except Exception:
+            measure("failed")
+            self.save()
+            raise
+        measure("completed")
+        done = sum(1 for s in self.state["stages"] if s["status"] == "completed")
+        self.state["progress"] = done / len(self.state["stages"])
+        self.save()
+
+    def complete(self, metrics):
+        self.state.update({"status": "completed", "stage": None, "progress": 1.0,
+                           "metrics": metrics, "finishedAt": time.time()})
+        self.save()
+
+    def fail(self, error, client_error=False):
+        """client_error marks failures caused by the uploaded data rather than the server"""
+        if self.state.get("status") in ("completed", "failed"):
+            return
+        self.state.update({"status": "failed", "error": error, "clientError": client_error,
+                           "finishedAt": time.time()})
+        self.save()
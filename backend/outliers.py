@@ -0,0 +1,185 @@
+import os
+import numpy as np
+import pandas as pd
+from artifacts import read_events, read_dictionary, read_model, write_model
+from discovery import _grown
+from variants import case_traces
+
+# Cases whose robust z-score exceeds this are reported (Iglewicz & Hoaglin)
+OUTLIER_Z = 3.5
+
+# Case-level outlier types, and whether unusually low values count too
+CASE_OUTLIER_TYPES = {
+    "case_duration": True,
+    "trace_length": True,
+    "rework": False,
+    "rare_transition": False
+}
+
+
+def robust_z(values):
+    """
+    Distance of every value from the median in units of the median absolute
+    deviation. Falls back to the interquartile range, then to the mean
+    absolute deviation, when more than half of the values are identical.
+    NaN values (not applicable to a case) score NaN.
+    """
+    known = values[~np.isnan(values)]
+    if len(known) == 0:
+        return np.full(len(values), np.nan)
+
+    median = np.median(known)
+    deviation = np.abs(known - median)
+    scale = 1.4826 * np.median(deviation)
+    if scale == 0:
+        low, high = np.percentile(known, [25, 75])
+        scale = (high - low) / 1.349
+    if scale == 0:
+        scale = 1.2533 * deviation.mean()
+    if scale == 0:
+        return np.where(np.isnan(values), np.nan, 0.0)
+    return (values - median) / scale
+
+
+def _keys(high, low):
+    """int64 keys sorting by high, then low (both below 2^31)"""
+    return (np.asarray(high).astype("int64") << 32) | np.asarray(low).astype("int64")
+
+
+def empty_feature_table():
+    return {
+        "first_time": np.zeros(0, dtype="float64"),
+        "last_time": np.zeros(0, dtype="float64"),
+        "length": np.zeros(0, dtype="int64"),
+        "last_activity": np.zeros(0, dtype="int32"),
+        "case_activity": np.zeros(0, dtype="int64"),
+        "pair_key": np.zeros(0, dtype="int64"),
+        "pair_count": np.zeros(0, dtype="int64"),
+        "case_transition": np.zeros(0, dtype="int64"),
+        "total_events": np.int64(0)
+    }
+
+
+def update_feature_table(table, case, activity, time, cases):
+    """
+    Fold events into the per-case feature table the case features are
+    computed from, and return it. The table holds, by case code (cases is
+    the size of the case dictionary): first and last time in milliseconds
+    (NaN without any timestamp), number of events and last activity; the
+    distinct (case, activity) pairs; the count of every directly-follows
+    pair, with ids in the order the pairs were first seen; and the distinct
+    (case, pair id) transitions. Folding in appended rows touches only the
+    cases they belong to; as in discovery, a case's new events are
+    expected to follow its old ones in time.
+    """
+    table = dict(table)
+    first_time = _grown(np.array(table["first_time"]), cases, np.nan)
+    last_time = _grown(np.array(table["last_time"]), cases, np.nan)
+    length = _grown(np.array(table["length"]), cases, 0)
+    last_activity = _grown(np.array(table["last_activity"]), cases, -1)
+
+    order, starts = case_traces(case, time)
+    touched = np.asarray(case)[order][starts]
+    lengths = np.diff(np.r_[starts, len(order)]).astype("int64")
+    sequence = np.asarray(activity)[order].astype("int64")
+
+    if len(order):
+        stamps = np.asarray(time)[order]
+        millis = np.where(np.isnat(stamps), np.nan,
+                          stamps.astype("datetime64[ms]").astype("int64").astype("float64"))
+        first_time[touched] = np.fmin(first_time[touched], np.fmin.reduceat(millis, starts))
+        last_time[touched] = np.fmax(last_time[touched], np.fmax.reduceat(millis, starts))
+
+    # Transitions among the new events, and from the last event a case had
+    # before to its first new one
+    previous = np.r_[-1, sequence[:-1]][:len(sequence)]
+    previous[starts] = last_activity[touched]
+    follows = previous >= 0
+    owner = np.repeat(touched, lengths)[follows]
+    pairs = previous[follows] * (1 << 31) + sequence[follows]
+
+    pair_key = np.asarray(table["pair_key"])
+    distinct = pd.unique(pairs)
+    unseen = distinct[pd.Index(pair_key).get_indexer(distinct) < 0]
+    pair_key = np.concatenate([pair_key, unseen])
+    ids = pd.Index(pair_key).get_indexer(pairs)
+    pair_count = _grown(np.asarray(table["pair_count"]), len(pair_key), 0) + np.bincount(ids, minlength=len(pair_key))
+
+    length[touched] += lengths
+    if len(order):
+        last_activity[touched] = sequence[np.r_[starts[1:], len(order)] - 1]
+    table.update({
+        "first_time": first_time,
+        "last_time": last_time,
+        "length": length,
+        "last_activity": last_activity,
+        "case_activity": np.union1d(table["case_activity"], _keys(np.repeat(touched, lengths), sequence)),
+        "pair_key": pair_key,
+        "pair_count": pair_count,
+        "case_transition": np.union1d(table["case_transition"], _keys(owner, ids)),
+        "total_events": np.int64(int(table["total_events"]) + len(order))
+    })
+    return table
+
+
+def table_features(table):
+    """
+    Per-case arrays, one entry per case in case-code order: duration in
+    milliseconds (NaN without any timestamp), number of events, number of
+    repeated activities, and the surprisal -log(p) of the rarest
+    directly-follows transition the case takes (NaN for single-event cases)
+    """
+    length = np.asarray(table["length"])
+    cases = np.flatnonzero(length > 0)
+    with np.errstate(invalid="ignore"):
+        duration = (np.asarray(table["last_time"]) - np.asarray(table["first_time"]))[cases]
+
+    case_activity = np.asarray(table["case_activity"])
+    distinct = np.bincount(case_activity >> 32, minlength=len(length))
+    rework = (length - distinct)[cases]
+
+    transitions = np.asarray(table["case_transition"])
+    pair_count = np.asarray(table["pair_count"])
+    surprisal = np.full(len(length), np.nan)
+    if len(transitions):
+        owner = transitions >> 32
+        information = -np.log(pair_count[transitions & ((1 << 32) - 1)] / pair_count.sum())
+        heads = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+        surprisal[owner[heads]] = np.maximum.reduceat(information, heads)
+
+    return cases, {
+        "case_duration": duration,
+        "trace_length": length[cases].astype("float64"),
+        "rework": rework.astype("float64"),
+        "rare_transition": surprisal[cases]
+    }
+
+
+def case_outliers(events_path, features_path=None):
+    """
+    Score every case of an event store on each CASE_OUTLIER_TYPES feature
+    and return (type, case id, score) for the cases flagged as outliers.
+    With features_path the per-case feature table is kept there: when one
+    is stored, only the events added to the store since are read and
+    folded into it, then every case is scored from the table.
+    """
+    case_names = read_dictionary(events_path, "case")
+    table = read_model(features_path) if features_path and os.path.exists(features_path) \
+        else empty_feature_table()
+    columns = read_events(events_path, ("case", "activity", "time"), since=int(table["total_events"]))
+    table = update_feature_table(table, columns["case"], columns["activity"], columns["time"], len(case_names))
+    if features_path:
+        write_model(features_path, table)
+    cases, features = table_features(table)
+
+    flagged = []
+    for outlier_type, two_sided in CASE_OUTLIER_TYPES.items():
+        z = robust_z(features[outlier_type])
+        score = np.abs(z) if two_sided else z
+        with np.errstate(invalid="ignore"):
+            hits = np.flatnonzero(score > OUTLIER_Z)
+        hits = hits[np.argsort(-score[hits], kind="stable")]
+        flagged.extend(zip([outlier_type] * len(hits),
+                           case_names[cases[hits]].tolist(),
+                           score[hits].tolist()))
+    return flagged
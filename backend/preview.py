@@ -0,0 +1,232 @@
+import io
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from approximate import hash_values
+from discovery import DiscoveryState, _ranked, process_data_from_model
+from event_log import (ACTIVITY_COLUMN, CASE_COLUMN, OBJECT_TYPE_COLUMN, TEXT_DTYPES, TIMESTAMP_COLUMN,
+                       build_event_table)
+
+# Seconds of reading an upload the preview is sampled from; it is built
+# as soon as they are up (or the upload ends before), 0 disables previews
+PREVIEW_SECONDS = float(os.environ.get('PREVIEW_SECONDS', 0.5))
+
+# Cases kept in the sample and a cap on their rows, so a few huge cases
+# (or one) cannot make the sample large
+PREVIEW_CASES = 2000
+PREVIEW_MAX_ROWS = 100000
+
+# Bytes of CSV lines collected before they are parsed into the sample
+PREVIEW_PARSE_BYTES = 1024 * 1024
+
+# Activities listed in a preview
+PREVIEW_TOP_ACTIVITIES = 10
+
+# Roles of the recognised CSV columns
+COLUMN_ROLES = {CASE_COLUMN: "case", ACTIVITY_COLUMN: "activity", TIMESTAMP_COLUMN: "timestamp",
+                OBJECT_TYPE_COLUMN: "object_type"}
+
+_HASH_RANGE = float(1 << 64)
+
+
+class PreviewSampler:
+    """
+    Samples the rows of a CSV upload while it is read, and builds a
+    provisional summary of the log from the sample within about a second:
+    estimated totals, the columns with their types, the most frequent
+    activities and a process map.
+
+    The sample is a reservoir of whole cases rather than of single rows, so
+    the directly-follows pairs of the process map stay intact: bottom-k
+    sampling on a 64-bit hash of the case id keeps every row of the
+    PREVIEW_CASES cases with the smallest hashes seen so far (each case
+    with the same probability p, the hash threshold over 2^64). Rows count
+    as 1/p events and the distinct cases are the KMV estimate k/p. Logs
+    without a case column sample single rows, as each row is its own case.
+    Totals over the whole upload are extrapolated from the share of its
+    bytes read when the preview was built.
+
+    feed() takes the decompressed bytes of the upload in order and
+    received, the bytes of the request read so far (compressed ones for
+    compressed uploads); feed(None) marks the end. on_ready(preview) is
+    called once, the first time feed() sees PREVIEW_SECONDS have passed or
+    at the end. Lines are split at newlines, so a quoted field spanning
+    lines can make a block of the sample fail to parse; it is then only
+    counted.
+    """
+
+    def __init__(self, expected_bytes, on_ready, seconds=PREVIEW_SECONDS):
+        self.expected_bytes = expected_bytes
+        self.on_ready = on_ready
+        self.began = time.perf_counter()
+        self.deadline = self.began + seconds
+        self.header = None
+        self.partial = b""
+        self.lines = []
+        self.pending = 0
+        self.rows = 0
+        self.skipped = 0
+        self.size = 0
+        self.received = 0
+        self.threshold = np.uint64((1 << 64) - 1)
+        self.sample = []
+        self.hashes = []
+        self.done = False
+
+    def feed(self, chunk, received=None):
+        if self.done:
+            return
+        ended = chunk is None
+        if not ended:
+            self.size += len(chunk)
+            self.received = received if received is not None else self.size
+            data = self.partial + chunk
+            cut = data.rfind(b"\n") + 1
+            self.partial = data[cut:]
+            if cut:
+                self._collect(data[:cut])
+        elif self.partial:
+            self._collect(self.partial + b"\n")
+            self.partial = b""
+
+        if ended or self.pending >= PREVIEW_PARSE_BYTES:
+            self._parse()
+        if ended or time.perf_counter() >= self.deadline:
+            self.done = True
+            # A preview is only a courtesy; failing to build it never fails the upload
+            try:
+                self._parse()
+                preview = self.build(complete=ended)
+            except Exception as e:
+                print(f"Error building upload preview: {e}")
+                return
+            self.on_ready(preview)
+
+    def _collect(self, lines):
+        if self.header is None:
+            end = lines.find(b"\n") + 1
+            self.header, lines = lines[:end], lines[end:]
+            if not lines:
+                return
+        self.lines.append(lines)
+        self.pending += len(lines)
+
+    def _parse(self):
+        if not self.lines:
+            return
+        block = b"".join(self.lines)
+        self.lines, self.pending = [], 0
+        try:
+            df = pd.read_csv(io.BytesIO(self.header + block), dtype=TEXT_DTYPES)
+        except (ValueError, pd.errors.ParserError):
+            self.skipped += block.count(b"\n")
+            return
+
+        if CASE_COLUMN in df.columns:
+            hashes = hash_values(df[CASE_COLUMN].to_numpy())
+        else:
+            hashes = hash_values(np.arange(self.rows, self.rows + len(df)))
+        self.rows += len(df)
+        kept = hashes <= self.threshold
+        if kept.any():
+            self.sample.append(df[kept])
+            self.hashes.append(hashes[kept])
+            self._shrink()
+
+    def _shrink(self):
+        """Drop the cases with the largest hashes until the sample fits"""
+        hashes = np.concatenate(self.hashes)
+        distinct, rows = np.unique(hashes, return_counts=True)
+        keep = min(PREVIEW_CASES, max(1, int(np.searchsorted(np.cumsum(rows), PREVIEW_MAX_ROWS, side="right"))))
+        if keep >= len(distinct):
+            return
+        # The first hash left out becomes the bound, so p = threshold / 2^64
+        self.threshold = distinct[keep] - np.uint64(1)
+        kept = hashes <= self.threshold
+        self.sample = [pd.concat(self.sample)[kept]]
+        self.hashes = [hashes[kept]]
+
+    @property
+    def probability(self):
+        """Probability of every case to be in the sample"""
+        return (float(self.threshold) + 1) / _HASH_RANGE
+
+    def build(self, complete=False):
+        if self.sample:
+            sample = pd.concat(self.sample)
+        else:
+            sample = pd.read_csv(io.BytesIO(self.header), dtype=TEXT_DTYPES) if self.header else pd.DataFrame()
+        read = 1.0 if complete or not self.expected_bytes else min(1.0, self.received / self.expected_bytes)
+        scale = 1.0 / self.probability / max(read, 1e-9)
+
+        events = build_event_table(sample.reset_index(drop=True))
+        model = DiscoveryState().update(events).to_model()
+        cases = len(np.unique(np.concatenate(self.hashes))) if self.hashes else 0
+
+        counts = pd.Series(np.asarray(model["activity_count"]), index=np.asarray(model["activities"]).tolist())
+        top = _ranked(counts).head(PREVIEW_TOP_ACTIVITIES)
+        return {
+            "provisional": True,
+            "complete": complete,
+            "seconds": time.perf_counter() - self.began,
+            "sample": {
+                "rows": len(sample),
+                "cases": cases,
+                "probability": self.probability,
+                "rowsRead": self.rows,
+                "rowsUnparsed": self.skipped,
+                "bytesRead": self.size,
+                "uploadShareRead": read,
+                "scale": scale
+            },
+            "estimates": {
+                "totalEvents": int(round(len(sample) * scale)),
+                "totalCases": int(round(cases * scale)),
+                "eventsPerCase": len(sample) / cases if cases else None
+            },
+            "columns": _columns(sample),
+            "topActivities": [{
+                "activity": name,
+                "estimatedCount": int(round(count * scale)),
+                "share": count / len(sample)
+            } for name, count in top.items()],
+            "processData": process_data_from_model(model)
+        }
+
+
+def _columns(sample):
+    """Name, type and share of missing values of every sampled column"""
+    columns = []
+    for name in sample.columns:
+        values = sample[name]
+        if name == TIMESTAMP_COLUMN:
+            parsed = pd.to_datetime(values, errors="coerce", utc=True)
+            kind = "datetime" if parsed.notna().sum() * 2 >= values.notna().sum() > 0 else "text"
+        elif isinstance(values.dtype, np.dtype) and values.dtype.kind in "biuf":
+            kind = "number"
+        else:
+            kind = "text"
+        columns.append({
+            "name": str(name),
+            "dtype": str(values.dtype),
+            "kind": kind,
+            "role": COLUMN_ROLES.get(name, "attribute"),
+            "missing": float(values.isna().mean()) if len(values) else 0.0
+        })
+    return columns
+
+
+def write_preview(path, preview):
+    staging = path + ".tmp"
+    with open(staging, 'w') as f:
+        json.dump(preview, f)
+    os.replace(staging, path)
+
+
+def read_preview(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -1,13 +1,32 @@
-
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import pandas as pd
+import numpy as np
 import json
-import sqlite3
+import contextlib
+import fcntl
 import os
+import shutil
 import uuid
-import tempfile
+import base64
 from werkzeug.utils import secure_filename
+from event_log import EmptyLogError, EventDictionaries, build_event_table, read_event_csv, read_ocel_events, append_ocel_events, OcelJsonWriter, ocel_checkpoint, rollback_ocel
+from discovery import DiscoveryState, discover_codes, discover_parallel, process_data_from_model
+from approximate import ApproximateState
+from event_db import EventDatabaseWriter, count_events, query_events, query_objects, rollback_event_database
+from artifacts import EventStoreWriter, write_event_store, write_model, read_model, read_events, read_dictionary, rollback_event_store
+from jobs import JobTracker, read_job, submit, timed
+from uploads import MultipartUpload, UploadError, UploadStream
+from compression import CODEC_SUFFIXES, available, check_codec, codec_of, find_artifact, open_artifact
+from storage import Database
+from cache import ResponseCache, CacheEntry
+from preview import PREVIEW_SECONDS, PreviewSampler, read_preview, write_preview
+from heuristics import DEFAULT_PARAMETERS as HEURISTICS_PARAMETERS, heuristics_net
+from simplify import LADDER, ladder_level, ladder_summary, model_ladder, simplification_ladder, simplified_model
+from variants import append_variant_index, case_traces, write_variant_index, top_variants
+from bitmaps import BitmapIndex, BitmapIndexWriter, rollback_bitmap_index
+from outliers import case_outliers
+from rollups import GRANULARITIES, RollupFold, bucket_start, rollup_rows, time_bounds
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -21,13 +40,66 @@ DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.db')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# Byte budget of the in-process cache for process/summary/metadata responses
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+
+# Uploads larger than this are processed in streaming mode unless the
+# request picks a mode explicitly ("stream" or "batch")
+STREAMING_THRESHOLD_BYTES = int(os.environ.get('STREAMING_THRESHOLD_BYTES', 256 * 1024 * 1024))
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 200000))
+
+# Processed logs and models are stored as memory-mapped NumPy columns; the
+# OCEL/process JSON files are only written as exports when this is enabled
+EXPORT_JSON = os.environ.get('EXPORT_JSON', '1') == '1'
+
+# Events, objects and attributes are also loaded into a per-upload SQLite
+# database for the indexed /api/events and /api/objects queries
+EVENT_DATABASE = os.environ.get('EVENT_DATABASE', '1') == '1'
+
+# Codec of the OCEL/process JSON exports: "zstd" (needs the optional
+# zstandard package, default when it is installed), "gzip" or "none".
+# The memory-mapped stores and the event database stay uncompressed
+ARTIFACT_COMPRESSION = os.environ.get('ARTIFACT_COMPRESSION', 'zstd' if available('zstd') else 'gzip')
+if ARTIFACT_COMPRESSION != 'none':
+    check_codec(ARTIFACT_COMPRESSION)
+ARTIFACT_SUFFIX = CODEC_SUFFIXES.get(ARTIFACT_COMPRESSION, '')
+
+# Compressed uploads are assumed to expand about this much when picking
+# the processing mode from the request size
+COMPRESSED_UPLOAD_RATIO = 10
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+# Processes used for map-reduce discovery and variant indexing of one log;
+# 1 keeps both in the job's own process
+DISCOVERY_WORKERS = int(os.environ.get('DISCOVERY_WORKERS', 1))
+
+# Paths of the artifacts kept in PROCESSED_FOLDER for an upload; exports
+# written with another ARTIFACT_COMPRESSION are found under their own suffix
+def artifact_paths(file_id):
+    return {
+        "ocel": find_artifact(os.path.join(PROCESSED_FOLDER, f"{file_id}_ocel.json{ARTIFACT_SUFFIX}")),
+        "process": find_artifact(os.path.join(PROCESSED_FOLDER, f"{file_id}_process.json{ARTIFACT_SUFFIX}")),
+        "events": os.path.join(PROCESSED_FOLDER, f"{file_id}_events"),
+        "model": os.path.join(PROCESSED_FOLDER, f"{file_id}_model"),
+        "variants": os.path.join(PROCESSED_FOLDER, f"{file_id}_variants"),
+        "bitmaps": os.path.join(PROCESSED_FOLDER, f"{file_id}_bitmaps"),
+        "features": os.path.join(PROCESSED_FOLDER, f"{file_id}_features"),
+        "database": os.path.join(PROCESSED_FOLDER, f"{file_id}_events.db"),
+        "job": os.path.join(PROCESSED_FOLDER, f"{file_id}_job.json"),
+        "preview": os.path.join(PROCESSED_FOLDER, f"{file_id}_preview.json"),
+        "lock": os.path.join(PROCESSED_FOLDER, f"{file_id}.lock")
+    }
+
+# Shared SQLite access (WAL, pooled connections, single writer thread)
+db = Database(DB_PATH)
+
 # Initialize SQLite database
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     # Create tables for storing outlier analysis results and process metadata
-    cursor.execute('''
+    db.executescript('''
     CREATE TABLE IF NOT EXISTS outlier_results (
         id TEXT PRIMARY KEY,
         file_id TEXT,
@@ -36,10 +108,8 @@ def init_db():
         score REAL,
         is_outlier INTEGER,
         timestamp TEXT
-    )
-    ''')
+    );
     
-    cursor.execute('''
     CREATE TABLE IF NOT EXISTS process_metadata (
         file_id TEXT PRIMARY KEY,
         filename TEXT,
@@ -48,333 +118,1861 @@ def init_db():
         start_date TEXT,
         end_date TEXT,
         timestamp TEXT
-    )
-    ''')
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_outlier_results_file
+        ON outlier_results (file_id, outlier_type);
+    
+    CREATE INDEX IF NOT EXISTS idx_outlier_results_score
+        ON outlier_results (file_id, score, id);
+    
+    -- Content hash of every processed upload and the artifacts it produced
+    CREATE TABLE IF NOT EXISTS content_index (
+        content_hash TEXT PRIMARY KEY,
+        file_id TEXT NOT NULL,
+        size INTEGER,
+        ocel_path TEXT,
+        model_path TEXT,
+        outlier_count INTEGER,
+        timestamp TEXT
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_content_index_file
+        ON content_index (file_id);
+    
+    -- Event counts and case arrivals per hour/day/week bucket
+    CREATE TABLE IF NOT EXISTS event_rollups (
+        file_id TEXT,
+        granularity TEXT,
+        bucket TEXT,
+        event_count INTEGER,
+        case_arrivals INTEGER,
+        PRIMARY KEY (file_id, granularity, bucket)
+    );
     
-    conn.commit()
-    conn.close()
+    -- Event counts per activity per hour/day/week bucket
+    CREATE TABLE IF NOT EXISTS activity_rollups (
+        file_id TEXT,
+        granularity TEXT,
+        bucket TEXT,
+        activity TEXT,
+        event_count INTEGER,
+        PRIMARY KEY (file_id, granularity, bucket, activity)
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_activity_rollups_activity
+        ON activity_rollups (file_id, granularity, activity, bucket);
+    
+    -- Wall time, CPU time, peak RSS and row count of every pipeline stage;
+    -- run is the submission time of the job the stage belonged to
+    CREATE TABLE IF NOT EXISTS pipeline_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_id TEXT,
+        run REAL,
+        operation TEXT,
+        stage TEXT,
+        status TEXT,
+        started_at REAL,
+        wall_seconds REAL,
+        cpu_seconds REAL,
+        peak_rss_bytes INTEGER,
+        rows INTEGER
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_pipeline_stats_file
+        ON pipeline_stats (file_id, run);
+    ''')
 
 init_db()
 
 # Helper function to convert CSV to OCEL JSON
-def convert_csv_to_ocel(csv_path, output_path):
+def convert_csv_to_ocel(csv_path, output_path, events_path=None, database_path=None, steps=None, bitmaps_path=None):
     """
     Convert CSV file to OCEL JSON format
-    This is a placeholder - you'll need to implement your actual conversion logic
+    The rows are read into an integer-coded event table (event_log.EventTable)
+    and events, omaps and vmaps are rendered column-wise from it instead of
+    walking the rows one by one. When events_path is given the event
+    table is also written there as a memory-mappable columnar store, and
+    when database_path is given loaded into an event database (event_db.py);
+    bitmaps_path (with events_path) gets the bitmap indexes for sub-log
+    filters. output_path may be None to skip the JSON export. The time spent on each
+    step is added to the steps dict if one is passed. Returns the event
+    table without its attributes and timestamp text, for discovery.
     """
+    database = None
     try:
-        # Read CSV file
-        df = pd.read_csv(csv_path)
+        # Read CSV file and build the columnar event table
+        with timed(steps, 'parse'):
+            events = build_event_table(read_event_csv(csv_path))
+        if len(events) == 0:
+            raise EmptyLogError("CSV file has no rows")
         
-        # Simple example conversion - modify according to your actual CSV structure
-        ocel = {
-            "ocel:global-event": {"ocel:activity": "__INVALID__"},
-            "ocel:global-object": {"ocel:type": "__INVALID__"},
-            "ocel:global-log": {"ocel:attribute-names": []},
-            "ocel:events": {},
-            "ocel:objects": {}
-        }
+        if events_path:
+            with timed(steps, 'event_store'):
+                write_event_store(events_path, events)
         
-        # Extract column names and add as attributes
-        ocel["ocel:global-log"]["ocel:attribute-names"] = df.columns.tolist()
-        
-        # Simple transformation - you'll need to customize this based on your data
-        for idx, row in df.iterrows():
-            event_id = f"e{idx}"
-            ocel["ocel:events"][event_id] = {
-                "ocel:activity": row.get("activity", "unknown"),
-                "ocel:timestamp": row.get("timestamp", ""),
-                "ocel:omap": [f"o{idx}"],  # Object references
-                "ocel:vmap": {col: str(row[col]) for col in df.columns}
-            }
-            
-            # Create corresponding object
-            obj_id = f"o{idx}"
-            ocel["ocel:objects"][obj_id] = {
-                "ocel:type": row.get("object_type", "case"),
-                "ocel:ovmap": {}
-            }
+        if events_path and bitmaps_path:
+            with timed(steps, 'bitmaps'):
+                bitmaps = BitmapIndexWriter(bitmaps_path, events_path)
+                bitmaps.append(events)
+                bitmaps.close()
         
-        # Write to JSON file
-        with open(output_path, 'w') as f:
-            json.dump(ocel, f, indent=2)
+        if database_path:
+            with timed(steps, 'event_database'):
+                database = EventDatabaseWriter(database_path)
+                database.append(events)
+                database.close()
         
-        return True
+        # Write to JSON file in batches of pre-rendered events
+        if output_path:
+            with timed(steps, 'ocel_json'), open_artifact(output_path, 'w') as f:
+                writer = OcelJsonWriter(f, events.source_columns)
+                writer.begin()
+                writer.write_events(events)
+                writer.finish()
+        
+        return True, events.compact()
     except Exception as e:
         print(f"Error converting CSV to OCEL: {e}")
-        return False
+        if database is not None:
+            database.abort()
+        # An empty log fails the job with the same error in every mode
+        if isinstance(e, EmptyLogError):
+            raise
+        return False, None
 
-# Placeholder for process discovery function
-def perform_process_discovery(ocel_path, output_path):
+# Store a discovered model with its precomputed simplification ladder
+def write_process_model(model_path, model):
+    model.update(simplification_ladder(model))
+    write_model(model_path, model)
+
+# Process discovery on the case-sorted event table
+def perform_process_discovery(events, output_path, model_path=None, workers=None, events_path=None):
     """
-    Perform process discovery on OCEL file
-    This is a placeholder - you'll need to implement your actual process discovery logic
+    Perform directly-follows process discovery
+    events is the event table from convert_csv_to_ocel, or the path of an
+    OCEL JSON file to read it from. Activity frequencies, directly-follows
+    counts, start/end activities and per-edge durations come from a single
+    vectorized pass over the case-sorted events, or with workers > 1 and
+    the event store the table was written to (events_path) from one pass
+    per case partition of the store (same result, see discover_parallel).
+    The model is written as JSON to output_path and/or as columnar arrays
+    to model_path.
     """
     try:
-        # Read OCEL file
-        with open(ocel_path, 'r') as f:
-            ocel = json.load(f)
+        if isinstance(events, str):
+            events = read_ocel_events(events)
         
-        # Simple example - create a process data structure
-        # Replace with your actual process discovery algorithm
-        process_data = {
-            "nodes": [],
-            "edges": [],
-            "statistics": {
-                "totalCases": len(set([o.split(':')[1] for e in ocel["ocel:events"].values() for o in e["ocel:omap"] if ':' in o])),
-                "totalEvents": len(ocel["ocel:events"]),
-                "activities": {}
-            }
-        }
+        workers = workers or DISCOVERY_WORKERS
+        if workers > 1 and events_path:
+            state = discover_parallel(events_path, events.dictionaries, workers)
+        else:
+            state = DiscoveryState().update(events)
+        model = state.to_model()
+        process_data = process_data_from_model(model)
         
-        # Extract activities and create nodes
-        activities = set()
-        for event in ocel["ocel:events"].values():
-            activities.add(event["ocel:activity"])
+        if model_path:
+            write_process_model(model_path, model)
         
-        for idx, activity in enumerate(activities):
-            process_data["nodes"].append({
-                "id": f"a{idx}",
-                "name": activity,
-                "type": "activity"
-            })
+        # Write to JSON file
+        if output_path:
+            with open_artifact(output_path, 'w') as f:
+                json.dump(process_data, f)
+        
+        return True, process_data
+    except Exception as e:
+        print(f"Error performing process discovery: {e}")
+        return False, None
+
+# Streaming alternative to convert_csv_to_ocel + perform_process_discovery
+def stream_csv_to_process(csv_path, ocel_path, process_path, events_path=None, model_path=None, chunk_rows=None,
+                          steps=None, database_path=None, bitmaps_path=None):
+    """
+    Convert a CSV file to OCEL JSON and discover the process in one pass.
+    The CSV is read in chunks of chunk_rows rows; each chunk is written to the
+    OCEL file (and event store) and folded into the running statistics
+    before the next one is read, so memory is bounded by the chunk size plus
+    one entry per distinct activity, case and object rather than by the size
+    of the file. Events of a case must appear in time order across chunks.
+    """
+    database = None
+    try:
+        chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+        state = DiscoveryState()
+        store = EventStoreWriter(events_path) if events_path else None
+        # Chunks are encoded with one set of dictionaries, the event store's
+        dictionaries = store.dictionaries if store is not None else EventDictionaries()
+        bitmaps = BitmapIndexWriter(bitmaps_path, events_path) if events_path and bitmaps_path else None
+        database = EventDatabaseWriter(database_path) if database_path else None
+        total_events = 0
+        
+        with contextlib.ExitStack() as stack:
+            ocel_file = stack.enter_context(open_artifact(ocel_path, 'w')) if ocel_path else None
+            writer = None
+            chunks = iter(read_event_csv(csv_path, chunksize=chunk_rows))
+            while True:
+                with timed(steps, 'parse'):
+                    df = next(chunks, None)
+                    if df is None:
+                        break
+                    events = build_event_table(df, offset=total_events, dictionaries=dictionaries)
+                    # Only the event table is kept while the chunk is handled
+                    del df
+                
+                if ocel_file is not None:
+                    with timed(steps, 'ocel_json'):
+                        if writer is None:
+                            writer = OcelJsonWriter(ocel_file, events.source_columns)
+                            writer.begin()
+                        writer.write_events(events)
+                if store is not None:
+                    with timed(steps, 'event_store'):
+                        store.append(events)
+                if bitmaps is not None:
+                    with timed(steps, 'bitmaps'):
+                        bitmaps.append(events)
+                if database is not None:
+                    with timed(steps, 'event_database'):
+                        database.append(events)
+                
+                with timed(steps, 'discovery'):
+                    state.update(events)
+                total_events += len(events)
             
-            # Count occurrences of each activity
-            process_data["statistics"]["activities"][activity] = sum(
-                1 for e in ocel["ocel:events"].values() if e["ocel:activity"] == activity
-            )
+            if total_events == 0:
+                raise EmptyLogError("CSV file has no rows")
+            if writer is not None:
+                with timed(steps, 'ocel_json'):
+                    writer.finish()
         
-        # Create simple edges between activities (this is simplified)
-        # In a real implementation, you'd derive this from the actual process flow
-        node_ids = [n["id"] for n in process_data["nodes"]]
-        for i in range(len(node_ids)-1):
-            process_data["edges"].append({
-                "source": node_ids[i],
-                "target": node_ids[i+1],
-                "value": 1  # placeholder weight
-            })
+        if store is not None:
+            with timed(steps, 'event_store'):
+                store.close()
+        if bitmaps is not None:
+            with timed(steps, 'bitmaps'):
+                bitmaps.close()
+        if database is not None:
+            with timed(steps, 'event_database'):
+                database.close()
+            database = None
         
-        # Write to JSON file
-        with open(output_path, 'w') as f:
-            json.dump(process_data, f, indent=2)
+        model = state.to_model()
+        process_data = process_data_from_model(model)
+        
+        if model_path:
+            write_process_model(model_path, model)
+        
+        if process_path:
+            with open_artifact(process_path, 'w') as f:
+                json.dump(process_data, f)
         
         return True, process_data
     except Exception as e:
-        print(f"Error performing process discovery: {e}")
+        print(f"Error streaming CSV to process model: {e}")
+        if database is not None:
+            database.abort()
+        if isinstance(e, EmptyLogError):
+            raise
         return False, None
 
-# Placeholder for outlier analysis function
-def perform_outlier_analysis(process_data, file_id):
+# Sketch-based alternative to stream_csv_to_process for huge logs
+def approximate_csv_to_process(csv_path, process_path, model_path, chunk_rows=None):
     """
-    Perform outlier analysis based on process data
-    This is a placeholder - you'll need to implement your actual outlier analysis logic
+    Discover an approximate process model in one pass over the CSV with
+    memory bounded by the sketch sizes (see approximate.py) instead of the
+    number of cases. No event store or OCEL export is written, so variants,
+    case-level outliers and appends are not available for the upload.
+    Returns (success, process_data, (start_date, end_date, rollup rows)).
     """
     try:
-        # Connect to database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        state = ApproximateState()
+        rollups = RollupFold()
+        for df in read_event_csv(csv_path, chunksize=chunk_rows or STREAM_CHUNK_ROWS):
+            # Dictionaries of one chunk only, memory must not grow with the cases
+            events = build_event_table(df, offset=state.total_events)
+            
+            # Cases not open before this chunk arrive at their first event
+            rollups.add(events["time"], events["activity"], events.dictionaries.names("activity").tolist(),
+                        case_arrivals(events, ~state.is_open(events)))
+            
+            state.update(events)
         
-        # Sample outlier analysis - replace with your actual algorithm
+        if state.total_events == 0:
+            raise EmptyLogError("CSV file has no rows")
+        
+        model = state.to_model()
+        process_data = process_data_from_model(model)
+        write_process_model(model_path, model)
+        
+        if process_path:
+            with open_artifact(process_path, 'w') as f:
+                json.dump(process_data, f)
+        
+        return True, process_data, (rollups.start_date, rollups.end_date) + tuple(rollups.rows())
+    except Exception as e:
+        print(f"Error processing CSV in approximate mode: {e}")
+        if isinstance(e, EmptyLogError):
+            raise
+        return False, None, None
+
+# First timestamp of every case among the selected events of a table
+def case_arrivals(events, selected):
+    return pd.Series(events["time"][selected]).groupby(events["case"][selected]).min().to_numpy()
+
+# Time bounds and rollup rows of a whole event store
+def summarize_event_store(events_path):
+    columns = read_events(events_path, ("case", "activity", "time"))
+    order, starts = case_traces(columns["case"], columns["time"])
+    arrivals = np.asarray(columns["time"])[order][starts]
+    start_date, end_date = time_bounds(columns["time"])
+    totals, activities = rollup_rows(columns["time"], columns["activity"],
+                                     read_dictionary(events_path, "activity").tolist(), arrivals)
+    return start_date, end_date, totals, activities
+
+# Add rollup rows to the stored ones (inside a write transaction)
+def store_rollups(conn, file_id, totals, activities):
+    conn.executemany(
+        "INSERT INTO event_rollups VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (file_id, granularity, bucket) DO UPDATE SET "
+        "event_count = event_count + excluded.event_count, case_arrivals = case_arrivals + excluded.case_arrivals",
+        [(file_id,) + row for row in totals]
+    )
+    conn.executemany(
+        "INSERT INTO activity_rollups VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (file_id, granularity, bucket, activity) DO UPDATE SET "
+        "event_count = event_count + excluded.event_count",
+        [(file_id,) + row for row in activities]
+    )
+
+# Score activity frequencies and case-level outliers of a processed log
+def perform_outlier_analysis(process_data, file_id, events_path=None, replace=False, steps=None, features_path=None):
+    """
+    Perform outlier analysis based on process data
+    Activities are scored on frequency; with an event store, cases are also
+    scored on duration, trace length, rework and rare transitions (only
+    flagged cases are stored, see outliers.case_outliers). features_path
+    keeps the per-case feature table, so after an append only the new
+    events are read. With replace=True the previous results of file_id are swapped out in
+    the same transaction (used when events are appended).
+    """
+    try:
         outliers = []
         
-        # Example: identify activities with unusual frequency
+        # Activities with unusual frequency
         activities = process_data["statistics"]["activities"]
-        avg_frequency = sum(activities.values()) / len(activities)
+        avg_frequency = sum(activities.values()) / len(activities) if activities else 0
         
         for activity, count in activities.items():
             # Simple outlier detection based on frequency
             is_outlier = count > 2 * avg_frequency or count < 0.5 * avg_frequency
             score = count / avg_frequency
             
-            outlier_id = str(uuid.uuid4())
             outliers.append({
-                "id": outlier_id,
+                "id": str(uuid.uuid4()),
                 "type": "activity_frequency",
                 "entity_id": activity,
                 "score": score,
                 "is_outlier": is_outlier
             })
-            
-            # Insert into database
-            cursor.execute(
-                "INSERT INTO outlier_results VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
-                (outlier_id, file_id, "activity_frequency", activity, score, int(is_outlier))
-            )
         
-        conn.commit()
-        conn.close()
+        # Case-level outliers from per-case arrays of the event store
+        if events_path:
+            with timed(steps, 'score'):
+                flagged = case_outliers(events_path, features_path)
+            for outlier_type, case_id, score in flagged:
+                outliers.append({
+                    "id": str(uuid.uuid4()),
+                    "type": outlier_type,
+                    "entity_id": case_id,
+                    "score": score,
+                    "is_outlier": True
+                })
+        
+        # Insert into database in one transaction
+        rows = [(o["id"], file_id, o["type"], o["entity_id"], o["score"], int(o["is_outlier"])) for o in outliers]
+        
+        def store(conn):
+            if replace:
+                conn.execute("DELETE FROM outlier_results WHERE file_id = ?", (file_id,))
+            conn.executemany("INSERT INTO outlier_results VALUES (?, ?, ?, ?, ?, ?, datetime('now'))", rows)
+        
+        with timed(steps, 'sqlite'):
+            db.write(store)
         
         return outliers
     except Exception as e:
+        # Fails the job: stale results must not pass for the current ones
         print(f"Error performing outlier analysis: {e}")
-        return []
+        raise
 
-# API endpoint for uploading CSV file
-@app.route('/api/upload', methods=['POST'])
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
-    
-    if file:
-        # Generate unique file ID
-        file_id = str(uuid.uuid4())
-        
-        # Secure the filename
-        filename = secure_filename(file.filename)
-        csv_path = os.path.join(UPLOAD_FOLDER, f"{file_id}_{filename}")
-        
-        # Save the file
-        file.save(csv_path)
-        
+# Stages reported by /api/jobs for each processing mode
+PIPELINE_STAGES = {
+    'batch': ['convert', 'discovery', 'variants', 'metadata', 'outliers'],
+    'stream': ['stream', 'variants', 'metadata', 'outliers'],
+    'approx': ['approx', 'metadata', 'outliers']
+}
+
+# Persist the measurements of every stage of a finished job
+def record_pipeline_stats(file_id, state):
+    """
+    One pipeline_stats row per stage that ran, plus one per step inside it
+    (named "<stage>.<step>", wall time only). Failures are only logged so
+    they never change the outcome of the job.
+    """
+    try:
+        operation = state.get("mode") if state.get("mode") == 'append' else 'upload'
+        rows = []
+        for stage in state.get("stages", []):
+            if "seconds" not in stage:
+                continue
+            rows.append((file_id, state.get("submittedAt"), operation, stage["name"], stage["status"],
+                         stage["startedAt"], stage["seconds"], stage.get("cpuSeconds"),
+                         stage.get("peakRssBytes"), stage.get("rows")))
+            for step, seconds in stage.get("steps", {}).items():
+                rows.append((file_id, state.get("submittedAt"), operation, f"{stage['name']}.{step}",
+                              stage["status"], None, seconds, None, None, None))
+        db.executemany(
+            "INSERT INTO pipeline_stats (file_id, run, operation, stage, status, started_at, wall_seconds, "
+            "cpu_seconds, peak_rss_bytes, rows) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    except Exception as e:
+        print(f"Error recording pipeline stats for {file_id}: {e}")
+
+# Full processing pipeline for an uploaded CSV; runs in the job pool
+def process_upload(file_id, filename, csv_path, mode, claim=None):
+    """
+    Convert, discover, store metadata and analyse outliers for an upload,
+    recording each stage in the job state. Returns the upload metrics, or
+    None if a stage failed.
+    csv_path may also be a binary file object the CSV is parsed from as it
+    arrives. claim(), when given, runs once the CSV has been read and may
+    raise DuplicateUpload to drop this upload for an identical earlier one.
+    """
+    job = JobTracker(artifact_paths(file_id)["job"])
+    duplicate = None
+    try:
         # Define output paths
-        ocel_path = os.path.join(PROCESSED_FOLDER, f"{file_id}_ocel.json")
-        process_path = os.path.join(PROCESSED_FOLDER, f"{file_id}_process.json")
+        paths = artifact_paths(file_id)
+        ocel_path = paths["ocel"] if EXPORT_JSON else None
+        process_path = paths["process"] if EXPORT_JSON else None
+        database_path = paths["database"] if EVENT_DATABASE else None
         
         # Process the file
-        if not convert_csv_to_ocel(csv_path, ocel_path):
-            return jsonify({"error": "Failed to convert CSV to OCEL"}), 500
+        if mode == 'approx':
+            with job.stage('approx') as stage:
+                success, process_data, summary = approximate_csv_to_process(csv_path, process_path, paths["model"])
+                if not success:
+                    raise RuntimeError("Failed to process CSV in approximate mode")
+                stage["rows"] = process_data["statistics"]["totalEvents"]
+            ocel_path = None
+        elif mode == 'stream':
+            with job.stage('stream') as stage:
+                stage["steps"] = {}
+                success, process_data = stream_csv_to_process(
+                    csv_path, ocel_path, process_path, paths["events"], paths["model"], steps=stage["steps"],
+                    database_path=database_path, bitmaps_path=paths["bitmaps"])
+                if not success:
+                    raise RuntimeError("Failed to process CSV in streaming mode")
+                stage["rows"] = process_data["statistics"]["totalEvents"]
+        else:
+            with job.stage('convert') as stage:
+                stage["steps"] = {}
+                success, events = convert_csv_to_ocel(csv_path, ocel_path, paths["events"], database_path,
+                                                      steps=stage["steps"], bitmaps_path=paths["bitmaps"])
+                if not success:
+                    raise RuntimeError("Failed to convert CSV to OCEL")
+                stage["rows"] = len(events)
+            
+            with job.stage('discovery') as stage:
+                success, process_data = perform_process_discovery(events, process_path, paths["model"],
+                                                                    events_path=paths["events"])
+                if not success:
+                    raise RuntimeError("Failed to perform process discovery")
+                stage["rows"] = len(events)
         
-        success, process_data = perform_process_discovery(ocel_path, process_path)
-        if not success:
-            return jsonify({"error": "Failed to perform process discovery"}), 500
+        if claim is not None:
+            claim()
         
-        # Store metadata
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        if mode != 'approx':
+            with job.stage('variants') as stage:
+                stage["rows"] = int(write_variant_index(paths["events"], paths["variants"], DISCOVERY_WORKERS)["total_cases"])
         
         # Get basic stats from process data
         total_events = process_data["statistics"]["totalEvents"]
         total_cases = process_data["statistics"]["totalCases"]
         
-        # In a real implementation, extract these from actual timestamp data
-        start_date = "2023-01-01"
-        end_date = "2023-12-31"
+        # Store metadata and time rollups
+        with job.stage('metadata') as stage:
+            stage["steps"] = {}
+            with timed(stage["steps"], 'rollups'):
+                if mode == 'approx':
+                    start_date, end_date, totals, activities = summary
+                else:
+                    start_date, end_date, totals, activities = summarize_event_store(paths["events"])
+            
+            def store(conn):
+                conn.execute(
+                    "INSERT INTO process_metadata VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
+                    (file_id, filename, total_events, total_cases, start_date, end_date)
+                )
+                store_rollups(conn, file_id, totals, activities)
+            
+            with timed(stage["steps"], 'sqlite'):
+                db.write(store)
+            stage["rows"] = 1 + len(totals) + len(activities)
+        
+        # Perform outlier analysis
+        with job.stage('outliers') as stage:
+            stage["steps"] = {}
+            outliers = perform_outlier_analysis(process_data, file_id, paths["events"] if mode != 'approx' else None,
+                                                steps=stage["steps"], features_path=paths["features"])
+            stage["rows"] = len(outliers)
         
-        cursor.execute(
-            "INSERT INTO process_metadata VALUES (?, ?, ?, ?, ?, ?, datetime('now'))",
-            (file_id, filename, total_events, total_cases, start_date, end_date)
+        # Record the artifacts so identical re-uploads can reuse them
+        db.execute(
+            "UPDATE content_index SET ocel_path = ?, model_path = ?, outlier_count = ? WHERE file_id = ?",
+            (ocel_path, paths["model"], len(outliers), file_id)
         )
-        conn.commit()
-        conn.close()
         
-        # Perform outlier analysis
-        outliers = perform_outlier_analysis(process_data, file_id)
+        metrics = {
+            "totalEvents": total_events,
+            "totalCases": total_cases,
+            "startDate": start_date,
+            "endDate": end_date
+        }
+        job.complete(metrics)
+        return metrics
+    except DuplicateUpload as e:
+        duplicate = e
+        remove_artifacts(file_id)
+        raise
+    except Exception as e:
+        print(f"Error processing upload {file_id}: {e}")
+        job.fail(str(e), client_error=isinstance(e, EmptyLogError))
+        db.execute("DELETE FROM content_index WHERE file_id = ?", (file_id,))
+        return None
+    finally:
+        if duplicate is None:
+            record_pipeline_stats(file_id, job.state)
+
+# Serialise writers of one upload's artifacts across processes
+@contextlib.contextmanager
+def artifact_lock(file_id):
+    with open(artifact_paths(file_id)["lock"], 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+APPEND_STAGES = ['append', 'variants', 'metadata', 'outliers']
+
+# Journal of an append being published, and the saved end of its OCEL export
+def append_journal_paths(file_id):
+    journal = os.path.join(PROCESSED_FOLDER, f"{file_id}_append.json")
+    return journal, journal + ".ocel"
+
+# Undo or finish an append that was interrupted while publishing
+def recover_append(file_id):
+    """
+    The model is written last, so an append whose journal is still there
+    either never reached it (its events are rolled back out of the event
+    store, bitmap index, event database and OCEL export) or did (only the
+    journal is left). Metadata written from an older model is rebuilt from
+    the event store. Runs under the artifact lock.
+    """
+    paths = artifact_paths(file_id)
+    journal_path, ocel_tail = append_journal_paths(file_id)
+    if os.path.exists(journal_path):
+        with open(journal_path, 'r') as f:
+            journal = json.load(f)
+        if int(read_model(paths["model"])["total_events"]) == journal["rows"]:
+            print(f"Rolling back an interrupted append to {file_id}")
+            rollback_event_store(paths["events"], journal["events"])
+            if journal["bitmaps"] is not None:
+                rollback_bitmap_index(paths["bitmaps"], paths["events"], journal["bitmaps"])
+            if journal["database"] is not None:
+                rollback_event_database(paths["database"], journal["database"])
+            if journal["ocel"] is not None:
+                rollback_ocel(paths["ocel"], journal["ocel"], ocel_tail)
+        elif EXPORT_JSON:
+            with open_artifact(paths["process"], 'w') as f:
+                json.dump(process_data_from_model(read_model(paths["model"])), f)
+        for path in (ocel_tail, journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    # The metadata stage of an append that was cut short after its model
+    model = read_model(paths["model"])
+    row = db.query_one("SELECT total_events FROM process_metadata WHERE file_id = ?", (file_id,))
+    if row is not None and row[0] != int(model["total_events"]):
+        start_date, end_date, totals, activities = summarize_event_store(paths["events"])
         
-        # Return response with file ID and basic info
-        return jsonify({
-            "success": True,
+        def store(conn):
+            conn.execute(
+                "UPDATE process_metadata SET total_events = ?, total_cases = ?, start_date = ?, end_date = ? "
+                "WHERE file_id = ?",
+                (int(model["total_events"]), int(model["total_cases"]), start_date, end_date, file_id)
+            )
+            conn.execute("DELETE FROM event_rollups WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM activity_rollups WHERE file_id = ?", (file_id,))
+            store_rollups(conn, file_id, totals, activities)
+        
+        db.write(store)
+
+# Incrementally add new events to an already processed upload
+def process_append(file_id, csv_path):
+    """
+    Fold the rows of csv_path into the stored artifacts of file_id.
+    The discovery state saved with the model (counts, edges and the last
+    event of every case) is updated from the new rows alone, the event
+    store gains new parts and the OCEL export gets the new events spliced
+    in before its objects section; existing events are never re-read.
+    Every chunk is parsed and staged (unlisted parts, an open database
+    transaction) before anything is published, so a CSV that fails to
+    parse changes nothing. Publishing runs under a journal that
+    recover_append uses to undo it if the job dies half-way, and ends with
+    the model. Returns the updated metrics, or None if a stage failed.
+    """
+    paths = artifact_paths(file_id)
+    job = JobTracker(paths["job"])
+    database = None
+    journal_path, ocel_tail = append_journal_paths(file_id)
+    try:
+        with artifact_lock(file_id):
+            recover_append(file_id)
+            with job.stage('append') as stage:
+                model = read_model(paths["model"])
+                if "last_case" not in model:
+                    raise RuntimeError("This log has no per-case state to continue (approximate mode or processed "
+                                       "before appends were supported); upload it again")
+                
+                store = EventStoreWriter(paths["events"], append=True)
+                journal = {"rows": store.rows, "events": store.checkpoint(), "bitmaps": None, "database": None,
+                           "ocel": None}
+                state = DiscoveryState.from_model(model, store.dictionaries)
+                # The database takes the new events in one transaction
+                # that is only committed once all chunks are in
+                if os.path.exists(paths["database"]):
+                    database = EventDatabaseWriter(paths["database"], append=True)
+                    journal["database"] = database.checkpoint()
+                bitmaps = BitmapIndexWriter(paths["bitmaps"], paths["events"], append=True) \
+                    if os.path.exists(paths["bitmaps"]) else None
+                if bitmaps is not None:
+                    journal["bitmaps"] = bitmaps.checkpoint()
+                appended = 0
+                rollups = RollupFold()
+                for df in read_event_csv(csv_path, chunksize=STREAM_CHUNK_ROWS):
+                    events = build_event_table(df, offset=store.rows, dictionaries=store.dictionaries)
+                    store.append(events)
+                    if bitmaps is not None:
+                        bitmaps.append(events)
+                    if database is not None:
+                        database.append(events)
+                    
+                    # Rollups only grow by the new rows; cases not seen
+                    # before arrive at their first new event
+                    rollups.add(events["time"], events["activity"], store.dictionaries.names("activity").tolist(),
+                                case_arrivals(events, ~state.known_cases(events["case"])))
+                    
+                    state.update(events)
+                    appended += len(events)
+                if appended == 0:
+                    raise EmptyLogError("CSV file has no rows")
+                
+                # Everything is staged; from here on the journal can undo it
+                ocel = paths["ocel"] if EXPORT_JSON and os.path.exists(paths["ocel"]) else None
+                if ocel is not None:
+                    journal["ocel"] = ocel_checkpoint(ocel, ocel_tail)
+                with open(journal_path + ".tmp", 'w') as f:
+                    json.dump(journal, f)
+                os.replace(journal_path + ".tmp", journal_path)
+                
+                store.close()
+                if bitmaps is not None:
+                    bitmaps.close()
+                if database is not None:
+                    database.close()
+                    database = None
+                if ocel is not None:
+                    # The CSV parsed once already, so this pass cannot fail on it
+                    offset = journal["rows"]
+                    for df in read_event_csv(csv_path, chunksize=STREAM_CHUNK_ROWS):
+                        events = build_event_table(df, offset=offset, dictionaries=store.dictionaries)
+                        append_ocel_events(ocel, events)
+                        offset += len(events)
+                
+                model = state.to_model()
+                process_data = process_data_from_model(model)
+                write_process_model(paths["model"], model)
+                for path in (ocel_tail, journal_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                if EXPORT_JSON:
+                    with open_artifact(paths["process"], 'w') as f:
+                        json.dump(process_data, f)
+                stage["rows"] = appended
+            
+            # Only the traces of the cases the new rows touch are updated
+            with job.stage('variants') as stage:
+                stage["rows"] = int(append_variant_index(paths["events"], paths["variants"])["total_cases"])
+            
+            total_events = process_data["statistics"]["totalEvents"]
+            total_cases = process_data["statistics"]["totalCases"]
+            
+            with job.stage('metadata') as stage:
+                totals, activities = rollups.rows()
+                start_date, end_date = rollups.start_date, rollups.end_date
+                
+                def store(conn):
+                    conn.execute(
+                        "UPDATE process_metadata SET total_events = ?, total_cases = ? WHERE file_id = ?",
+                        (total_events, total_cases, file_id)
+                    )
+                    if start_date is not None:
+                        # ISO timestamps compare like the times they encode
+                        conn.execute(
+                            "UPDATE process_metadata SET start_date = MIN(COALESCE(start_date, ?), ?), "
+                            "end_date = MAX(COALESCE(end_date, ?), ?) WHERE file_id = ?",
+                            (start_date, start_date, end_date, end_date, file_id)
+                        )
+                    store_rollups(conn, file_id, totals, activities)
+                    # The artifacts no longer match the originally uploaded content
+                    conn.execute("DELETE FROM content_index WHERE file_id = ?", (file_id,))
+                
+                db.write(store)
+                stage["rows"] = 1 + len(totals) + len(activities)
+            
+            with job.stage('outliers') as stage:
+                stage["steps"] = {}
+                stage["rows"] = len(perform_outlier_analysis(process_data, file_id, paths["events"], replace=True,
+                                                             steps=stage["steps"], features_path=paths["features"]))
+        
+        row = db.query_one("SELECT start_date, end_date FROM process_metadata WHERE file_id = ?", (file_id,))
+        metrics = {
+            "totalEvents": total_events,
+            "totalCases": total_cases,
+            "appendedEvents": appended,
+            "startDate": row[0] if row else None,
+            "endDate": row[1] if row else None
+        }
+        job.complete(metrics)
+        # Drop this process's stale responses now; other processes see the
+        # new artifact version
+        response_cache.invalidate(file_id)
+        return metrics
+    except Exception as e:
+        print(f"Error appending to {file_id}: {e}")
+        if database is not None:
+            database.abort()
+        # Undo a half-published append now rather than on the next one
+        if os.path.exists(journal_path):
+            try:
+                with artifact_lock(file_id):
+                    recover_append(file_id)
+            except Exception as rollback_error:
+                print(f"Error rolling back the append to {file_id}: {rollback_error}")
+        job.fail(str(e), client_error=isinstance(e, EmptyLogError))
+        return None
+    finally:
+        record_pipeline_stats(file_id, job.state)
+
+# Remove the files of an upload that is being abandoned
+def remove_artifacts(file_id):
+    for path in artifact_paths(file_id).values():
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+class DuplicateUpload(Exception):
+    """Identical content was uploaded before as file_id (with its job state)"""
+    
+    def __init__(self, file_id, job):
+        super().__init__(file_id)
+        self.file_id = file_id
+        self.job = job
+
+# Register content_hash -> file_id; False if the content is already indexed
+def claim_upload(content_hash, file_id, size):
+    return db.execute(
+        "INSERT OR IGNORE INTO content_index (content_hash, file_id, size, timestamp) VALUES (?, ?, ?, datetime('now'))",
+        (content_hash, file_id, size)
+    ) == 1
+
+# Look up an earlier upload with identical content
+def find_duplicate_upload(content_hash):
+    """
+    Return (file_id, job state) of an earlier upload with the same content
+    whose job is queued, running or finished with its artifacts intact.
+    Stale index entries (failed jobs, missing files or outlier rows) are
+    dropped so the content gets processed again.
+    """
+    row = db.query_one(
+        "SELECT file_id, ocel_path, model_path, outlier_count FROM content_index WHERE content_hash = ?",
+        (content_hash,)
+    )
+    if not row:
+        return None
+    
+    file_id, ocel_path, model_path, outlier_count = row
+    job = read_job(artifact_paths(file_id)["job"])
+    intact = job is not None and job["status"] != "failed"
+    if intact and job["status"] == "completed":
+        stored = db.query_one("SELECT COUNT(*) FROM outlier_results WHERE file_id = ?", (file_id,))[0]
+        intact = (model_path is not None and os.path.exists(model_path)
+                  and (ocel_path is None or os.path.exists(ocel_path))
+                  and stored == outlier_count)
+    
+    if not intact:
+        db.execute("DELETE FROM content_index WHERE content_hash = ? AND file_id = ?", (content_hash, file_id))
+        return None
+    return file_id, job
+
+# Response for an upload whose content was processed before
+def duplicate_response(duplicate, filename):
+    response = {
+        "success": True,
+        "file_id": duplicate.file_id,
+        "filename": duplicate.job.get("filename", filename),
+        "deduplicated": True
+    }
+    if duplicate.job["status"] == "completed":
+        response["metrics"] = duplicate.job["metrics"]
+        return jsonify(response)
+    
+    response.update({"status": duplicate.job["status"], "job": f"/api/jobs/{duplicate.file_id}"})
+    return jsonify(response), 202
+
+# Error response of a job that failed inside the request (sync=1); bad
+# input such as a header-only CSV is the client's error
+def failed_job_response(job_path):
+    job = read_job(job_path)
+    return jsonify({"error": job["error"]}), 400 if job.get("clientError") else 500
+
+# Whether value is a uuid in its canonical form, as file ids are
+def is_uuid(value):
+    try:
+        return str(uuid.UUID(value)) == value
+    except ValueError:
+        return False
+
+# API endpoint for uploading CSV file
+@app.route('/api/upload', methods=['POST'])
+def upload_file():
+    """
+    The multipart body is read as it arrives rather than spooled first.
+    With sync=1 the CSV is parsed straight from the request while the same
+    pass hashes it and saves it to uploads/; otherwise it is hashed and
+    saved in one pass and handed to a background job. Form fields (mode,
+    sync) are only seen when sent before the file; query args always work.
+    .csv.gz and .csv.zst uploads are decompressed in the same pass and
+    saved as sent. A file_id query arg (a new uuid chosen by the client)
+    names the upload, so /api/preview/<file_id> can be polled while the
+    body is still being sent.
+    """
+    try:
+        upload = MultipartUpload(request.stream, request.content_type)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if upload.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    
+    codec = codec_of(upload.filename)
+    if codec and not available(codec):
+        return jsonify({"error": f"{codec} uploads need the zstandard package on the server"}), 400
+    
+    # Generate unique file ID, unless the client picked one up front
+    file_id = request.args.get('file_id')
+    if file_id is None:
+        file_id = str(uuid.uuid4())
+    elif not is_uuid(file_id):
+        return jsonify({"error": "file_id must be a uuid"}), 400
+    elif any(os.path.exists(path) for path in artifact_paths(file_id).values()):
+        return jsonify({"error": "file_id is already in use"}), 409
+    
+    # Secure the filename
+    filename = secure_filename(upload.filename)
+    csv_path = os.path.join(UPLOAD_FOLDER, f"{file_id}_{filename}")
+    
+    # Pick streaming mode for large files so memory stays bounded
+    mode = upload.fields.get('mode') or request.args.get('mode')
+    if mode is None:
+        size = (request.content_length or 0) * (COMPRESSED_UPLOAD_RATIO if codec else 1)
+        mode = 'stream' if size > STREAMING_THRESHOLD_BYTES else 'batch'
+    if mode not in PIPELINE_STAGES:
+        return jsonify({"error": f"Unknown processing mode: {mode}"}), 400
+    
+    # The job exists before the content is claimed, so a concurrent
+    # identical upload always sees a live job behind the index entry. A
+    # client-chosen file_id is claimed by creating its job file.
+    paths = artifact_paths(file_id)
+    job_path = paths["job"]
+    try:
+        JobTracker.create(job_path, PIPELINE_STAGES[mode], exclusive='file_id' in request.args, file_id=file_id,
+                          filename=filename, mode=mode)
+    except FileExistsError:
+        return jsonify({"error": "file_id is already in use"}), 409
+    
+    # A provisional preview is sampled from the rows read in the first
+    # PREVIEW_SECONDS and published while the upload goes on
+    preview = {}
+    
+    def publish(result):
+        write_preview(paths["preview"], result)
+        preview.update(result)
+    
+    sampler = PreviewSampler(request.content_length, publish) if PREVIEW_SECONDS > 0 else None
+    source = UploadStream(upload.chunks(), csv_path, codec, sampler.feed if sampler else None)
+    
+    # Identical content uploaded before is answered with its file_id
+    def claim():
+        content_hash, size = source.drain()
+        # Approximate results must never stand in for exact ones (or vice versa)
+        if mode == 'approx':
+            content_hash += ":approx"
+        while not claim_upload(content_hash, file_id, size):
+            duplicate = find_duplicate_upload(content_hash)
+            if duplicate is not None:
+                raise DuplicateUpload(*duplicate)
+    
+    try:
+        # sync=1 processes inside the request, parsing the body as it arrives
+        if (upload.fields.get('sync') or request.args.get('sync')) == '1':
+            metrics = process_upload(file_id, filename, source.reader(), mode, claim)
+            if metrics is None:
+                return failed_job_response(job_path)
+            
+            return jsonify({
+                "success": True,
+                "file_id": file_id,
+                "filename": filename,
+                "metrics": metrics
+            })
+        
+        claim()
+    except (DuplicateUpload, UploadError) as e:
+        source.close()
+        for path in (csv_path, job_path, paths["preview"]):
+            if os.path.exists(path):
+                os.remove(path)
+        if isinstance(e, DuplicateUpload):
+            return duplicate_response(e, filename)
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        submit(job_path, process_upload, file_id, filename, csv_path, mode)
+    except Exception as e:
+        JobTracker(job_path).fail(str(e))
+        db.execute("DELETE FROM content_index WHERE file_id = ?", (file_id,))
+        return jsonify({"error": f"Failed to queue processing job: {str(e)}"}), 500
+    
+    # Return the file ID straight away; progress is polled from /api/jobs
+    return jsonify({
+        "success": True,
+        "file_id": file_id,
+        "filename": filename,
+        "status": "queued",
+        "rows": source.rows,
+        "job": f"/api/jobs/{file_id}",
+        "preview": preview or None
+    }), 202
+
+# API endpoint for appending new CSV rows to a processed log
+@app.route('/api/append/<file_id>', methods=['POST'])
+def append_file(file_id):
+    try:
+        upload = MultipartUpload(request.stream, request.content_type)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if upload.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    
+    paths = artifact_paths(file_id)
+    if not os.path.exists(paths["model"]):
+        return jsonify({"error": "Processed log not found"}), 404
+    
+    job = read_job(paths["job"])
+    if job is not None and job["status"] in ("queued", "processing"):
+        return jsonify({"error": "Log is still being processed"}), 409
+    if "last_case" not in read_model(paths["model"]):
+        return jsonify({"error": "This log has no per-case state to continue (approximate mode or processed "
+                                 "before appends were supported); upload it again"}), 409
+    
+    codec = codec_of(upload.filename)
+    if codec and not available(codec):
+        return jsonify({"error": f"{codec} uploads need the zstandard package on the server"}), 400
+    
+    filename = secure_filename(upload.filename)
+    csv_path = os.path.join(UPLOAD_FOLDER, f"{file_id}_append_{uuid.uuid4().hex[:8]}_{filename}")
+    try:
+        with UploadStream(upload.chunks(), csv_path, codec) as source:
+            source.drain()
+    except UploadError as e:
+        os.remove(csv_path)
+        return jsonify({"error": str(e)}), 400
+    
+    # The preview sampled from the original upload no longer describes the log
+    if os.path.exists(paths["preview"]):
+        os.remove(paths["preview"])
+    JobTracker.create(paths["job"], APPEND_STAGES, file_id=file_id, filename=filename, mode='append')
+    
+    if (upload.fields.get('sync') or request.args.get('sync')) == '1':
+        metrics = process_append(file_id, csv_path)
+        if metrics is None:
+            return failed_job_response(paths["job"])
+        
+        return jsonify({"success": True, "file_id": file_id, "metrics": metrics})
+    
+    try:
+        submit(paths["job"], process_append, file_id, csv_path)
+    except Exception as e:
+        JobTracker(paths["job"]).fail(str(e))
+        return jsonify({"error": f"Failed to queue append job: {str(e)}"}), 500
+    
+    return jsonify({
+        "success": True,
+        "file_id": file_id,
+        "status": "queued",
+        "job": f"/api/jobs/{file_id}"
+    }), 202
+
+# API endpoint to get the provisional preview of an upload
+@app.route('/api/preview/<file_id>', methods=['GET'])
+def get_preview(file_id):
+    """
+    The preview sampled while the upload was read, with the status of its
+    job; once the job has completed it is superseded by the exact results
+    (the job's metrics and /api/process)
+    """
+    try:
+        paths = artifact_paths(file_id)
+        preview = read_preview(paths["preview"])
+        if preview is None:
+            return jsonify({"error": "Preview not found"}), 404
+        
+        job = read_job(paths["job"]) or {}
+        superseded = job.get("status") == "completed"
+        preview.update({
             "file_id": file_id,
-            "filename": filename,
-            "metrics": {
-                "totalEvents": total_events,
-                "totalCases": total_cases,
-                "startDate": start_date,
-                "endDate": end_date
-            }
+            "status": job.get("status"),
+            "superseded": superseded,
+            "job": f"/api/jobs/{file_id}"
         })
+        if superseded:
+            preview.update({"metrics": job.get("metrics"), "process": f"/api/process/{file_id}"})
+        
+        return jsonify(preview)
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve preview: {str(e)}"}), 500
+
+# API endpoint to get the progress of an upload job
+@app.route('/api/jobs/<file_id>', methods=['GET'])
+def get_job(file_id):
+    try:
+        job = read_job(artifact_paths(file_id)["job"])
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve job: {str(e)}"}), 500
+
+# Version of an upload's artifacts; changes whenever they are rewritten
+def artifact_version(file_id):
+    """
+    The model (or process JSON) file identity, plus that of the job state.
+    Metadata, variants and outliers are written in stages after the model,
+    and every stage rewrites the job state, so a response built in between
+    is not served once the job has moved on.
+    """
+    paths = artifact_paths(file_id)
+    job = os.stat(paths["job"]) if os.path.exists(paths["job"]) else None
+    for path in (paths["model"], paths["process"]):
+        if os.path.exists(path):
+            info = os.stat(path)
+            return (info.st_ino, info.st_mtime_ns) + ((job.st_ino, job.st_mtime_ns) if job else ())
+    return None
+
+# Best compressed encoding the client accepts, None for identity
+def accepted_encoding(codecs=("zstd", "gzip")):
+    for codec in codecs:
+        if available(codec) and request.accept_encodings[codec] > 0:
+            return codec
+    return None
+
+# Serve a JSON payload through the response cache with ETag revalidation
+def cached_json_response(kind, file_id, build):
+    """
+    build() returns the payload, or None when there is nothing to serve.
+    Responses are cached per (kind, file_id) until the artifact version
+    changes; a matching If-None-Match gets 304 Not Modified with no body.
+    Clients accepting zstd or gzip get the body compressed, once per cached
+    entry, under an ETag of its own.
+    """
+    version = artifact_version(file_id)
+    key = (kind, file_id)
+    entry = response_cache.get(key, version) if version is not None else None
+    if entry is None:
+        payload = build()
+        if payload is None:
+            return None
+        body = app.json.dumps(payload).encode('utf-8')
+        entry = response_cache.put(key, version, body) if version is not None else CacheEntry(body, None)
+    
+    codec = accepted_encoding() if len(entry.body) >= MIN_COMPRESS_BYTES else None
+    etag = f"{entry.etag}-{codec}" if codec else entry.etag
+    if request.if_none_match.contains(etag):
+        response_cache.record_not_modified()
+        response = app.response_class(status=304)
+    elif codec:
+        response = app.response_class(response_cache.encoded(key, entry, codec), mimetype='application/json')
+        response.headers['Content-Encoding'] = codec
+    else:
+        response = app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Simplification level and coverage from the level or coverage request arg
+# (see simplify.LADDER); a coverage is resolved against the model later
+def parse_level(args):
+    if args.get('level') and args.get('coverage'):
+        raise ValueError("pass level or coverage, not both")
+    if args.get('coverage'):
+        coverage = float(args['coverage'])
+        if not 0 < coverage <= 1:
+            raise ValueError("coverage must be in (0, 1]")
+        return 0, coverage
+    level = int(args.get('level', 0))
+    if not 0 <= level < len(LADDER):
+        raise ValueError(f"level must be between 0 and {len(LADDER) - 1}")
+    return level, None
+
+# Cache kind of a process model response at a level or coverage
+def level_kind(kind, level, coverage):
+    if coverage is not None:
+        return f"{kind}:coverage={coverage!r}"
+    return f"{kind}:{level}" if level else kind
+
+# Render a columnar model, simplified to a level of its ladder or to the
+# simplest level whose measured event coverage meets coverage
+def render_model(model, level=0, coverage=None):
+    if level == 0 and coverage is None:
+        return process_data_from_model(model)
+    ladder = model_ladder(model)
+    levels = ladder_summary(model, ladder)
+    if coverage is not None:
+        level = ladder_level(levels, coverage)
+        if level == 0:
+            return process_data_from_model(model)
+    process_data = process_data_from_model(simplified_model(model, ladder, level))
+    process_data["statistics"]["simplification"] = levels[level]
+    return process_data
+
+# Load the process model of an upload
+def load_process_data(file_id, level=0, coverage=None):
+    paths = artifact_paths(file_id)
+    
+    # Uploads from before the columnar store only have the JSON file
+    if os.path.exists(paths["model"]):
+        return render_model(read_model(paths["model"]), level, coverage)
+    if os.path.exists(paths["process"]):
+        with open_artifact(paths["process"]) as f:
+            return json.load(f)
+    return None
 
 # API endpoint to get process model
 @app.route('/api/process/<file_id>', methods=['GET'])
 def get_process_model(file_id):
-    process_path = os.path.join(PROCESSED_FOLDER, f"{file_id}_process.json")
+    """
+    level (0 = complete model) or coverage (0-1, picks the simplest level
+    covering at least that share of events) selects a simplified model
+    from the ladder precomputed when the model was written
+    """
+    try:
+        level, coverage = parse_level(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
     
-    if not os.path.exists(process_path):
+    try:
+        kind = level_kind("process", level, coverage)
+        response = cached_json_response(kind, file_id, lambda: load_process_data(file_id, level, coverage))
+        if response is None:
+            return jsonify({"error": "Process model not found"}), 404
+        
+        return response
+    except Exception as e:
+        return jsonify({"error": f"Failed to load process model: {str(e)}"}), 500
+
+# API endpoint to list the simplification levels of a process model
+@app.route('/api/process/<file_id>/levels', methods=['GET'])
+def get_process_levels(file_id):
+    path = artifact_paths(file_id)["model"]
+    if not os.path.exists(path):
         return jsonify({"error": "Process model not found"}), 404
     
     try:
-        with open(process_path, 'r') as f:
-            process_data = json.load(f)
-        
-        return jsonify(process_data)
+        model = read_model(path)
+        return jsonify({"file_id": file_id, "levels": ladder_summary(model, model_ladder(model))})
     except Exception as e:
         return jsonify({"error": f"Failed to load process model: {str(e)}"}), 500
 
+# Heuristics miner thresholds from request args, over the defaults
+def parse_heuristics_parameters(args):
+    parameters = dict(HEURISTICS_PARAMETERS)
+    for name, default in HEURISTICS_PARAMETERS.items():
+        if name not in args:
+            continue
+        if isinstance(default, bool):
+            parameters[name] = args[name] == '1'
+        elif isinstance(default, int):
+            parameters[name] = int(args[name])
+            if parameters[name] < 1:
+                raise ValueError(f"{name} must be at least 1")
+        else:
+            parameters[name] = float(args[name])
+            if not -1 <= parameters[name] <= 1:
+                raise ValueError(f"{name} must be between -1 and 1")
+    return parameters
+
+# API endpoint to mine a heuristics net from the directly-follows counts
+@app.route('/api/heuristics/<file_id>', methods=['GET'])
+def get_heuristics_net(file_id):
+    """
+    Dependency graph with length-one and length-two loops and AND/XOR
+    split/join semantics (heuristics.py), mined from the stored model's
+    directly-follows counts and the variant index. Every threshold of
+    heuristics.DEFAULT_PARAMETERS can be passed as a query arg; results are
+    cached per parameter set until the log changes.
+    """
+    try:
+        parameters = parse_heuristics_parameters(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
+    
+    paths = artifact_paths(file_id)
+    
+    def build():
+        if not os.path.exists(paths["model"]):
+            return None
+        model = read_model(paths["model"])
+        # Approximate uploads have no variant index, so no length-two loops
+        variants = read_model(paths["variants"]) if os.path.exists(paths["variants"]) else None
+        result = heuristics_net(model, parameters, variants)
+        result.update({
+            "file_id": file_id,
+            "statistics": {"totalCases": int(model["total_cases"]), "totalEvents": int(model["total_events"])}
+        })
+        return result
+    
+    try:
+        signature = json.dumps(parameters, sort_keys=True)
+        response = cached_json_response(f"heuristics:{signature}", file_id, build)
+        if response is None:
+            return jsonify({"error": "Process model not found"}), 404
+        
+        return response
+    except Exception as e:
+        return jsonify({"error": f"Failed to mine heuristics net: {str(e)}"}), 500
+
+# API endpoint to download the JSON exports of an upload
+@app.route('/api/export/<file_id>/<kind>', methods=['GET'])
+def export_artifact(file_id, kind):
+    if kind not in ("ocel", "process", "database"):
+        return jsonify({"error": "Unknown export type"}), 400
+    
+    paths = artifact_paths(file_id)
+    path = paths[kind]
+    if os.path.exists(path):
+        mimetype = 'application/vnd.sqlite3' if kind == "database" else 'application/json'
+        codec = codec_of(path)
+        if codec is None:
+            return send_file(path, mimetype=mimetype, as_attachment=True, download_name=os.path.basename(path))
+        
+        # Compressed exports go out as stored when the client accepts their
+        # codec, and are decompressed on the fly for those that do not
+        download_name = os.path.basename(path)[:-len(CODEC_SUFFIXES[codec])]
+        if accepted_encoding((codec,)):
+            response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=download_name)
+            response.headers['Content-Encoding'] = codec
+        else:
+            def generate():
+                with open_artifact(path, 'rb') as f:
+                    while True:
+                        block = f.read(1024 * 1024)
+                        if not block:
+                            return
+                        yield block
+            
+            response = app.response_class(generate(), mimetype=mimetype)
+            response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        response.vary.add('Accept-Encoding')
+        return response
+    
+    # The process model can always be rendered from the columnar store
+    if kind == "process" and os.path.exists(paths["model"]):
+        return jsonify(process_data_from_model(read_model(paths["model"])))
+    
+    return jsonify({"error": "Export not found"}), 404
+
+# Default and maximum page size of /api/outliers
+OUTLIER_PAGE_SIZE = 1000
+OUTLIER_MAX_PAGE_SIZE = 10000
+
+def encode_cursor(score, outlier_id):
+    return base64.urlsafe_b64encode(json.dumps([score, outlier_id]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    score, outlier_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return float(score), str(outlier_id)
+
+# Build the filtered, keyset-paginated outlier query from request args
+def build_outlier_query(file_id, args):
+    """
+    Returns (sql, params, limit). Raises ValueError for invalid arguments.
+    Rows are ordered by (score, id) so the last row of a page is the
+    cursor of the next one and every page is an index range scan.
+    """
+    where = ["file_id = ?"]
+    params = [file_id]
+    
+    if args.get('is_outlier') is not None:
+        flag = args['is_outlier'].lower()
+        if flag not in ('true', 'false', '1', '0'):
+            raise ValueError("is_outlier must be true or false")
+        where.append("is_outlier = ?")
+        params.append(1 if flag in ('true', '1') else 0)
+    
+    types = [t for t in args.get('type', '').split(',') if t]
+    if types:
+        where.append(f"outlier_type IN ({', '.join('?' * len(types))})")
+        params.extend(types)
+    
+    if args.get('min_score') is not None:
+        where.append("score >= ?")
+        params.append(float(args['min_score']))
+    if args.get('max_score') is not None:
+        where.append("score <= ?")
+        params.append(float(args['max_score']))
+    
+    order = args.get('sort', 'score_desc')
+    if order not in ('score_desc', 'score_asc'):
+        raise ValueError("sort must be score_desc or score_asc")
+    descending = order == 'score_desc'
+    
+    if args.get('cursor'):
+        try:
+            score, outlier_id = decode_cursor(args['cursor'])
+        except Exception:
+            raise ValueError("Invalid cursor")
+        where.append(f"(score, id) {'<' if descending else '>'} (?, ?)")
+        params.extend([score, outlier_id])
+    
+    direction = 'DESC' if descending else 'ASC'
+    sql = (
+        "SELECT id, outlier_type, entity_id, score, is_outlier FROM outlier_results "
+        f"WHERE {' AND '.join(where)} ORDER BY score {direction}, id {direction}"
+    )
+    
+    limit = args.get('limit')
+    if limit is not None:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        limit = min(limit, OUTLIER_MAX_PAGE_SIZE)
+    
+    return sql, params, limit
+
+def outlier_row(row):
+    return {
+        "id": row[0],
+        "type": row[1],
+        "entity_id": row[2],
+        "score": row[3],
+        "is_outlier": bool(row[4])
+    }
+
 # API endpoint to get outliers
 @app.route('/api/outliers/<file_id>', methods=['GET'])
 def get_outliers(file_id):
+    """
+    Query parameters: is_outlier, type (comma separated), min_score,
+    max_score, sort (score_desc|score_asc), limit, cursor and
+    format=ndjson. JSON responses hold one page plus next_cursor; NDJSON
+    streams matching rows one per line, all of them unless limit is set,
+    ending with a {"next_cursor": ...} line when more rows remain.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT id, outlier_type, entity_id, score, is_outlier FROM outlier_results WHERE file_id = ?",
-            (file_id,)
-        )
-        
-        columns = ["id", "type", "entity_id", "score", "is_outlier"]
-        outliers = []
+        sql, params, limit = build_outlier_query(file_id, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    ndjson = request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+    if not ndjson and limit is None:
+        limit = OUTLIER_PAGE_SIZE
+    
+    try:
+        cursor = db.connection().execute(sql + (" LIMIT ?" if limit else ""), params + ([limit + 1] if limit else []))
         
-        for row in cursor.fetchall():
-            outlier = {columns[i]: row[i] for i in range(len(columns))}
-            # Convert is_outlier to boolean
-            outlier["is_outlier"] = bool(outlier["is_outlier"])
-            outliers.append(outlier)
+        if ndjson:
+            def generate():
+                sent = 0
+                last = None
+                while True:
+                    rows = cursor.fetchmany(OUTLIER_PAGE_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        if limit and sent == limit:
+                            yield json.dumps({"next_cursor": encode_cursor(last[3], last[0])}) + "\n"
+                            return
+                        yield json.dumps(outlier_row(row)) + "\n"
+                        last = row
+                        sent += 1
+            
+            return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
         
-        conn.close()
+        rows = cursor.fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][3], rows[limit - 1][0]) if len(rows) > limit else None
+        outliers = [outlier_row(row) for row in rows[:limit]]
         
-        return jsonify({"outliers": outliers})
+        return jsonify({"outliers": outliers, "count": len(outliers), "next_cursor": next_cursor})
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve outliers: {str(e)}"}), 500
 
 # API endpoint to get process metadata
 @app.route('/api/metadata/<file_id>', methods=['GET'])
 def get_metadata(file_id):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
+    def build():
+        row = db.query_one(
             "SELECT filename, total_events, total_cases, start_date, end_date FROM process_metadata WHERE file_id = ?",
             (file_id,)
         )
         
-        row = cursor.fetchone()
-        conn.close()
-        
         if not row:
-            return jsonify({"error": "Metadata not found"}), 404
+            return None
         
-        metadata = {
+        return {
             "filename": row[0],
             "totalEvents": row[1],
             "totalCases": row[2],
             "startDate": row[3],
             "endDate": row[4]
         }
+    
+    try:
+        response = cached_json_response("metadata", file_id, build)
+        if response is None:
+            return jsonify({"error": "Metadata not found"}), 404
         
-        return jsonify(metadata)
+        return response
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve metadata: {str(e)}"}), 500
 
-# API endpoint to get summary statistics
-@app.route('/api/summary/<file_id>', methods=['GET'])
-def get_summary(file_id):
-    process_path = os.path.join(PROCESSED_FOLDER, f"{file_id}_process.json")
+# Naive UTC timestamp of a request arg, as event times are stored
+def utc_timestamp(value):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp
+
+# API endpoint for event counts over time, answered from the rollup tables
+@app.route('/api/timeseries/<file_id>', methods=['GET'])
+def get_timeseries(file_id):
+    """
+    Query parameters: granularity (hour|day|week, default day), start and
+    end (ISO timestamps; buckets starting in [start, end), start rounded
+    down to its bucket) and activity (comma separated) to add per-activity
+    counts. Only buckets with events or case arrivals are returned.
+    """
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
     
-    if not os.path.exists(process_path):
-        return jsonify({"error": "Process data not found"}), 404
+    where = ["file_id = ?", "granularity = ?"]
+    params = [file_id, granularity]
+    try:
+        if request.args.get('start'):
+            millis = utc_timestamp(request.args['start']).value // 10**6
+            where.append("bucket >= ?")
+            params.append(pd.Timestamp(bucket_start(millis, granularity), unit='ms').strftime('%Y-%m-%dT%H:%M:%S'))
+        if request.args.get('end'):
+            where.append("bucket < ?")
+            params.append(utc_timestamp(request.args['end']).strftime('%Y-%m-%dT%H:%M:%S'))
+    except (ValueError, TypeError):
+        return jsonify({"error": "start and end must be ISO timestamps"}), 400
     
     try:
-        with open(process_path, 'r') as f:
-            process_data = json.load(f)
+        if not db.query_one("SELECT 1 FROM process_metadata WHERE file_id = ?", (file_id,)):
+            return jsonify({"error": "Metadata not found"}), 404
         
-        # Extract summary statistics from process data
-        activities = process_data["statistics"]["activities"]
+        clause = " AND ".join(where)
+        rows = db.query(
+            f"SELECT bucket, event_count, case_arrivals FROM event_rollups WHERE {clause} ORDER BY bucket", params)
+        result = {
+            "file_id": file_id,
+            "granularity": granularity,
+            "buckets": [{"bucket": r[0], "events": r[1], "caseArrivals": r[2]} for r in rows]
+        }
+        
+        if request.args.get('activity'):
+            names = [a for a in request.args['activity'].split(',') if a]
+            rows = db.query(
+                f"SELECT activity, bucket, event_count FROM activity_rollups WHERE {clause} "
+                f"AND activity IN ({', '.join('?' * len(names))}) ORDER BY activity, bucket", params + names)
+            result["activities"] = {name: [] for name in names}
+            for activity, bucket, count in rows:
+                result["activities"][activity].append({"bucket": bucket, "events": count})
         
-        summary = {
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve time series: {str(e)}"}), 500
+
+# API endpoint to get summary statistics
+@app.route('/api/summary/<file_id>', methods=['GET'])
+def get_summary(file_id):
+    def build():
+        paths = artifact_paths(file_id)
+        
+        # Only the activity names and counts are mapped in from the model
+        if os.path.exists(paths["model"]):
+            model = read_model(paths["model"], ["activities", "activity_count"])
+            activities = dict(zip(model["activities"].tolist(), model["activity_count"].tolist()))
+        elif os.path.exists(paths["process"]):
+            with open_artifact(paths["process"]) as f:
+                activities = json.load(f)["statistics"]["activities"]
+        else:
+            return None
+        
+        return {
             "activityCount": len(activities),
             "activityFrequency": activities,
             "mostFrequentActivity": max(activities.items(), key=lambda x: x[1])[0] if activities else None,
             "leastFrequentActivity": min(activities.items(), key=lambda x: x[1])[0] if activities else None
         }
+    
+    try:
+        response = cached_json_response("summary", file_id, build)
+        if response is None:
+            return jsonify({"error": "Process data not found"}), 404
         
-        return jsonify(summary)
+        return response
     except Exception as e:
         return jsonify({"error": f"Failed to generate summary: {str(e)}"}), 500
 
+VARIANT_LIMIT = 1000
+
+# API endpoint for the most frequent trace variants
+@app.route('/api/variants/<file_id>', methods=['GET'])
+def get_variants(file_id):
+    """
+    Query parameters: k (number of variants, default 10) and cases (example
+    case ids per variant, default 10). Reads only the top k entries of the
+    variant index built at processing time.
+    """
+    try:
+        k = int(request.args.get('k', 10))
+        cases = int(request.args.get('cases', 10))
+    except ValueError:
+        return jsonify({"error": "k and cases must be integers"}), 400
+    if not 0 < k <= VARIANT_LIMIT or not 0 <= cases <= VARIANT_LIMIT:
+        return jsonify({"error": f"k must be between 1 and {VARIANT_LIMIT}, cases between 0 and {VARIANT_LIMIT}"}), 400
+    
+    paths = artifact_paths(file_id)
+    if not os.path.exists(paths["variants"]):
+        return jsonify({"error": "Variant index not found"}), 404
+    
+    try:
+        index = read_model(paths["variants"])
+        variants = top_variants(index, read_dictionary(paths["events"], "case"), k, cases)
+        return jsonify({
+            "file_id": file_id,
+            "totalCases": int(index["total_cases"]),
+            "totalVariants": len(index["variant_id"]),
+            "variants": variants
+        })
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve variants: {str(e)}"}), 500
+
+# Default and maximum page size of /api/events and /api/objects
+EVENT_PAGE_SIZE = 1000
+EVENT_MAX_PAGE_SIZE = 10000
+
+def parse_page(args):
+    """(cursor, limit) from request args; raises ValueError when invalid"""
+    limit = int(args.get('limit', EVENT_PAGE_SIZE))
+    if not 1 <= limit <= EVENT_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {EVENT_MAX_PAGE_SIZE}")
+    cursor = int(args['cursor']) if args.get('cursor') else None
+    return cursor, limit
+
+def split_arg(args, name):
+    return [v for v in args.get(name, '').split(',') if v] or None
+
+def parse_millis(value):
+    return utc_timestamp(value).value // 10**6 if value else None
+
+# Event filters from request args (see event_db.event_filters)
+def parse_event_filters(args):
+    filters = {
+        "activities": split_arg(args, 'activity'),
+        "objects": split_arg(args, 'object'),
+        "object_types": split_arg(args, 'object_type'),
+        "start": parse_millis(args.get('start')),
+        "end": parse_millis(args.get('end')),
+        "attribute": args.get('attribute') or None,
+        "value": args.get('value'),
+        "min_value": float(args['min_value']) if args.get('min_value') else None,
+        "max_value": float(args['max_value']) if args.get('max_value') else None
+    }
+    if filters["attribute"] is None and any(args.get(k) for k in ('value', 'min_value', 'max_value')):
+        raise ValueError("value, min_value and max_value need an attribute")
+    return filters
+
+# API endpoint to query the events of an upload through its event database
+@app.route('/api/events/<file_id>', methods=['GET'])
+def get_events(file_id):
+    """
+    Query parameters: activity, object and object_type (comma separated),
+    start and end (ISO timestamps, end exclusive), attribute with value
+    (exact match) and/or min_value/max_value (numeric range), limit and
+    cursor (next_cursor of the previous page); count=1 adds the number of
+    matching events. Events are returned in log order.
+    """
+    try:
+        filters = parse_event_filters(request.args)
+        cursor, limit = parse_page(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
+    
+    path = artifact_paths(file_id)["database"]
+    if not os.path.exists(path):
+        return jsonify({"error": "Event database not found"}), 404
+    
+    try:
+        events, next_cursor = query_events(path, filters, cursor, limit)
+        result = {
+            "file_id": file_id,
+            "events": events,
+            "next_cursor": str(next_cursor) if next_cursor is not None else None
+        }
+        if request.args.get('count') == '1':
+            result["total"] = count_events(path, filters)
+        
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": f"Failed to query events: {str(e)}"}), 500
+
+# API endpoint to list the objects of an upload with their event counts
+@app.route('/api/objects/<file_id>', methods=['GET'])
+def get_objects(file_id):
+    try:
+        object_types = split_arg(request.args, 'type')
+        cursor, limit = parse_page(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
+    
+    path = artifact_paths(file_id)["database"]
+    if not os.path.exists(path):
+        return jsonify({"error": "Event database not found"}), 404
+    
+    try:
+        objects, next_cursor = query_objects(path, object_types, cursor, limit)
+        return jsonify({
+            "file_id": file_id,
+            "objects": objects,
+            "next_cursor": str(next_cursor) if next_cursor is not None else None
+        })
+    except Exception as e:
+        return jsonify({"error": f"Failed to query objects: {str(e)}"}), 500
+
+# Sub-log filters from request args (see BitmapIndex.filter)
+def parse_subset_filters(args):
+    filters = {
+        "activities": split_arg(args, 'activity'),
+        "object_types": split_arg(args, 'object_type'),
+        "start": parse_millis(args.get('start')),
+        "end": parse_millis(args.get('end')),
+        "attribute": args.get('attribute') or None,
+        "values": split_arg(args, 'value')
+    }
+    if (filters["attribute"] is None) != (filters["values"] is None):
+        raise ValueError("attribute and value go together")
+    return filters
+
+# API endpoint to discover the process model of a filtered sub-log
+@app.route('/api/filter/<file_id>', methods=['GET'])
+def filter_process_model(file_id):
+    """
+    Query parameters: activity and object_type (comma separated), start
+    and end (ISO timestamps, end exclusive), attribute with value (comma
+    separated; keeps the cases with an event holding one of the values).
+    Values of one parameter are ORed, parameters are ANDed; level or
+    coverage simplify the result as on /api/process. The events are
+    selected through the bitmap index built while processing and the
+    directly-follows model is discovered over them alone; responses are
+    cached per filter until the log changes.
+    """
+    try:
+        filters = parse_subset_filters(request.args)
+        level, coverage = parse_level(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query: {str(e)}"}), 400
+    
+    paths = artifact_paths(file_id)
+    if not os.path.exists(paths["bitmaps"]):
+        return jsonify({"error": "No bitmap index for this log (approximate mode or processed before "
+                                 "filters were supported)"}), 404
+    
+    def build():
+        index = BitmapIndex(paths["bitmaps"])
+        columns = read_events(paths["events"], ("case", "activity", "time"))
+        mask = index.filter(case=columns["case"], **filters)
+        case, time = np.asarray(columns["case"])[mask], np.asarray(columns["time"])[mask]
+        order, starts = case_traces(case, time)
+        model = discover_codes(order, starts, np.asarray(columns["activity"])[mask], time,
+                               read_dictionary(paths["events"], "activity").tolist())
+        result = render_model(model, level, coverage)
+        result.update({"file_id": file_id, "logEvents": index.rows})
+        return result
+    
+    try:
+        signature = json.dumps([filters, level, coverage], sort_keys=True)
+        response = cached_json_response(f"filter:{signature}", file_id, build)
+        if response is None:
+            return jsonify({"error": "Process model not found"}), 404
+        
+        return response
+    except KeyError as e:
+        return jsonify({"error": f"Attribute {e} is not indexed"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to filter process model: {str(e)}"}), 500
+
+# API endpoint to list the values the sub-log filters can select
+@app.route('/api/filter/<file_id>/values', methods=['GET'])
+def get_filter_values(file_id):
+    path = artifact_paths(file_id)["bitmaps"]
+    if not os.path.exists(path):
+        return jsonify({"error": "No bitmap index for this log"}), 404
+    
+    try:
+        index = BitmapIndex(path)
+        return jsonify({
+            "file_id": file_id,
+            "activity": index.values("activity"),
+            "object_type": index.values("object_type"),
+            "attributes": {name: index.values(dimension) for name, dimension in index.attributes.items()}
+        })
+    except Exception as e:
+        return jsonify({"error": f"Failed to read filter values: {str(e)}"}), 500
+
+# API endpoint to inspect the response cache
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+# API endpoint to get the recorded stage measurements of an upload, per run
+@app.route('/api/stats/<file_id>', methods=['GET'])
+def get_pipeline_stats(file_id):
+    try:
+        rows = db.query(
+            "SELECT run, operation, stage, status, started_at, wall_seconds, cpu_seconds, peak_rss_bytes, rows "
+            "FROM pipeline_stats WHERE file_id = ? ORDER BY run, id",
+            (file_id,)
+        )
+        if not rows:
+            return jsonify({"error": "No pipeline statistics found"}), 404
+        
+        runs = {}
+        for run, operation, stage, status, started_at, wall, cpu, peak, count in rows:
+            entry = runs.setdefault(run, {"submittedAt": run, "operation": operation, "stages": []})
+            # Steps ("<stage>.<step>") are listed under the stage they belong to
+            name, _, step = stage.partition('.')
+            if step:
+                entry["stages"][-1].setdefault("steps", {})[step] = wall
+                continue
+            entry["stages"].append({
+                "name": name,
+                "status": status,
+                "startedAt": started_at,
+                "seconds": wall,
+                "cpuSeconds": cpu,
+                "peakRssBytes": peak,
+                "rows": count
+            })
+        
+        return jsonify({"file_id": file_id, "runs": list(runs.values())})
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve pipeline statistics: {str(e)}"}), 500
+
+# Prometheus metric families: name, type, help
+PIPELINE_METRICS = [
+    ("pipeline_stage_seconds", "summary", "Wall time of pipeline stages"),
+    ("pipeline_stage_cpu_seconds_total", "counter", "CPU time of pipeline stages, including child processes"),
+    ("pipeline_stage_rows_total", "counter", "Rows handled by pipeline stages"),
+    ("pipeline_stage_peak_rss_bytes", "gauge", "Highest peak RSS seen for a pipeline stage"),
+    ("pipeline_step_seconds_total", "counter", "Wall time of the steps inside pipeline stages"),
+    ("pipeline_runs_total", "counter", "Pipeline runs by outcome"),
+    ("response_cache", "gauge", "Response cache counters")
+]
+
+def prometheus_labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+# API endpoint exposing pipeline and cache measurements to Prometheus
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    samples = {name: [] for name, _, _ in PIPELINE_METRICS}
+    
+    rows = db.query(
+        "SELECT operation, stage, status, COUNT(*), SUM(wall_seconds), SUM(cpu_seconds), SUM(rows), "
+        "MAX(peak_rss_bytes) FROM pipeline_stats GROUP BY operation, stage, status"
+    )
+    for operation, stage, status, count, wall, cpu, total_rows, peak in rows:
+        if '.' in stage:
+            name, _, step = stage.partition('.')
+            samples["pipeline_step_seconds_total"].append(
+                (prometheus_labels(operation=operation, stage=name, step=step, status=status), wall))
+            continue
+        labels = prometheus_labels(operation=operation, stage=stage, status=status)
+        samples["pipeline_stage_seconds"].append(("_count" + labels, count))
+        samples["pipeline_stage_seconds"].append(("_sum" + labels, wall))
+        samples["pipeline_stage_cpu_seconds_total"].append((labels, cpu or 0))
+        samples["pipeline_stage_rows_total"].append((labels, total_rows or 0))
+        if peak is not None:
+            samples["pipeline_stage_peak_rss_bytes"].append((labels, peak))
+    
+    # A run failed when any of its stages did
+    runs = db.query(
+        "SELECT operation, MAX(status = 'failed'), COUNT(*) FROM "
+        "(SELECT file_id, run, operation, status FROM pipeline_stats WHERE stage NOT LIKE '%.%') "
+        "GROUP BY file_id, run, operation"
+    )
+    outcomes = {}
+    for operation, failed, _ in runs:
+        key = (operation, "failed" if failed else "completed")
+        outcomes[key] = outcomes.get(key, 0) + 1
+    for (operation, status), count in sorted(outcomes.items()):
+        samples["pipeline_runs_total"].append((prometheus_labels(operation=operation, status=status), count))
+    
+    for key, value in response_cache.stats().items():
+        samples["response_cache"].append((prometheus_labels(stat=key), value))
+    
+    lines = []
+    for name, kind, help_text in PIPELINE_METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        # Samples are (suffix, value); summaries put _count/_sum before the labels
+        lines.extend(f"{name}{suffix} {value}" for suffix, value in samples[name])
+    
+    return app.response_class("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,106 @@
+import numpy as np
+
+# Rollup granularities and their bucket width in milliseconds. Weeks start
+# on Monday; the Unix epoch was a Thursday, three days into its week.
+GRANULARITIES = {
+    "hour": 3600 * 1000,
+    "day": 24 * 3600 * 1000,
+    "week": 7 * 24 * 3600 * 1000
+}
+_WEEK_SHIFT = 3 * 24 * 3600 * 1000
+
+
+def _millis(time):
+    time = np.asarray(time).astype("datetime64[ms]")
+    return time[~np.isnat(time)].astype("int64"), ~np.isnat(time)
+
+
+def bucket_start(millis, granularity):
+    width = GRANULARITIES[granularity]
+    shift = _WEEK_SHIFT if granularity == "week" else 0
+    return (millis + shift) // width * width - shift
+
+
+def bucket_label(starts):
+    """ISO labels of bucket starts; they sort the same way as the times"""
+    return np.datetime_as_string(np.asarray(starts, dtype="int64").astype("datetime64[ms]"), unit="s").tolist()
+
+
+def time_bounds(time):
+    """Earliest and latest timestamp as ISO strings (None without any)"""
+    millis, _ = _millis(time)
+    if len(millis) == 0:
+        return None, None
+    first, last = bucket_label([millis.min(), millis.max()])
+    return first, last
+
+
+def rollup_rows(time, activity, activity_names, arrivals):
+    """
+    Event counts, case arrivals and per-activity event counts per bucket of
+    every granularity. time and activity (codes into activity_names) are
+    per event; arrivals holds the first timestamp of every new case.
+    Events without a timestamp are left out.
+    Returns rows (granularity, bucket, events, case_arrivals) and
+    (granularity, bucket, activity, events).
+    """
+    millis, timed = _millis(time)
+    activity = np.asarray(activity)[timed].astype("int64")
+    arrival_millis, _ = _millis(arrivals)
+    width = len(activity_names)
+
+    totals, activities = [], []
+    for granularity in GRANULARITIES:
+        events = bucket_start(millis, granularity)
+        buckets, event_counts = np.unique(events, return_counts=True)
+        arrived, arrival_counts = np.unique(bucket_start(arrival_millis, granularity), return_counts=True)
+        everything = np.union1d(buckets, arrived)
+        event_total = np.zeros(len(everything), dtype="int64")
+        event_total[np.searchsorted(everything, buckets)] = event_counts
+        arrival_total = np.zeros(len(everything), dtype="int64")
+        arrival_total[np.searchsorted(everything, arrived)] = arrival_counts
+        totals.extend(zip([granularity] * len(everything), bucket_label(everything),
+                          event_total.tolist(), arrival_total.tolist()))
+
+        keys, key_counts = np.unique(np.searchsorted(buckets, events) * width + activity, return_counts=True)
+        labels = np.array(bucket_label(buckets), dtype=object)
+        activities.extend(zip([granularity] * len(keys), labels[keys // width].tolist(),
+                              np.asarray(activity_names, dtype=object)[keys % width].tolist(),
+                              key_counts.tolist()))
+    return totals, activities
+
+
+class RollupFold:
+    """
+    Rollup rows of a log read in chunks, summed per (granularity, bucket)
+    and (granularity, bucket, activity) as each chunk arrives, so they grow
+    with the buckets and activities of the log rather than with the number
+    of chunks. Also keeps the earliest and latest timestamp.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.activities = {}
+        self.start_date = None
+        self.end_date = None
+
+    def add(self, time, activity, activity_names, arrivals):
+        """Fold in a chunk (arguments as for rollup_rows)"""
+        totals, activities = rollup_rows(time, activity, activity_names, arrivals)
+        for granularity, bucket, events, arrived in totals:
+            counts = self.totals.get((granularity, bucket), (0, 0))
+            self.totals[(granularity, bucket)] = (counts[0] + events, counts[1] + arrived)
+        for granularity, bucket, name, events in activities:
+            key = (granularity, bucket, name)
+            self.activities[key] = self.activities.get(key, 0) + events
+
+        # ISO timestamps compare like the times they encode
+        first, last = time_bounds(time)
+        if first is not None:
+            self.start_date = first if self.start_date is None else min(self.start_date, first)
+            self.end_date = last if self.end_date is None else max(self.end_date, last)
+
+    def rows(self):
+        """The (totals, activities) rows of rollup_rows for everything folded in"""
+        return ([key + counts for key, counts in self.totals.items()],
+                [key + (events,) for key, events in self.activities.items()])
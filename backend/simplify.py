@@ -0,0 +1,137 @@
+import numpy as np
+
+# Simplification ladder: level i keeps the most frequent activities that
+# cover LADDER[i][0] of all events, at most LADDER[i][1] of them, and the
+# strongest edges between those covering the same share of their volume.
+# Level 0 is the complete model.
+LADDER = [
+    (1.0, None),
+    (0.99, 200),
+    (0.95, 100),
+    (0.9, 60),
+    (0.8, 40),
+    (0.6, 25),
+    (0.4, 12)
+]
+
+# Edges kept per kept activity, at most, on capped levels
+EDGES_PER_ACTIVITY = 2
+
+# Per-activity and per-edge arrays of a columnar model (see
+# DiscoveryState.to_model); every other "edge_" array is per edge as well
+ACTIVITY_ARRAYS = ("activities", "activity_count", "start_count", "end_count")
+
+
+def _prefix(counts, coverage):
+    """Length of the shortest prefix of counts (sorted descending) covering coverage of their sum"""
+    total = counts.sum()
+    if total == 0 or coverage >= 1.0:
+        return len(counts)
+    return int(np.searchsorted(np.cumsum(counts), coverage * total - 1e-9)) + 1
+
+
+def _strongest(keys, candidates):
+    """Positions (among candidates, sorted by count) of the strongest edge per key"""
+    _, first = np.unique(keys[candidates], return_index=True)
+    return candidates[first]
+
+
+def simplification_ladder(model):
+    """
+    Which activities and edges every level of LADDER keeps, as boolean
+    arrays ladder_activities (levels x activities) and ladder_edges
+    (levels x edges), with ladder_coverage and ladder_max_activities.
+    Activities and edges of the model are ranked by frequency already.
+    Every kept activity keeps its strongest incoming and outgoing edge
+    between kept activities, so pruning leaves no node without a path.
+    """
+    counts = np.asarray(model["activity_count"])
+    source = np.asarray(model["edge_source"])
+    target = np.asarray(model["edge_target"])
+    edge_count = np.asarray(model["edge_count"])
+
+    activities = np.zeros((len(LADDER), len(counts)), dtype=bool)
+    edges = np.zeros((len(LADDER), len(edge_count)), dtype=bool)
+    for level, (coverage, cap) in enumerate(LADDER):
+        kept = _prefix(counts, coverage)
+        if cap is not None:
+            kept = min(kept, cap)
+        activities[level, :kept] = True
+
+        # Ranked activities are kept as a prefix, so positions tell
+        candidates = np.flatnonzero((source < kept) & (target < kept))
+        strongest = _prefix(edge_count[candidates], coverage)
+        if cap is not None:
+            strongest = min(strongest, EDGES_PER_ACTIVITY * cap)
+        edges[level, candidates[:strongest]] = True
+        edges[level, _strongest(target, candidates)] = True
+        edges[level, _strongest(source, candidates)] = True
+
+    return {
+        "ladder_coverage": np.array([coverage for coverage, _ in LADDER], dtype="float64"),
+        "ladder_max_activities": np.array([-1 if cap is None else cap for _, cap in LADDER], dtype="int64"),
+        "ladder_activities": activities,
+        "ladder_edges": edges
+    }
+
+
+def ladder_level(levels, coverage):
+    """
+    The simplest level of a ladder_summary whose measured eventCoverage is
+    at least coverage; the activity caps can leave a level well below the
+    coverage it targets, so LADDER alone cannot tell
+    """
+    meets = [entry["level"] for entry in levels if entry["eventCoverage"] >= coverage - 1e-9]
+    return max(meets, default=0)
+
+
+def model_ladder(model):
+    """The ladder stored with a model, or computed for models written without it"""
+    if len(model.get("ladder_coverage", ())) == len(LADDER):
+        return model
+    return simplification_ladder(model)
+
+
+def ladder_summary(model, ladder):
+    """Coverage and size of every level, to pick one to render"""
+    counts = np.asarray(model["activity_count"])
+    edge_count = np.asarray(model["edge_count"])
+    levels = []
+    for level, coverage in enumerate(np.asarray(ladder["ladder_coverage"]).tolist()):
+        activities = np.asarray(ladder["ladder_activities"][level])
+        edges = np.asarray(ladder["ladder_edges"][level])
+        levels.append({
+            "level": level,
+            "coverage": coverage,
+            "activities": int(activities.sum()),
+            "edges": int(edges.sum()),
+            "eventCoverage": float(counts[activities].sum() / counts.sum()) if counts.sum() else 1.0,
+            "edgeCoverage": float(edge_count[edges].sum() / edge_count.sum()) if edge_count.sum() else 1.0
+        })
+    return levels
+
+
+def simplified_model(model, ladder, level):
+    """
+    The model reduced to the activities and edges kept at level. Kept
+    activities remember their position in the full model (activity_ids),
+    so node ids stay the same across levels; scalars pass through.
+    """
+    activities = np.asarray(ladder["ladder_activities"][level])
+    edges = np.asarray(ladder["ladder_edges"][level])
+    position = np.cumsum(activities) - 1
+
+    result = {}
+    for name, array in model.items():
+        if name.startswith("ladder_") or name.startswith("last_"):
+            continue
+        if name in ACTIVITY_ARRAYS:
+            result[name] = np.asarray(array)[activities]
+        elif name.startswith("edge_"):
+            result[name] = np.asarray(array)[edges]
+        else:
+            result[name] = array
+    result["edge_source"] = position[result["edge_source"]].astype("int32")
+    result["edge_target"] = position[result["edge_target"]].astype("int32")
+    result["activity_ids"] = np.flatnonzero(activities)
+    return result
@@ -0,0 +1,105 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+# How long a connection waits on a lock held by another process
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+
+
+class Database:
+    """
+    SQLite access for results.db.
+
+    Reads use one pooled connection per thread. All writes in a process go
+    through a single writer thread that runs each submitted unit of work in
+    its own transaction, so concurrent requests never race each other for
+    the write lock; WAL journaling lets readers proceed while it writes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._queue = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    def connection(self):
+        """
+        Pooled connection of the calling thread (reopened after a fork)
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def _writer(self, jobs):
+        conn = self._open()
+        while True:
+            work, future = jobs.get()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = work(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                future.set_result(result)
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _jobs(self):
+        with self._lock:
+            if self._queue is None or self._writer_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._writer_pid = os.getpid()
+                thread = threading.Thread(target=self._writer, args=(self._queue,), daemon=True)
+                thread.start()
+            return self._queue
+
+    def write(self, work):
+        """
+        Run work(conn) in a single transaction on the writer thread and
+        return its result
+        """
+        future = Future()
+        self._jobs().put((work, future))
+        return future.result()
+
+    def execute(self, sql, params=()):
+        return self.write(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql, rows):
+        """
+        Bulk insert/update all rows in one transaction
+        """
+        return self.write(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    def executescript(self, script):
+        """
+        Run DDL statements; executescript manages its own transaction so it
+        bypasses the writer thread
+        """
+        conn = self._open()
+        try:
+            conn.executescript(script)
+        finally:
+            conn.close()
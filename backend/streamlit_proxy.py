@@ -12,6 +12,8 @@ import uuid
 import pandas as pd
 import numpy as np
 from werkzeug.utils import secure_filename
+from uploads import MultipartUpload, UploadError, UploadStream
+from compression import available, codec_of
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -33,7 +35,7 @@ processing_tasks = {}
 streamlit_bp = Blueprint('streamlit', __name__, url_prefix='/api/streamlit')
 
 class StreamlitProcessingTask:
-    def __init__(self, request_id, request_type, content):
+    def __init__(self, request_id, request_type, content, csv_data=None):
         self.request_id = request_id
         self.request_type = request_type  # 'prompt' or 'file'
         self.content = content
@@ -44,7 +46,7 @@ class StreamlitProcessingTask:
         self.error = None
         self.thread = None
         self.cancelled = False
-        self.csv_data = None
+        self.csv_data = csv_data
     
     def start(self):
         self.thread = threading.Thread(target=self.process)
@@ -62,18 +64,8 @@ class StreamlitProcessingTask:
                 self.estimated_completion_time = self.start_time + (3 * 60)
             else:
                 # File uploads typically take 10-15 minutes
+                # (the CSV itself was already parsed during the upload)
                 self.estimated_completion_time = self.start_time + (10 * 60)
-                
-                # For file uploads, try to read the CSV data
-                if self.request_type == 'file':
-                    try:
-                        file_path = os.path.join(CACHE_DIR, f"{self.request_id}_{self.content}")
-                        if os.path.exists(file_path):
-                            self.csv_data = pd.read_csv(file_path)
-                            logger.info(f"Successfully read CSV with {len(self.csv_data)} rows, {len(self.csv_data.columns)} columns")
-                    except Exception as e:
-                        logger.error(f"Error reading CSV file: {str(e)}")
-                        # Continue anyway, we'll use mock data
             
             # Save initial state
             self.save_state()
@@ -316,32 +308,54 @@ def submit_prompt():
 @streamlit_bp.route('/upload', methods=['POST'])
 def upload_file():
     try:
-        if 'file' not in request.files:
-            return jsonify({"error": "No file part"}), 400
-        
-        file = request.files['file']
+        try:
+            upload = MultipartUpload(request.stream, request.content_type)
+        except UploadError as e:
+            return jsonify({"error": str(e)}), 400
         
-        if file.filename == '':
+        if upload.filename == '':
             return jsonify({"error": "No file selected"}), 400
         
-        if file:
-            filename = secure_filename(file.filename)
-            request_id = f"file-{int(time.time())}-{uuid.uuid4().hex[:8]}"
-            
-            # Save file to cache directory
-            file_path = os.path.join(CACHE_DIR, f"{request_id}_{filename}")
-            file.save(file_path)
-            
-            # Create and start processing task
-            task = StreamlitProcessingTask(request_id, 'file', filename)
-            processing_tasks[request_id] = task
-            task.start()
-            
-            return jsonify({
-                "requestId": request_id,
-                "status": "processing",
-                "estimatedTimeRemaining": 600  # 10 minutes
-            })
+        codec = codec_of(upload.filename)
+        if codec and not available(codec):
+            return jsonify({"error": f"{codec} uploads need the zstandard package on the server"}), 400
+        
+        filename = secure_filename(upload.filename)
+        request_id = f"file-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        
+        # Parse the CSV as it arrives (decompressing .gz/.zst uploads) while
+        # saving it to the cache directory, instead of saving it first and
+        # reading it back in the task
+        file_path = os.path.join(CACHE_DIR, f"{request_id}_{filename}")
+        csv_data = None
+        try:
+            with UploadStream(upload.chunks(), file_path, codec) as source:
+                try:
+                    csv_data = pd.read_csv(source.reader())
+                    logger.info(f"Successfully read CSV with {len(csv_data)} rows, {len(csv_data.columns)} columns")
+                except UploadError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error reading CSV file: {str(e)}")
+                    # Continue anyway, we'll use mock data
+                source.drain()
+        except UploadError as e:
+            # A broken upload is the client's error, as on /api/upload
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return jsonify({"error": str(e)}), 400
+        logger.info(f"Received {source.size} bytes, {source.rows} rows")
+        
+        # Create and start processing task
+        task = StreamlitProcessingTask(request_id, 'file', filename, csv_data)
+        processing_tasks[request_id] = task
+        task.start()
+        
+        return jsonify({
+            "requestId": request_id,
+            "status": "processing",
+            "estimatedTimeRemaining": 600  # 10 minutes
+        })
     
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}")
@@ -0,0 +1,57 @@
+import io
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import process_mining_api as api  # noqa: E402
+from cache import ResponseCache  # noqa: E402
+from storage import Database  # noqa: E402
+
+HEADER = b"case_id,activity,timestamp,object_type,resource\n"
+
+
+def make_log(cases=120, seed=0, start="2023-01-01"):
+    """CSV rows (without header) of a small log with loops, rework and a few odd cases, in time order"""
+    rng = np.random.default_rng(seed)
+    base = np.datetime64(start, "s")
+    rows = []
+    for case in range(cases):
+        trace = ["Register", "Check"]
+        while rng.random() < 0.3:
+            trace += ["Rework", "Check"]
+        trace += ["Approve" if rng.random() < 0.8 else "Reject", "Close"]
+        if case % 37 == 5:
+            trace = ["Close"] + trace * 4
+        time = base + int(rng.integers(0, 30 * 86400))
+        for activity in trace:
+            time = time + int(rng.integers(60, 86400))
+            rows.append((time, f"{case},{activity},{time},{'order' if case % 3 else 'item'},"
+                               f"user{rng.integers(0, 8)}\n".encode()))
+    rows.sort(key=lambda row: row[0])
+    return [line for _, line in rows]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client of the API with its folders, database and response cache in tmp_path"""
+    for name in ("uploads", "processed"):
+        (tmp_path / name).mkdir()
+    monkeypatch.setattr(api, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setattr(api, "PROCESSED_FOLDER", str(tmp_path / "processed"))
+    monkeypatch.setattr(api, "db", Database(str(tmp_path / "results.db")))
+    monkeypatch.setattr(api, "response_cache", ResponseCache(api.RESPONSE_CACHE_BYTES))
+    api.init_db()
+    return api.app.test_client()
+
+
+def upload(client, data, query="sync=1", filename="log.csv"):
+    return client.post(f"/api/upload?{query}", data={"file": (io.BytesIO(data), filename)},
+                       content_type="multipart/form-data")
+
+
+def append(client, file_id, data, filename="more.csv"):
+    return client.post(f"/api/append/{file_id}?sync=1", data={"file": (io.BytesIO(data), filename)},
+                       content_type="multipart/form-data")
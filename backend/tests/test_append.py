@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+import sqlite3
+import numpy as np
+import pytest
+import process_mining_api as api
+from compression import open_artifact
+from conftest import HEADER, append, make_log, upload
+
+
+def process_model(client, file_id):
+    return client.get(f"/api/process/{file_id}").get_json()
+
+
+def write_csv(data):
+    path = os.path.join(api.UPLOAD_FOLDER, "append.csv")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def bitmap_files(file_id):
+    path = api.artifact_paths(file_id)["bitmaps"]
+    return {os.path.basename(name): np.load(name).tobytes() for name in glob.glob(os.path.join(path, "*.npy"))}
+
+
+def ocel_events(file_id):
+    with open_artifact(api.artifact_paths(file_id)["ocel"]) as f:
+        return json.load(f)["ocel:events"]
+
+
+def database_events(file_id):
+    with sqlite3.connect(api.artifact_paths(file_id)["database"]) as conn:
+        return conn.execute("SELECT COUNT(*), COUNT(DISTINCT event_id) FROM event").fetchone()
+
+
+@pytest.fixture(params=["", ".gz"], ids=["plain", "gzip"])
+def exports(request, monkeypatch):
+    """OCEL/process exports written uncompressed and compressed"""
+    monkeypatch.setattr(api, "ARTIFACT_COMPRESSION", "gzip" if request.param else "none")
+    monkeypatch.setattr(api, "ARTIFACT_SUFFIX", request.param)
+
+
+def assert_same_log(client, file_id, full):
+    assert process_model(client, file_id) == process_model(client, full)
+    assert bitmap_files(file_id) == bitmap_files(full)
+    assert ocel_events(file_id) == ocel_events(full)
+    assert database_events(file_id) == database_events(full)
+    metadata = client.get(f"/api/metadata/{file_id}").get_json()
+    expected = client.get(f"/api/metadata/{full}").get_json()
+    metadata.pop("filename"), expected.pop("filename")
+    assert metadata == expected
+
+
+def test_append_matches_full_upload(client, exports):
+    rows = make_log()
+    parts = [rows[:150], rows[150:400], rows[400:]]
+    file_id = upload(client, HEADER + b"".join(parts[0])).get_json()["file_id"]
+    for part in parts[1:]:
+        response = append(client, file_id, HEADER + b"".join(part))
+        assert response.status_code == 200, response.get_json()
+    full = upload(client, HEADER + b"".join(rows)).get_json()["file_id"]
+
+    assert_same_log(client, file_id, full)
+    for endpoint in ("variants/{}?k=50", "outliers/{}?limit=1000", "filter/{}?activity=Rework",
+                     "timeseries/{}?activity=Check"):
+        appended = client.get("/api/" + endpoint.format(file_id)).get_json()
+        expected = client.get("/api/" + endpoint.format(full)).get_json()
+        appended.pop("file_id", None), expected.pop("file_id", None)
+        if "outliers" in expected:
+            # Rows of equal score are ordered by their (random) ids
+            for result in (appended, expected):
+                for row in result["outliers"]:
+                    row.pop("id"), row.pop("file_id", None)
+                result["outliers"].sort(key=lambda row: (-row["score"], row["type"], row["entity_id"]))
+        assert appended == expected, endpoint
+
+
+def test_unparseable_chunk_changes_nothing(client, exports, monkeypatch):
+    monkeypatch.setattr(api, "STREAM_CHUNK_ROWS", 50)
+    rows = make_log()
+    file_id = upload(client, HEADER + b"".join(rows[:150])).get_json()["file_id"]
+    before = process_model(client, file_id), bitmap_files(file_id), ocel_events(file_id), database_events(file_id)
+
+    # The third chunk has a row with too many fields
+    broken = rows[150:270] + [b"1,A,2023-01-01,order,u,extra,fields\n"] + rows[270:300]
+    assert append(client, file_id, HEADER + b"".join(broken)).status_code == 500
+    assert (process_model(client, file_id), bitmap_files(file_id), ocel_events(file_id),
+            database_events(file_id)) == before
+
+
+def test_interrupted_publish_is_rolled_back(client, exports, monkeypatch):
+    rows = make_log()
+    file_id = upload(client, HEADER + b"".join(rows[:150])).get_json()["file_id"]
+
+    # Everything but the model is published when the append fails
+    def fail(*args):
+        raise OSError("disk full")
+    with monkeypatch.context() as m:
+        m.setattr(api, "write_process_model", fail)
+        assert append(client, file_id, HEADER + b"".join(rows[150:])).status_code == 500
+
+    # A retry is not counted twice
+    assert append(client, file_id, HEADER + b"".join(rows[150:])).status_code == 200
+    assert_same_log(client, file_id, upload(client, HEADER + b"".join(rows)).get_json()["file_id"])
+
+
+def test_append_after_a_dead_job_recovers_from_the_journal(client, exports, monkeypatch):
+    rows = make_log()
+    file_id = upload(client, HEADER + b"".join(rows[:150])).get_json()["file_id"]
+
+    # The process dies after publishing everything but the model: no
+    # except clause runs, only the journal is left
+    def die(*args):
+        raise SystemExit
+    with monkeypatch.context() as m, pytest.raises(SystemExit):
+        m.setattr(api, "write_process_model", die)
+        api.process_append(file_id, write_csv(HEADER + b"".join(rows[150:300])))
+    # As the pool does when a worker dies
+    api.JobTracker(api.artifact_paths(file_id)["job"]).fail("worker died")
+    assert os.path.exists(api.append_journal_paths(file_id)[0])
+
+    assert append(client, file_id, HEADER + b"".join(rows[150:300])).status_code == 200
+    assert append(client, file_id, HEADER + b"".join(rows[300:])).status_code == 200
+    assert not os.path.exists(api.append_journal_paths(file_id)[0])
+    assert_same_log(client, file_id, upload(client, HEADER + b"".join(rows)).get_json()["file_id"])
+
+
+def test_failed_outlier_scoring_fails_the_append(client, monkeypatch):
+    file_id = upload(client, HEADER + b"".join(make_log(20))).get_json()["file_id"]
+
+    def fail(*args):
+        raise ValueError("scoring failed")
+    monkeypatch.setattr(api, "case_outliers", fail)
+    response = append(client, file_id, HEADER + b"".join(make_log(5, seed=1, start="2023-03-01")))
+    assert response.status_code == 500 and response.get_json()["error"] == "scoring failed"
+    assert client.get(f"/api/jobs/{file_id}").get_json()["status"] == "failed"
@@ -0,0 +1,34 @@
+import numpy as np
+import process_mining_api as api
+from conftest import HEADER, make_log, upload
+from rollups import RollupFold, rollup_rows
+
+
+def test_rollup_fold_sums_chunks_per_bucket():
+    rng = np.random.default_rng(0)
+    time = np.sort(np.datetime64("2023-01-01", "ms") + rng.integers(0, 20 * 86400000, 5000))
+    activity = rng.integers(0, 4, 5000)
+    names = ["a", "b", "c", "d"]
+    fold = RollupFold()
+    for chunk in np.array_split(np.arange(5000), 37):
+        fold.add(time[chunk], activity[chunk], names, time[chunk][:3])
+
+    totals, activities = fold.rows()
+    expected_totals, expected_activities = rollup_rows(time, activity, names, np.concatenate(
+        [time[chunk][:3] for chunk in np.array_split(np.arange(5000), 37)]))
+    assert sorted(totals) == sorted(expected_totals)
+    assert sorted(activities) == sorted(expected_activities)
+    assert (fold.start_date, fold.end_date) == tuple(np.datetime_as_string(time[[0, -1]], unit="s"))
+
+
+def test_approximate_rollups_match_batch(client, monkeypatch):
+    monkeypatch.setattr(api, "STREAM_CHUNK_ROWS", 50)
+    data = HEADER + b"".join(make_log())
+    batch = upload(client, data, "sync=1&mode=batch").get_json()["file_id"]
+    approx = upload(client, data, "sync=1&mode=approx").get_json()["file_id"]
+
+    for query in ("granularity=hour", "granularity=day", "granularity=week&activity=Check"):
+        assert (client.get(f"/api/timeseries/{approx}?{query}").get_json()["buckets"] ==
+                client.get(f"/api/timeseries/{batch}?{query}").get_json()["buckets"])
+    expected, metadata = (client.get(f"/api/metadata/{file_id}").get_json() for file_id in (batch, approx))
+    assert (metadata["startDate"], metadata["endDate"]) == (expected["startDate"], expected["endDate"])
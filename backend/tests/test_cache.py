@@ -0,0 +1,45 @@
+import gzip
+import json
+import pytest
+import process_mining_api as api
+from conftest import HEADER, append, make_log, upload
+
+
+@pytest.fixture
+def file_id(client):
+    return upload(client, HEADER + b"".join(make_log())).get_json()["file_id"]
+
+
+@pytest.mark.parametrize("endpoint", ["process", "summary", "metadata"])
+def test_unchanged_responses_revalidate_with_304(client, file_id, endpoint):
+    first = client.get(f"/api/{endpoint}/{file_id}")
+    assert first.status_code == 200 and first.headers["ETag"]
+
+    again = client.get(f"/api/{endpoint}/{file_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
+    assert client.get(f"/api/{endpoint}/{file_id}", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_compressed_responses_have_their_own_etag(client, file_id):
+    plain = client.get(f"/api/process/{file_id}")
+    packed = client.get(f"/api/process/{file_id}", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(packed.data)) == plain.get_json()
+    assert packed.headers["ETag"] != plain.headers["ETag"]
+    revalidated = client.get(f"/api/process/{file_id}",
+                             headers={"Accept-Encoding": "gzip", "If-None-Match": packed.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_cached_responses_follow_later_stages_and_appends(client, file_id):
+    assert client.get(f"/api/metadata/{file_id}").get_json()["totalEvents"] == len(make_log())
+    etag = client.get(f"/api/metadata/{file_id}").headers["ETag"]
+
+    # A later stage rewrites the metadata row and then records itself in the job state
+    api.db.execute("UPDATE process_metadata SET total_events = 1 WHERE file_id = ?", (file_id,))
+    api.JobTracker(api.artifact_paths(file_id)["job"]).save()
+    response = client.get(f"/api/metadata/{file_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.get_json()["totalEvents"] == 1
+
+    appended = append(client, file_id, HEADER + b"".join(make_log(3, seed=1, start="2023-03-01"))).get_json()
+    assert client.get(f"/api/metadata/{file_id}").get_json()["totalEvents"] == appended["metrics"]["totalEvents"]
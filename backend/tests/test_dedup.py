@@ -0,0 +1,29 @@
+import os
+import uuid
+import process_mining_api as api
+from conftest import HEADER, make_log, upload
+
+
+def test_identical_content_is_deduplicated(client):
+    data = HEADER + b"".join(make_log())
+    file_id = upload(client, data).get_json()["file_id"]
+
+    duplicate = str(uuid.uuid4())
+    response = upload(client, data, f"sync=1&file_id={duplicate}", filename="again.csv").get_json()
+    assert response["file_id"] == file_id
+    assert response["deduplicated"] is True
+    assert response["metrics"]["totalEvents"] == len(make_log())
+    # Nothing of the dropped upload is left behind
+    assert not [name for name in os.listdir(api.PROCESSED_FOLDER) if name.startswith(duplicate)]
+
+    # Approximate results never stand in for exact ones
+    approx = upload(client, data, "sync=1&mode=approx").get_json()
+    assert approx["file_id"] != file_id and not approx.get("deduplicated")
+
+
+def test_removed_artifacts_include_the_lock_file(client):
+    file_id = upload(client, HEADER + b"".join(make_log(10))).get_json()["file_id"]
+    with api.artifact_lock(file_id):
+        pass
+    api.remove_artifacts(file_id)
+    assert not [name for name in os.listdir(api.PROCESSED_FOLDER) if name.startswith(file_id)]
@@ -0,0 +1,86 @@
+import io
+from collections import Counter
+import numpy as np
+import pandas as pd
+from conftest import HEADER, make_log
+from discovery import DiscoveryState, discover
+from event_log import EventDictionaries, build_event_table, read_event_csv
+
+
+def naive_dfg(df):
+    """Directly-follows counts and durations from one Python loop per case"""
+    df = df.assign(time=pd.to_datetime(df["timestamp"], errors="coerce"))
+    activities, starts, ends, edges = Counter(), Counter(), Counter(), {}
+    for _, trace in df.groupby("case_id", sort=False):
+        trace = trace.sort_values("time", kind="stable", na_position="last")
+        names, times = trace["activity"].tolist(), trace["time"].tolist()
+        activities.update(names)
+        starts[names[0]] += 1
+        ends[names[-1]] += 1
+        for i in range(1, len(names)):
+            edge = edges.setdefault((names[i - 1], names[i]), [])
+            if not pd.isna(times[i]) and not pd.isna(times[i - 1]):
+                edge.append((times[i] - times[i - 1]).total_seconds())
+            else:
+                edge.append(None)
+    return activities, starts, ends, edges
+
+
+def read(rows):
+    return pd.read_csv(io.BytesIO(HEADER + b"".join(rows)), dtype=str)
+
+
+def test_discovery_matches_a_per_case_loop():
+    df = read(make_log())
+    model = discover(build_event_table(df))
+    activities, starts, ends, edges = naive_dfg(df)
+
+    statistics = model["statistics"]
+    assert statistics["activities"] == dict(activities)
+    assert statistics["startActivities"] == dict(starts)
+    assert statistics["endActivities"] == dict(ends)
+    assert statistics["totalCases"] == df["case_id"].nunique()
+    assert statistics["totalEvents"] == len(df)
+
+    names = {node["id"]: node["name"] for node in model["nodes"]}
+    found = {(names[edge["source"]], names[edge["target"]]): edge for edge in model["edges"]}
+    assert set(found) == set(edges)
+    for pair, durations in edges.items():
+        assert found[pair]["value"] == len(durations)
+        timed = [d for d in durations if d is not None]
+        assert found[pair]["duration"]["min"] == min(timed)
+        assert found[pair]["duration"]["max"] == max(timed)
+        assert np.isclose(found[pair]["duration"]["mean"], sum(timed) / len(timed))
+
+
+def test_events_are_ordered_by_time_within_a_case():
+    # Rows out of time order, an unparseable timestamp (sorted last) and a tie (log order)
+    df = read([b"1,B,2023-01-02,order,u\n", b"1,A,2023-01-01,order,u\n", b"1,C,not a time,order,u\n",
+               b"2,A,2023-01-01,order,u\n", b"2,C,2023-01-01,order,u\n", b"2,B,2023-01-01,order,u\n"])
+    model = discover(build_event_table(df))
+    names = {node["id"]: node["name"] for node in model["nodes"]}
+    edges = {(names[e["source"]], names[e["target"]]): e["value"] for e in model["edges"]}
+    assert edges == {("A", "B"): 1, ("B", "C"): 1, ("A", "C"): 1, ("C", "B"): 1}
+    assert model["statistics"]["endActivities"] == {"B": 1, "C": 1}
+
+
+def test_blocks_of_events_fold_into_the_same_model():
+    data = HEADER + b"".join(make_log())
+    whole = DiscoveryState().update(build_event_table(read_event_csv(io.BytesIO(data)))).to_model()
+
+    # Cases span the blocks, so edges cross block boundaries
+    dictionaries, state, offset = EventDictionaries(), DiscoveryState(), 0
+    for chunk in read_event_csv(io.BytesIO(data), chunksize=97):
+        state.update(build_event_table(chunk, offset, dictionaries))
+        offset += len(chunk)
+    blocks = state.to_model()
+
+    assert whole.keys() == blocks.keys()
+    for name in whole:
+        assert np.array_equal(np.asarray(whole[name]), np.asarray(blocks[name])), name
+
+
+def test_empty_log_has_an_empty_model():
+    model = discover(build_event_table(read([])))
+    assert model["nodes"] == [] and model["edges"] == []
+    assert model["statistics"]["totalEvents"] == 0
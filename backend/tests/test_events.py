@@ -0,0 +1,29 @@
+import pytest
+from conftest import upload
+
+
+@pytest.fixture
+def file_id(client):
+    data = (b"case_id,activity,timestamp,object_type,code,cost\n"
+            b"1,A,2023-01-01T00:00:00,order,007,1.5\n"
+            b"1,B,2023-01-01T01:00:00,order,1e3,20\n"
+            b"2,A,2023-01-01T02:00:00,order,7,300\n"
+            b"2,B,2023-01-01T03:00:00,order,abc,4000\n")
+    return upload(client, data).get_json()["file_id"]
+
+
+def events(client, file_id, query=""):
+    return client.get(f"/api/events/{file_id}?{query}").get_json()["events"]
+
+
+def test_attributes_keep_their_text(client, file_id):
+    assert [event["attributes"]["code"] for event in events(client, file_id)] == ["007", "1e3", "7", "abc"]
+    assert [event["attributes"]["cost"] for event in events(client, file_id)] == ["1.5", "20.0", "300.0", "4000.0"]
+
+
+def test_value_filters_match_text_and_ranges_match_numbers(client, file_id):
+    assert [event["id"] for event in events(client, file_id, "attribute=code&value=007")] == ["e0"]
+    assert [event["id"] for event in events(client, file_id, "attribute=code&value=7")] == ["e2"]
+    assert [event["id"] for event in events(client, file_id, "attribute=code&min_value=500")] == ["e1"]
+    assert [event["id"] for event in events(client, file_id, "attribute=cost&min_value=20&max_value=300")] == \
+        ["e1", "e2"]
@@ -0,0 +1,47 @@
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+import jobs
+
+
+def die():
+    os._exit(1)
+
+
+def answer():
+    return 42
+
+
+@pytest.fixture
+def pool():
+    yield
+    if jobs._executor is not None:
+        jobs._discard_executor(jobs._executor)
+
+
+def test_dead_worker_fails_the_job_and_the_next_job_runs(tmp_path, pool):
+    crashed, next_job = (str(tmp_path / name) for name in ("crashed.json", "next.json"))
+    jobs.JobTracker.create(crashed, ["work"])
+    jobs.JobTracker.create(next_job, ["work"])
+
+    with pytest.raises(BrokenProcessPool):
+        jobs.submit(crashed, die).result(timeout=30)
+    # The callback marking the job runs just after result() wakes up
+    deadline = time.time() + 10
+    while jobs.read_job(crashed)["status"] != "failed" and time.time() < deadline:
+        time.sleep(0.05)
+    assert jobs.read_job(crashed)["status"] == "failed"
+    assert jobs.submit(next_job, answer).result(timeout=30) == 42
+
+
+def test_submit_replaces_a_pool_that_broke_before_it_was_dropped(tmp_path, pool):
+    path = str(tmp_path / "job.json")
+    jobs.JobTracker.create(path, ["work"])
+    broken = jobs.get_executor()
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(die).result(timeout=30)
+
+    # The pool is still the shared one, as if no job callback had dropped it yet
+    assert jobs.submit(path, answer).result(timeout=30) == 42
+    assert jobs._executor is not broken
@@ -0,0 +1,42 @@
+import json
+import pytest
+from conftest import HEADER, make_log, upload
+
+
+@pytest.fixture
+def file_id(client):
+    return upload(client, HEADER + b"".join(make_log())).get_json()["file_id"]
+
+
+@pytest.mark.parametrize("sort", ["score_desc", "score_asc"])
+def test_outlier_pages_follow_the_cursor(client, file_id, sort):
+    everything = client.get(f"/api/outliers/{file_id}?sort={sort}&limit=10000").get_json()["outliers"]
+    assert len(everything) > 7
+
+    pages, cursor = [], None
+    while True:
+        query = f"sort={sort}&limit=7" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(f"/api/outliers/{file_id}?{query}").get_json()
+        assert page["count"] == len(page["outliers"]) <= 7
+        pages += page["outliers"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == everything
+
+    lines = client.get(f"/api/outliers/{file_id}?sort={sort}&limit=7&format=ndjson").get_data(as_text=True)
+    rows = [json.loads(line) for line in lines.splitlines()]
+    assert rows[:-1] == everything[:7]
+    assert rows[-1] == {"next_cursor": client.get(f"/api/outliers/{file_id}?sort={sort}&limit=7")
+                        .get_json()["next_cursor"]}
+
+
+def test_outlier_query_errors(client, file_id):
+    assert client.get(f"/api/outliers/{file_id}?cursor=nonsense").status_code == 400
+    assert client.get(f"/api/outliers/{file_id}?sort=sideways").status_code == 400
+
+
+def test_outlier_filters(client, file_id):
+    flagged = client.get(f"/api/outliers/{file_id}?is_outlier=true&type=rework&min_score=3&limit=10000").get_json()
+    assert flagged["outliers"]
+    assert all(row["is_outlier"] and row["type"] == "rework" and row["score"] >= 3 for row in flagged["outliers"])
@@ -0,0 +1,75 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+import discovery
+import jobs
+import process_mining_api as api
+import variants
+from artifacts import write_event_store
+from conftest import HEADER, make_log, upload
+from discovery import DiscoveryState, discover_parallel, partition_cases
+from event_log import build_event_table
+from variants import build_variant_index
+
+
+def same(expected, actual):
+    return expected.keys() == actual.keys() and all(
+        np.array_equal(expected[k], actual[k], equal_nan=expected[k].dtype.kind == "f") for k in expected)
+
+
+@pytest.fixture
+def store(tmp_path):
+    events = build_event_table(pd.read_csv(io.BytesIO(HEADER + b"".join(make_log())), dtype=str))
+    write_event_store(str(tmp_path / "events"), events)
+    return str(tmp_path / "events"), events
+
+
+def test_parallel_discovery_matches_serial(store):
+    path, events = store
+    expected = DiscoveryState().update(events).to_model()
+    for workers in (2, 3):
+        assert same(expected, discover_parallel(path, events.dictionaries, workers, min_rows=0).to_model())
+        assert same(build_variant_index(path), build_variant_index(path, workers, min_rows=0))
+
+
+def test_partition_pool_is_kept_between_calls(store):
+    path, events = store
+    discover_parallel(path, events.dictionaries, 2, min_rows=0)
+    pool = jobs._partition_pool(2)
+    build_variant_index(path, 2, min_rows=0)
+    discover_parallel(path, events.dictionaries, 2, min_rows=0)
+    assert jobs._partition_pool(2) is pool
+
+
+def test_small_logs_are_discovered_serially(store, monkeypatch):
+    path, events = store
+
+    def fail(*args):
+        raise AssertionError("partitioned a log below the row threshold")
+    monkeypatch.setattr(discovery, "partition_map", fail)
+    assert same(DiscoveryState().update(events).to_model(), discover_parallel(path, events.dictionaries, 2).to_model())
+
+
+def test_hash_partitions_balance_consecutive_cases():
+    # Case codes follow arrival, so a modulo of them would follow any
+    # period in the log; the hash spreads every run of codes evenly
+    for partitions in (2, 4, 8):
+        sizes = np.bincount(partition_cases(np.arange(0, 80000, partitions), partitions), minlength=partitions)
+        assert sizes.min() > 0.9 * sizes.mean()
+
+
+def test_parallel_upload_matches_serial(client, monkeypatch):
+    monkeypatch.setattr(discovery, "PARALLEL_MIN_ROWS", 0)
+    monkeypatch.setattr(variants, "PARALLEL_MIN_ROWS", 0)
+    data = HEADER + b"".join(make_log())
+    serial = upload(client, data, "sync=1&mode=batch").get_json()["file_id"]
+    monkeypatch.setattr(api, "DISCOVERY_WORKERS", 2)
+    # A trailing blank line keeps the content hashes apart, so the upload is not deduplicated
+    parallel = upload(client, data + b"\n", "sync=1&mode=batch").get_json()["file_id"]
+
+    expected = client.get(f"/api/process/{serial}").get_json()
+    assert expected["statistics"]["totalEvents"] == len(make_log())
+    assert client.get(f"/api/process/{parallel}").get_json() == expected
+    assert (client.get(f"/api/variants/{parallel}?k=20").get_json()["variants"] ==
+            client.get(f"/api/variants/{serial}?k=20").get_json()["variants"])
@@ -0,0 +1,35 @@
+import os
+import uuid
+import pytest
+import process_mining_api as api
+from conftest import HEADER, append, make_log, upload
+from jobs import JobTracker, read_job
+
+
+def test_client_chosen_file_id(client):
+    chosen = str(uuid.uuid4())
+    response = upload(client, HEADER + b"".join(make_log(10)), f"sync=1&file_id={chosen}")
+    assert response.get_json()["file_id"] == chosen
+    assert upload(client, HEADER + b"".join(make_log(11)), f"file_id={chosen}").status_code == 409
+    assert upload(client, HEADER + b"".join(make_log(11)), "file_id=not-a-uuid").status_code == 400
+    assert upload(client, HEADER + b"".join(make_log(11)), f"file_id={chosen.upper()}").status_code == 400
+
+
+def test_only_one_exclusive_job_claims_a_path(tmp_path):
+    path = str(tmp_path / "job.json")
+    JobTracker.create(path, ["convert"], exclusive=True, file_id="first")
+    with pytest.raises(FileExistsError):
+        JobTracker.create(path, ["convert"], exclusive=True, file_id="second")
+    assert read_job(path)["file_id"] == "first"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["job.json"]
+
+
+def test_preview_is_served_until_an_append_starts(client):
+    chosen = str(uuid.uuid4())
+    upload(client, HEADER + b"".join(make_log(10)), f"sync=1&file_id={chosen}")
+    preview = client.get(f"/api/preview/{chosen}").get_json()
+    assert preview["superseded"] and preview["status"] == "completed"
+
+    assert append(client, chosen, HEADER + b"".join(make_log(5, seed=1, start="2023-03-01"))).status_code == 200
+    assert client.get(f"/api/preview/{chosen}").status_code == 404
+    assert not os.path.exists(api.artifact_paths(chosen)["preview"])
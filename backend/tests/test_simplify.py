@@ -0,0 +1,22 @@
+import pytest
+from conftest import HEADER, make_log, upload
+
+
+def test_coverage_picks_the_simplest_level_meeting_it(client):
+    # 300 equally frequent activities: the activity caps leave every
+    # simplified level far below the coverage it targets
+    rows = b"".join(f"{i // 10},a{(i * 7919) % 300},2023-01-01T00:{i % 10:02d}:00,order,u\n".encode()
+                    for i in range(30000))
+    file_id = upload(client, HEADER + rows).get_json()["file_id"]
+    levels = client.get(f"/api/process/{file_id}/levels").get_json()["levels"]
+    for coverage in (0.9, 0.5, 0.2, 0.05):
+        expected = max(level["level"] for level in levels if level["eventCoverage"] >= coverage)
+        statistics = client.get(f"/api/process/{file_id}?coverage={coverage}").get_json()["statistics"]
+        assert statistics.get("simplification", {"level": 0})["level"] == expected
+    assert client.get(f"/api/process/{file_id}?coverage=0.9").get_json()["statistics"]["totalEvents"] == 30000
+
+
+@pytest.mark.parametrize("query", ["level=1&coverage=0.5", "coverage=0", "coverage=1.5"])
+def test_invalid_simplification_args_are_rejected(client, query):
+    file_id = upload(client, HEADER + b"".join(make_log())).get_json()["file_id"]
+    assert client.get(f"/api/process/{file_id}?{query}").status_code == 400
@@ -0,0 +1,37 @@
+import gzip
+import io
+import os
+import pytest
+from flask import Flask
+
+pytest.importorskip("requests")
+import streamlit_proxy  # noqa: E402
+
+
+@pytest.fixture
+def proxy(tmp_path, monkeypatch):
+    monkeypatch.setattr(streamlit_proxy, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(streamlit_proxy.StreamlitProcessingTask, "start", lambda self: None)
+    app = Flask(__name__)
+    streamlit_proxy.register_blueprint(app)
+    return app.test_client()
+
+
+def post(proxy, data, filename):
+    return proxy.post("/api/streamlit/upload", data={"file": (io.BytesIO(data), filename)},
+                      content_type="multipart/form-data")
+
+
+def test_broken_uploads_are_rejected_and_removed(proxy, tmp_path):
+    response = post(proxy, b"not gzip", "x.csv.gz")
+    assert response.status_code == 400
+    assert os.listdir(tmp_path) == []
+
+
+def test_compressed_uploads_are_parsed_while_saved(proxy, tmp_path):
+    data = b"a,b\n" + b"".join(f"{i},{i * 2}\n".encode() for i in range(1000))
+    response = post(proxy, gzip.compress(data), "x.csv.gz")
+    assert response.status_code == 200
+    task = streamlit_proxy.processing_tasks.pop(response.get_json()["requestId"])
+    assert len(task.csv_data) == 1000
+    assert [name.endswith("_x.csv.gz") for name in os.listdir(tmp_path)] == [True]
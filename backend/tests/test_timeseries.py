@@ -0,0 +1,21 @@
+import pytest
+from conftest import HEADER, make_log, upload
+
+
+@pytest.fixture
+def file_id(client):
+    return upload(client, HEADER + b"".join(make_log())).get_json()["file_id"]
+
+
+def test_timeseries_converts_zoned_bounds_to_utc(client, file_id):
+    naive = client.get(f"/api/timeseries/{file_id}?granularity=hour&start=2023-01-10T10:00:00"
+                       "&end=2023-01-12T10:00:00").get_json()["buckets"]
+    zoned = client.get(f"/api/timeseries/{file_id}?granularity=hour&start=2023-01-10T12:00:00%2B02:00"
+                       "&end=2023-01-12T05:00:00-05:00").get_json()["buckets"]
+    assert naive and zoned == naive
+
+
+def test_timeseries_buckets_sum_to_the_event_count(client, file_id):
+    for granularity in ("hour", "day", "week"):
+        buckets = client.get(f"/api/timeseries/{file_id}?granularity={granularity}").get_json()["buckets"]
+        assert sum(bucket["events"] for bucket in buckets) == len(make_log())
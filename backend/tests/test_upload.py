@@ -0,0 +1,40 @@
+import uuid
+import pytest
+import process_mining_api as api
+from conftest import HEADER, append, make_log, upload
+
+
+def process_model(client, file_id):
+    return client.get(f"/api/process/{file_id}").get_json()
+
+
+def test_batch_and_stream_modes_agree(client, monkeypatch):
+    monkeypatch.setattr(api, "STREAM_CHUNK_ROWS", 100)
+    data = HEADER + b"".join(make_log())
+    batch = upload(client, data, "sync=1&mode=batch").get_json()["file_id"]
+    # A trailing blank line keeps the content hashes apart, so the upload is not deduplicated
+    stream = upload(client, data + b"\n", "sync=1&mode=stream").get_json()["file_id"]
+
+    expected = process_model(client, batch)
+    assert expected["statistics"]["totalEvents"] == len(make_log())
+    assert process_model(client, stream) == expected
+    assert (client.get(f"/api/variants/{stream}?k=20").get_json()["variants"] ==
+            client.get(f"/api/variants/{batch}?k=20").get_json()["variants"])
+
+
+@pytest.mark.parametrize("mode", ["batch", "stream", "approx"])
+def test_empty_csv_is_a_client_error_in_every_mode(client, mode):
+    file_id = str(uuid.uuid4())
+    response = upload(client, HEADER, f"sync=1&mode={mode}&file_id={file_id}")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "CSV file has no rows"
+    assert client.get(f"/api/jobs/{file_id}").get_json()["clientError"] is True
+
+
+def test_empty_append_is_a_client_error(client):
+    file_id = upload(client, HEADER + b"".join(make_log(5))).get_json()["file_id"]
+    response = append(client, file_id, HEADER)
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "CSV file has no rows"
+    assert client.get(f"/api/jobs/{file_id}").get_json()["clientError"] is True
+    assert process_model(client, file_id)["statistics"]["totalEvents"] == len(make_log(5))
@@ -0,0 +1,191 @@
+import hashlib
+import io
+from compression import decompress_chunks
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Epilogue, Field, File, MultipartDecoder, NeedData
+
+# Bytes read from the request body at a time
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# Form fields sent along with a file are small; anything larger is refused
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(ValueError):
+    """The request body is not a usable file upload"""
+
+
+class MultipartUpload:
+    """
+    Reads a multipart/form-data request body incrementally, so the uploaded
+    file can be consumed while it arrives instead of being spooled to a
+    temporary file first as request.files does.
+
+    Form fields sent before the file part are in `fields` as soon as the
+    upload is constructed, together with the `filename`; chunks() then
+    yields the bytes of the file and collects any fields sent after it.
+    """
+
+    def __init__(self, stream, content_type, field="file"):
+        mimetype, options = parse_options_header(content_type or "")
+        if mimetype != "multipart/form-data" or not options.get("boundary"):
+            raise UploadError("No file part")
+        self.stream = stream
+        self.decoder = MultipartDecoder(options["boundary"].encode("latin-1"))
+        self.field = field
+        self.fields = {}
+        self.filename = None
+        self.ended = False
+
+        for event in self._events():
+            if isinstance(event, File) and event.name == field:
+                self.filename = event.filename or ""
+                return
+            self._skip(event)
+        raise UploadError("No file part")
+
+    def _events(self):
+        while True:
+            try:
+                event = self.decoder.next_event()
+            except ValueError as e:
+                raise UploadError(f"Malformed upload: {e}")
+            if isinstance(event, NeedData):
+                if self.ended:
+                    raise UploadError("Upload ended unexpectedly")
+                block = self.stream.read(UPLOAD_BLOCK_SIZE)
+                self.ended = not block
+                self.decoder.receive_data(block or None)
+                continue
+            if isinstance(event, Epilogue):
+                return
+            yield event
+
+    def _data(self):
+        for event in self._events():
+            if event.data:
+                yield event.data
+            if not event.more_data:
+                return
+
+    def _skip(self, event):
+        """Consume a part other than the file, keeping it if it is a field"""
+        if isinstance(event, Field):
+            value = bytearray()
+            for data in self._data():
+                value += data
+                if len(value) > MAX_FIELD_BYTES:
+                    raise UploadError(f"Form field {event.name} is too large")
+            self.fields[event.name] = value.decode("utf-8", "replace")
+        elif isinstance(event, File):
+            for _ in self._data():
+                pass
+
+    def chunks(self):
+        yield from self._data()
+        for event in self._events():
+            self._skip(event)
+
+
+class UploadStream(io.RawIOBase):
+    """
+    Readable binary file over a sequence of byte chunks that hashes and
+    counts the bytes as they are read and writes them through to `path`,
+    so parsing, hashing and saving an upload take a single pass over it.
+    Wrap it in io.BufferedReader (see reader()) for parsers.
+
+    With a codec ("gzip"/"zstd") the chunks are compressed: they are saved
+    as they are and decompressed on the fly, and readers, the hash and the
+    size all see the decompressed bytes, so a compressed upload of a log is
+    recognised as a duplicate of the plain one. The same pass counts the
+    lines (see rows).
+
+    tap, when given, is called as tap(chunk, received) with the bytes of
+    every chunk as readers see them and the bytes received so far as sent
+    (compressed or not), and as tap(None, received) at the end.
+    """
+
+    def __init__(self, chunks, path=None, codec=None, tap=None):
+        self.out = open(path, 'wb') if path else None
+        if codec:
+            chunks = decompress_chunks(self._save(chunks), codec)
+        self.chunks = iter(chunks)
+        self.codec = codec
+        self.tap = tap
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.received = 0
+        self.lines = 0
+        self.last = b"\n"
+        self.pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self.pending):
+            try:
+                chunk = next(self.chunks, None)
+            except UploadError:
+                raise
+            except ValueError as e:
+                raise UploadError(str(e))
+            if chunk is None:
+                self._finish()
+                if self.tap is not None:
+                    tap, self.tap = self.tap, None
+                    tap(None, self.received)
+                return 0
+            self.digest.update(chunk)
+            self.size += len(chunk)
+            self.lines += chunk.count(b"\n")
+            self.last = chunk[-1:]
+            if not self.codec:
+                self.received += len(chunk)
+                if self.out is not None:
+                    self.out.write(chunk)
+            if self.tap is not None:
+                self.tap(chunk, self.received)
+            self.pending = memoryview(chunk)
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+    def _save(self, chunks):
+        for chunk in chunks:
+            self.received += len(chunk)
+            if self.out is not None:
+                self.out.write(chunk)
+            yield chunk
+
+    def _finish(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+    def reader(self):
+        return io.BufferedReader(self, UPLOAD_BLOCK_SIZE)
+
+    def drain(self):
+        """Read whatever the consumer left over, so the hash covers it all"""
+        buffer = bytearray(UPLOAD_BLOCK_SIZE)
+        while self.readinto(buffer):
+            pass
+        return self.hexdigest(), self.size
+
+    @property
+    def rows(self):
+        """
+        Lines read below the header line, counting an unterminated last
+        one; a quoted field spanning lines counts once per line
+        """
+        return max(0, self.lines + (self.last != b"\n") - 1)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+    def close(self):
+        self.tap = None
+        self._finish()
+        super().close()
@@ -0,0 +1,245 @@
+import hashlib
+import os
+import numpy as np
+from artifacts import read_events, read_dictionary, read_manifest, read_model, write_model
+from discovery import PARALLEL_MIN_ROWS, _grown, _mix, partition_cases
+from jobs import partition_map
+
+# Golden-ratio constant mixing the position of an event into its hash
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+_NO_TIME = np.iinfo("int64").max
+
+
+def activity_hashes(names):
+    """64-bit hash of every activity name, independent of dictionary order"""
+    return np.array([int.from_bytes(hashlib.blake2b(str(name).encode('utf-8'), digest_size=8).digest(), 'little')
+                     for name in names], dtype="uint64")
+
+
+def case_traces(case, time):
+    """
+    Group event columns into traces: returns the event order (sorted by
+    case, then timestamp, then file order; events without a timestamp go
+    last) and the start offset of every case in that order
+    """
+    stamps = np.asarray(time).astype("int64")
+    stamps = np.where(np.isnat(np.asarray(time)), _NO_TIME, stamps)
+    order = np.lexsort((stamps, case))
+    sorted_case = np.asarray(case)[order]
+    starts = np.flatnonzero(np.r_[True, sorted_case[1:] != sorted_case[:-1]]) if len(order) else np.empty(0, dtype="int64")
+    return order, starts
+
+
+def trace_hashes(activity_hash, starts, total):
+    """
+    Order-sensitive 64-bit hash of every trace: each event is mixed with its
+    position in the trace and the per-event values are summed per case
+    """
+    sums, lengths = trace_sums(activity_hash, starts, total)
+    return finish_trace_hashes(sums, lengths), lengths
+
+
+def trace_sums(activity_hash, starts, total, before=None):
+    """
+    The per-case sums trace_hashes() is finished from, with the lengths of
+    the traces. before gives the events every case already has, so the
+    sums of events appended to a trace add to the sum of its old events.
+    """
+    lengths = np.diff(np.r_[starts, total]).astype("int64")
+    position = np.arange(total) - np.repeat(starts, lengths)
+    if before is not None:
+        position = position + np.repeat(before, lengths)
+    per_event = _mix(activity_hash + position.astype("uint64") * _GOLDEN)
+    sums = np.add.reduceat(per_event, starts) if len(starts) else np.empty(0, dtype="uint64")
+    return sums, lengths
+
+
+def finish_trace_hashes(sums, lengths):
+    return _mix(sums ^ lengths.astype("uint64"))
+
+
+def _partition_traces(events_path, partition=0, partitions=1):
+    """
+    Traces of the cases in one hash partition of an event store: case
+    codes, trace sums (see trace_sums), trace lengths and the concatenated
+    activity codes
+    """
+    columns = read_events(events_path, ("case", "activity", "time"))
+    case = np.asarray(columns["case"])
+    activity = np.asarray(columns["activity"])
+    time = np.asarray(columns["time"])
+    if partitions > 1:
+        mine = partition_cases(case, partitions) == partition
+        case, activity, time = case[mine], activity[mine], time[mine]
+
+    order, starts = case_traces(case, time)
+    sequence = activity[order]
+    sums, lengths = trace_sums(activity_hashes(read_dictionary(events_path, "activity"))[sequence],
+                               starts, len(order))
+    return case[order][starts], sums, lengths, sequence
+
+
+def build_variant_index(events_path, workers=1, min_rows=None):
+    """
+    Trace variants of an event store as columnar arrays (variants ordered by
+    frequency): hashed variant ids, counts, cumulative counts, activity
+    sequences as offsets into variant_activity, and the cases of every
+    variant as offsets into variant_cases (codes into the store's case
+    dictionary). With workers > 1 and at least min_rows events (default
+    PARALLEL_MIN_ROWS) the traces are hashed per case partition in the
+    long-lived partition pool; the index is the same either way.
+
+    The index also keeps the trace sum and length of every case (by case
+    code) and the number of events it covers, which is all
+    update_variant_index() needs to fold in appended events.
+    """
+    min_rows = PARALLEL_MIN_ROWS if min_rows is None else min_rows
+    if workers > 1 and sum(read_manifest(events_path)["parts"]) >= min_rows:
+        parts = partition_map(_partition_traces, workers, events_path)
+        cases, sums, lengths, sequence = (np.concatenate(column) for column in zip(*parts))
+        # Back into case order, as a single partition would have them
+        starts = np.r_[0, np.cumsum(lengths)[:-1]]
+        by_case = np.argsort(cases, kind="stable")
+        cases, sums, lengths, starts = cases[by_case], sums[by_case], lengths[by_case], starts[by_case]
+    else:
+        cases, sums, lengths, sequence = _partition_traces(events_path)
+        starts = np.r_[0, np.cumsum(lengths)[:-1]]
+
+    size = len(read_dictionary(events_path, "case"))
+    case_sum = np.zeros(size, dtype="uint64")
+    case_length = np.zeros(size, dtype="int64")
+    case_sum[cases] = sums
+    case_length[cases] = lengths
+    return _assemble_index(cases, starts.astype("int64"), sequence, case_sum, case_length,
+                           read_dictionary(events_path, "activity"))
+
+
+def update_variant_index(events_path, index):
+    """
+    The variant index of an event store that has grown since index was
+    built, from the new events alone: the traces of the cases they touch
+    are continued from their stored sums and lengths and their activity
+    sequences from those of their old variants; no old event is read. As
+    in discovery, a case's new events are expected to follow its old ones
+    in time. Indexes built before the per-case sums were kept are rebuilt.
+    """
+    if "case_trace_sum" not in index:
+        return build_variant_index(events_path)
+
+    columns = read_events(events_path, ("case", "activity", "time"), since=int(index["total_events"]))
+    case = np.asarray(columns["case"])
+    size = len(read_dictionary(events_path, "case"))
+    case_sum = _grown(np.array(index["case_trace_sum"]), size, 0)
+    case_length = _grown(np.array(index["case_trace_length"]), size, 0)
+
+    # Where the trace of every old case starts in the old activity sequences
+    counts = np.asarray(index["variant_count"])
+    offsets = np.asarray(index["activity_offset"])
+    pool = np.asarray(index["variant_activity"])
+    trace_start = np.zeros(size, dtype="int64")
+    trace_start[np.asarray(index["variant_cases"])] = np.repeat(offsets[:-1], counts)
+
+    order, starts = case_traces(case, np.asarray(columns["time"]))
+    sequence = np.asarray(columns["activity"])[order]
+    touched = case[order][starts]
+    before = case_length[touched]
+    names = read_dictionary(events_path, "activity")
+    sums, lengths = trace_sums(activity_hashes(names)[sequence], starts, len(order), before)
+
+    # Continued traces: the old sequence followed by the new events, added
+    # after the old sequences
+    total = before + lengths
+    first = np.r_[0, np.cumsum(total)[:-1]].astype("int64")
+    step = np.arange(int(total.sum())) - np.repeat(first, total)
+    old = np.repeat(trace_start[touched], total) + step
+    new = len(pool) + np.repeat(starts - before, total) + step
+    source = np.concatenate([pool, sequence])
+    continued = source[np.where(step < np.repeat(before, total), old, new)]
+
+    case_sum[touched] += sums
+    case_length[touched] += lengths
+    trace_start[touched] = len(pool) + first
+    cases = np.flatnonzero(case_length > 0)
+    return _assemble_index(cases, trace_start[cases], np.concatenate([pool, continued]), case_sum, case_length, names)
+
+
+def _assemble_index(cases, trace_start, sequences, case_sum, case_length, activities):
+    """
+    Variant index of the given cases (in case code order) from their trace
+    sums and lengths; trace_start points at every case's activity sequence
+    in sequences
+    """
+    lengths = case_length[cases]
+    hashes = finish_trace_hashes(case_sum[cases], lengths)
+    ids, first, inverse, counts = np.unique(hashes, return_index=True, return_inverse=True, return_counts=True)
+    # Most frequent first; ties by variant id so the ranking is stable
+    rank = np.lexsort((ids, -counts))
+    position = np.empty(len(rank), dtype="int64")
+    position[rank] = np.arange(len(rank))
+
+    by_variant = np.argsort(position[inverse], kind="stable")
+    case_offsets = np.r_[0, np.cumsum(counts[rank])]
+
+    representative = trace_start[first[rank]]
+    variant_lengths = lengths[first[rank]]
+    activity_offsets = np.r_[0, np.cumsum(variant_lengths)]
+    positions = np.repeat(representative - activity_offsets[:-1], variant_lengths) + np.arange(activity_offsets[-1])
+
+    return {
+        "variant_id": ids[rank],
+        "variant_count": counts[rank].astype("int64"),
+        "variant_cumulative": np.cumsum(counts[rank]).astype("int64"),
+        "variant_length": variant_lengths.astype("int64"),
+        "activity_offset": activity_offsets.astype("int64"),
+        "variant_activity": sequences[positions].astype("int32"),
+        "activities": np.array(activities.tolist(), dtype=str),
+        "case_offset": case_offsets.astype("int64"),
+        "variant_cases": cases[by_variant].astype("int32"),
+        "total_cases": np.int64(len(cases)),
+        "case_trace_sum": case_sum,
+        "case_trace_length": case_length,
+        "total_events": np.int64(case_length.sum())
+    }
+
+
+def write_variant_index(events_path, variants_path, workers=1):
+    index = build_variant_index(events_path, workers)
+    write_model(variants_path, index)
+    return index
+
+
+def append_variant_index(events_path, variants_path):
+    """Update the stored variant index after events were appended to the store"""
+    index = update_variant_index(events_path, read_model(variants_path)) if os.path.exists(variants_path) \
+        else build_variant_index(events_path)
+    write_model(variants_path, index)
+    return index
+
+
+def top_variants(index, case_names, k, cases=0):
+    """
+    The k most frequent variants with their coverage in percent of all
+    cases and up to `cases` example case ids each; touches only the first
+    k entries of the index
+    """
+    total = int(index["total_cases"])
+    k = min(k, len(index["variant_id"]))
+    names = index["activities"]
+    result = []
+    for rank in range(k):
+        low, high = int(index["activity_offset"][rank]), int(index["activity_offset"][rank + 1])
+        count = int(index["variant_count"][rank])
+        first = int(index["case_offset"][rank])
+        examples = index["variant_cases"][first:first + min(cases, count)]
+        result.append({
+            "id": f"{int(index['variant_id'][rank]):016x}",
+            "rank": rank + 1,
+            "activities": names[np.asarray(index["variant_activity"][low:high])].tolist(),
+            "length": high - low,
+            "count": count,
+            "coverage": 100.0 * count / total if total else 0.0,
+            "cumulativeCoverage": 100.0 * int(index["variant_cumulative"][rank]) / total if total else 0.0,
+            "cases": case_names[np.asarray(examples)].tolist()
+        })
+    return result
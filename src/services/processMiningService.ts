@@ -18,19 +18,93 @@ export interface ProcessModel {
     totalCases: number;
     totalEvents: number;
     activities: Record<string, number>;
+    startActivities?: Record<string, number>;
+    endActivities?: Record<string, number>;
+    approximate?: ApproximateStatistics;
+    simplification?: SimplificationLevel;
   };
 }
 
+export interface SimplificationLevel {
+  level: number;
+  coverage: number;
+  activities: number;
+  edges: number;
+  eventCoverage: number;
+  edgeCoverage: number;
+}
+
+export interface HeuristicsParameters {
+  dependency?: number;
+  observations?: number;
+  relative_to_best?: number;
+  loop_one?: number;
+  loop_two?: number;
+  and_threshold?: number;
+  all_connected?: boolean;
+}
+
+export interface HeuristicsGateway {
+  type: 'and' | 'xor' | 'or';
+  parallel: [string, string][];
+}
+
+export interface HeuristicsNet {
+  file_id: string;
+  nodes: {
+    id: string;
+    name: string;
+    type: string;
+    frequency: number;
+    split: HeuristicsGateway | null;
+    join: HeuristicsGateway | null;
+  }[];
+  edges: { source: string; target: string; value: number; dependency: number }[];
+  loops: { lengthOne: string[]; lengthTwo: [string, string][]; lengthTwoAvailable: boolean };
+  parameters: Required<HeuristicsParameters>;
+  statistics: { totalCases: number; totalEvents: number };
+}
+
+export interface DistinctEstimate {
+  estimate: number;
+  relativeStandardError: number;
+  lower95: number;
+  upper95: number;
+}
+
+export interface ApproximateStatistics {
+  totalCases: DistinctEstimate;
+  totalObjects: DistinctEstimate;
+  activityCountMaxOvercount: number;
+  edgeCountMaxOvercount: number;
+  countConfidence: number;
+  closedOpenCases: number;
+}
+
 export interface ProcessNode {
   id: string;
   name: string;
   type: string;
+  frequency?: number;
+  start?: number;
+  end?: number;
+}
+
+export interface EdgeDuration {
+  mean: number | null;
+  min: number | null;
+  max: number | null;
+  p50?: number | null;
+  p90?: number | null;
+  p99?: number | null;
+  rankError?: number | null;
 }
 
 export interface ProcessEdge {
   source: string;
   target: string;
   value: number;
+  duration?: EdgeDuration;
 }
 
 export interface Outlier {
@@ -48,34 +122,223 @@ export interface ProcessSummary {
   leastFrequentActivity: string;
 }
 
+export interface TraceVariant {
+  id: string;
+  rank: number;
+  activities: string[];
+  length: number;
+  count: number;
+  coverage: number;
+  cumulativeCoverage: number;
+  cases: string[];
+}
+
+export interface TimeBucket {
+  bucket: string;
+  events: number;
+  caseArrivals?: number;
+}
+
+export interface TimeSeriesResponse {
+  file_id: string;
+  granularity: 'hour' | 'day' | 'week';
+  buckets: TimeBucket[];
+  activities?: Record<string, TimeBucket[]>;
+}
+
+export interface VariantsResponse {
+  file_id: string;
+  totalCases: number;
+  totalVariants: number;
+  variants: TraceVariant[];
+}
+
+export interface UploadMetrics {
+  totalEvents: number;
+  totalCases: number;
+  startDate: string;
+  endDate: string;
+}
+
 export interface UploadResponse {
   success: boolean;
   file_id: string;
   filename: string;
-  metrics: {
+  metrics: UploadMetrics;
+  deduplicated?: boolean;
+  preview?: UploadPreview | null;
+}
+
+export interface PreviewColumn {
+  name: string;
+  dtype: string;
+  kind: 'number' | 'datetime' | 'text';
+  role: 'case' | 'activity' | 'timestamp' | 'object_type' | 'attribute';
+  missing: number;
+}
+
+export interface UploadPreview {
+  provisional: boolean;
+  complete: boolean;
+  seconds: number;
+  sample: {
+    rows: number;
+    cases: number;
+    probability: number;
+    rowsRead: number;
+    rowsUnparsed: number;
+    bytesRead: number;
+    uploadShareRead: number;
+    scale: number;
+  };
+  estimates: {
     totalEvents: number;
     totalCases: number;
-    startDate: string;
-    endDate: string;
+    eventsPerCase: number | null;
   };
+  columns: PreviewColumn[];
+  topActivities: { activity: string; estimatedCount: number; share: number }[];
+  processData: ProcessModel;
+  status?: JobStatus['status'];
+  superseded?: boolean;
+  metrics?: UploadMetrics | null;
+}
+
+export interface JobStage {
+  name: string;
+  status: 'pending' | 'running' | 'completed' | 'failed';
+  startedAt?: number;
+  seconds?: number;
+  cpuSeconds?: number;
+  peakRssBytes?: number;
+  rows?: number;
+  steps?: Record<string, number>;
+}
+
+export interface JobStatus {
+  file_id: string;
+  filename: string;
+  status: 'queued' | 'processing' | 'completed' | 'failed';
+  stage: string | null;
+  progress: number;
+  stages: JobStage[];
+  metrics: UploadMetrics | null;
+  error: string | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+export async function getJobStatus(fileId: string): Promise<JobStatus> {
+  const response = await fetch(`${API_BASE_URL}/jobs/${fileId}`);
+
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.error || 'Failed to fetch job status');
+  }
+
+  return await response.json();
+}
+
+async function waitForJob(fileId: string): Promise<JobStatus> {
+  while (true) {
+    const job = await getJobStatus(fileId);
+    if (job.status === 'completed') {
+      return job;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Processing failed');
+    }
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+}
+
+export async function getUploadPreview(fileId: string): Promise<UploadPreview | null> {
+  try {
+    const response = await fetch(`${API_BASE_URL}/preview/${fileId}`);
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.error || 'Failed to fetch upload preview');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching upload preview:', error);
+    return null;
+  }
 }
 
-export async function uploadCsvFile(file: File): Promise<UploadResponse | null> {
+const PREVIEW_POLL_INTERVAL_MS = 250;
+
+// Polls the preview of an upload still being sent until it is published
+// or done() reports the upload has been answered
+async function pollUploadPreview(
+  fileId: string,
+  done: () => boolean,
+  onPreview: (preview: UploadPreview) => void
+): Promise<void> {
+  while (!done()) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/preview/${fileId}`);
+      if (response.ok) {
+        onPreview(await response.json());
+        return;
+      }
+    } catch (error) {
+      // The upload's own response reports failures
+    }
+    await new Promise(resolve => setTimeout(resolve, PREVIEW_POLL_INTERVAL_MS));
+  }
+}
+
+export async function uploadCsvFile(
+  file: File,
+  onPreview?: (preview: UploadPreview) => void
+): Promise<UploadResponse | null> {
   try {
     const formData = new FormData();
     formData.append('file', file);
 
-    const response = await fetch(`${API_BASE_URL}/upload`, {
-      method: 'POST',
-      body: formData
-    });
+    // The file_id is chosen here so the preview, published while the body
+    // is still being sent, can be polled before the upload is answered
+    const fileId = crypto.randomUUID();
+    let answered = false;
+    let previewShown = false;
+    const showPreview = (preview: UploadPreview) => {
+      previewShown = true;
+      onPreview?.(preview);
+    };
+    if (onPreview) {
+      pollUploadPreview(fileId, () => answered, showPreview);
+    }
+
+    let response: Response;
+    try {
+      response = await fetch(`${API_BASE_URL}/upload?file_id=${fileId}`, {
+        method: 'POST',
+        body: formData
+      });
+    } finally {
+      answered = true;
+    }
 
     if (!response.ok) {
       const errorData = await response.json();
       throw new Error(errorData.error || 'Failed to upload file');
     }
 
-    return await response.json();
+    const upload = await response.json();
+    if (upload.metrics) {
+      return upload;
+    }
+
+    // Processing runs as a background job; show the provisional preview
+    // until its final metrics supersede it
+    if (upload.preview && onPreview && !previewShown) {
+      showPreview(upload.preview);
+    }
+    const job = await waitForJob(upload.file_id);
+    return { ...upload, metrics: job.metrics };
   } catch (error) {
     console.error('Error uploading CSV file:', error);
     toast({
@@ -87,9 +350,16 @@ export async function uploadCsvFile(file: File): Promise<UploadResponse | null>
   }
 }
 
-export async function getProcessModel(fileId: string): Promise<ProcessModel | null> {
+export async function getProcessModel(
+  fileId: string,
+  options: { level?: number; coverage?: number } = {}
+): Promise<ProcessModel | null> {
   try {
-    const response = await fetch(`${API_BASE_URL}/process/${fileId}`);
+    const params = new URLSearchParams();
+    if (options.level !== undefined) params.set('level', String(options.level));
+    if (options.coverage !== undefined) params.set('coverage', String(options.coverage));
+    const query = params.toString();
+    const response = await fetch(`${API_BASE_URL}/process/${fileId}${query ? `?${query}` : ''}`);
     
     if (!response.ok) {
       const errorData = await response.json();
@@ -103,17 +373,86 @@ export async function getProcessModel(fileId: string): Promise<ProcessModel | nu
   }
 }
 
-export async function getOutliers(fileId: string): Promise<Outlier[] | null> {
+export async function getProcessLevels(fileId: string): Promise<SimplificationLevel[] | null> {
   try {
-    const response = await fetch(`${API_BASE_URL}/outliers/${fileId}`);
+    const response = await fetch(`${API_BASE_URL}/process/${fileId}/levels`);
     
     if (!response.ok) {
       const errorData = await response.json();
-      throw new Error(errorData.error || 'Failed to fetch outliers');
+      throw new Error(errorData.error || 'Failed to fetch simplification levels');
     }
 
     const data = await response.json();
-    return data.outliers;
+    return data.levels;
+  } catch (error) {
+    console.error('Error fetching simplification levels:', error);
+    return null;
+  }
+}
+
+export async function getHeuristicsNet(
+  fileId: string,
+  parameters: HeuristicsParameters = {}
+): Promise<HeuristicsNet | null> {
+  try {
+    const params = new URLSearchParams();
+    Object.entries(parameters).forEach(([name, value]) => {
+      if (value !== undefined) {
+        params.set(name, typeof value === 'boolean' ? (value ? '1' : '0') : String(value));
+      }
+    });
+    const query = params.toString();
+    const response = await fetch(`${API_BASE_URL}/heuristics/${fileId}${query ? `?${query}` : ''}`);
+    
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.error || 'Failed to fetch heuristics net');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching heuristics net:', error);
+    return null;
+  }
+}
+
+export interface OutlierPage {
+  outliers: Outlier[];
+  next_cursor: string | null;
+}
+
+// Largest page the outliers endpoint serves
+const OUTLIER_PAGE_LIMIT = 10000;
+
+export async function getOutliersPage(
+  fileId: string,
+  options: { limit?: number; cursor?: string | null } = {}
+): Promise<OutlierPage> {
+  const params = new URLSearchParams();
+  if (options.limit !== undefined) params.set('limit', String(options.limit));
+  if (options.cursor) params.set('cursor', options.cursor);
+  const query = params.toString();
+  const response = await fetch(`${API_BASE_URL}/outliers/${fileId}${query ? `?${query}` : ''}`);
+
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.error || 'Failed to fetch outliers');
+  }
+
+  return await response.json();
+}
+
+// All outliers of a log, highest score first, following the page cursors
+export async function getOutliers(fileId: string): Promise<Outlier[] | null> {
+  try {
+    const outliers: Outlier[] = [];
+    let cursor: string | null = null;
+    do {
+      const page = await getOutliersPage(fileId, { limit: OUTLIER_PAGE_LIMIT, cursor });
+      outliers.push(...page.outliers);
+      cursor = page.next_cursor;
+    } while (cursor);
+    return outliers;
   } catch (error) {
     console.error('Error fetching outliers:', error);
     return null;
@@ -152,6 +491,146 @@ export async function getProcessSummary(fileId: string): Promise<ProcessSummary
   }
 }
 
+export async function getTimeSeries(
+  fileId: string,
+  granularity: 'hour' | 'day' | 'week' = 'day',
+  options: { start?: string; end?: string; activities?: string[] } = {}
+): Promise<TimeSeriesResponse | null> {
+  try {
+    const params = new URLSearchParams({ granularity });
+    if (options.start) params.set('start', options.start);
+    if (options.end) params.set('end', options.end);
+    if (options.activities?.length) params.set('activity', options.activities.join(','));
+    const response = await fetch(`${API_BASE_URL}/timeseries/${fileId}?${params}`);
+    
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.error || 'Failed to fetch time series');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching time series:', error);
+    return null;
+  }
+}
+
+export async function getTopVariants(fileId: string, k = 10): Promise<VariantsResponse | null> {
+  try {
+    const response = await fetch(`${API_BASE_URL}/variants/${fileId}?k=${k}`);
+    
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.error || 'Failed to fetch variants');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching variants:', error);
+    return null;
+  }
+}
+
+export interface LogEvent {
+  id: string;
+  activity: string;
+  timestamp: string | null;
+  objects: { id: string; type: string }[];
+  attributes: Record<string, string | number>;
+}
+
+export interface EventsResponse {
+  file_id: string;
+  events: LogEvent[];
+  next_cursor: string | null;
+  total?: number;
+}
+
+export interface EventQuery {
+  activities?: string[];
+  objects?: string[];
+  objectTypes?: string[];
+  start?: string;
+  end?: string;
+  attribute?: string;
+  value?: string;
+  minValue?: number;
+  maxValue?: number;
+  limit?: number;
+  cursor?: string;
+  count?: boolean;
+}
+
+export async function queryEvents(fileId: string, query: EventQuery = {}): Promise<EventsResponse | null> {
+  try {
+    const params = new URLSearchParams();
+    if (query.activities?.length) params.set('activity', query.activities.join(','));
+    if (query.objects?.length) params.set('object', query.objects.join(','));
+    if (query.objectTypes?.length) params.set('object_type', query.objectTypes.join(','));
+    if (query.start) params.set('start', query.start);
+    if (query.end) params.set('end', query.end);
+    if (query.attribute) params.set('attribute', query.attribute);
+    if (query.value !== undefined) params.set('value', query.value);
+    if (query.minValue !== undefined) params.set('min_value', String(query.minValue));
+    if (query.maxValue !== undefined) params.set('max_value', String(query.maxValue));
+    if (query.limit) params.set('limit', String(query.limit));
+    if (query.cursor) params.set('cursor', query.cursor);
+    if (query.count) params.set('count', '1');
+    const response = await fetch(`${API_BASE_URL}/events/${fileId}?${params}`);
+    
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.error || 'Failed to query events');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error querying events:', error);
+    return null;
+  }
+}
+
+export interface SubLogFilter {
+  activities?: string[];
+  objectTypes?: string[];
+  start?: string;
+  end?: string;
+  attribute?: string;
+  values?: string[];
+  level?: number;
+}
+
+export interface FilteredProcessModel extends ProcessModel {
+  file_id: string;
+  logEvents: number;
+}
+
+export async function filterProcessModel(fileId: string, filter: SubLogFilter = {}): Promise<FilteredProcessModel | null> {
+  try {
+    const params = new URLSearchParams();
+    if (filter.activities?.length) params.set('activity', filter.activities.join(','));
+    if (filter.objectTypes?.length) params.set('object_type', filter.objectTypes.join(','));
+    if (filter.start) params.set('start', filter.start);
+    if (filter.end) params.set('end', filter.end);
+    if (filter.attribute && filter.values?.length) {
+      params.set('attribute', filter.attribute);
+      params.set('value', filter.values.join(','));
+    }
+    if (filter.level !== undefined) params.set('level', String(filter.level));
+    const response = await fetch(`${API_BASE_URL}/filter/${fileId}?${params}`);
+    
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.error || 'Failed to filter process model');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error filtering process model:', error);
+    return null;
+  }
+}
+
 export function generateVisualizationsFromProcessData(
   processModel: ProcessModel,
   outliers: Outlier[],